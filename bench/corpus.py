@@ -0,0 +1,135 @@
+import calendar
+import json
+import os
+import random
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from utils.extract import make_entry_id
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# what the mock LLM answers per dataset, each must validate against the dataset's schema
+MOCK_RESPONSES = {
+    'proposal_results': {'info_found': True, 'data': [
+        {'proposal_description': 'Election of directors', 'presentation_order': 1, 'assigned_number': '1',
+         'votes_for': 91234567, 'votes_against': 1234567, 'abstentions': 34567, 'broker_non_votes': 4567890,
+         'proponent_type': 'Management', 'meeting_date': '2020-05-14', 'meeting_type': 'Annual'},
+        {'proposal_description': 'Ratification of auditors', 'presentation_order': 2, 'assigned_number': '2',
+         'votes_for': 95123456, 'votes_against': 612345, 'abstentions': 23456, 'broker_non_votes': None,
+         'proponent_type': 'Management', 'meeting_date': '2020-05-14', 'meeting_type': 'Annual'},
+        {'proposal_description': 'Report on political spending', 'presentation_order': 3, 'assigned_number': '3',
+         'votes_for': 31234567, 'votes_against': 60123456, 'abstentions': 523456, 'broker_non_votes': 4567890,
+         'proponent_type': 'Shareholder', 'meeting_date': '2020-05-14', 'meeting_type': 'Annual'},
+    ]},
+    'dividends_per_share': {'info_found': True, 'data': [
+        {'dividend_per_share': 0.25, 'payment_date': '2020-03-15T00:00:00', 'record_date': '2020-02-28T00:00:00',
+         'stock_type_specified': 'common'},
+    ]},
+    'votes_per_share': {'info_found': True, 'data': [
+        {'share_class': 'Class A', 'votes_per_share': 1.0, 'voting_rights_description': None},
+        {'share_class': 'Class B', 'votes_per_share': 10.0, 'voting_rights_description': None},
+    ]},
+}
+
+
+def fixture_path(month, path=FIXTURE_DIR):
+    return os.path.join(path, month)
+
+
+def record(month, path=FIXTURE_DIR, limit=None):
+    """Download one month of 8-Ks into the fixture corpus, frozen from then on.
+
+    limit keeps only the first submissions (by accession) so the corpus stays small enough to keep around.
+    Needs the datamule API, which is the only time the benchmarks do.
+    """
+    from datamule import Portfolio
+
+    year, mon = (int(part) for part in month.split('-'))
+    start = f'{month}-01'
+    end = f'{month}-{calendar.monthrange(year, mon)[1]:02d}'
+
+    target = fixture_path(month, path)
+    portfolio = Portfolio(target)
+    portfolio.download_submissions(submission_type=['8-K','8-K/A'],document_type=['8-K','8-K/A'],filing_date=(start,end))
+
+    # one file or directory per submission, so the corpus can be trimmed and copied as is
+    target_path = Path(target)
+    if any(f.is_file() and 'batch' in f.name and f.suffix == '.tar' for f in target_path.iterdir()):
+        portfolio.decompress()
+
+    submissions = sorted(f for f in target_path.iterdir() if (f.is_dir() or f.suffix == '.tar') and 'batch' not in f.name)
+    if limit is not None:
+        for f in submissions[limit:]:
+            shutil.rmtree(f) if f.is_dir() else f.unlink()
+        submissions = submissions[:limit]
+
+    size = sum(f.stat().st_size for f in target_path.rglob('*') if f.is_file())
+    manifest = {'month': month, 'submissions': len(submissions), 'bytes': size,
+                'recorded': datetime.now().isoformat(timespec='seconds')}
+    with open(target + '.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Recorded {len(submissions)} submissions ({size / 1e6:.1f} MB) into {target}")
+    return manifest
+
+
+def load_portfolio(month, scratch, path=FIXTURE_DIR):
+    """Copy a recorded month into scratch and open it, the pipeline deletes portfolios it has parsed"""
+    from datamule import Portfolio
+
+    source = fixture_path(month, path)
+    if not os.path.isdir(source):
+        return None
+    target = os.path.join(scratch, month)
+    shutil.copytree(source, target)
+    return Portfolio(target)
+
+
+def recorded_months(path=FIXTURE_DIR):
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+
+_PROPOSALS = ['the election of directors', 'the ratification of the appointment of the independent auditors',
+              'an advisory vote on executive compensation', 'the amendment of the 2015 equity incentive plan',
+              'a shareholder proposal regarding an independent board chair',
+              'a shareholder proposal on political contributions']
+
+
+def _votes_section(rng):
+    lines = [f"The Company held its {rng.choice(['Annual', 'Special'])} Meeting of Stockholders on "
+             f"{rng.choice(['April', 'May', 'June'])} {rng.randint(1, 28)}, 2020. The stockholders voted on the following proposals:"]
+    for n in range(1, rng.randint(2, 6) + 1):
+        lines.append(f"Proposal {n}. To approve {rng.choice(_PROPOSALS)}. "
+                     f"For {rng.randint(10**6, 10**8):,} Against {rng.randint(10**4, 10**7):,} "
+                     f"Abstain {rng.randint(10**3, 10**6):,} Broker Non-Votes {rng.randint(10**5, 10**7):,}")
+    if rng.random() < 0.2:
+        lines.append("Holders of Class A common stock are entitled to one vote per share and holders of Class B "
+                     "common stock are entitled to ten votes per share.")
+    return '\n'.join(lines)
+
+
+def _dividend_section(rng):
+    return (f"On {rng.choice(['January', 'February', 'March'])} {rng.randint(1, 28)}, 2020, the Board of Directors declared "
+            f"a quarterly cash dividend of ${rng.randint(1, 150) / 100:.2f} per share of common stock, payable on "
+            f"March {rng.randint(1, 28)}, 2020 to stockholders of record at the close of business on February "
+            f"{rng.randint(1, 28)}, 2020. " + "The Company expects to continue paying regular dividends. " * rng.randint(1, 20))
+
+
+def synthetic_sections(n, dataset='proposal_results', seed=0):
+    """n section rows shaped like extract_sections output (YYYYMMDD filing dates, as datamule writes them),
+    the same on every call with the same seed"""
+    rng = random.Random(seed)
+    item = 'item5.07' if dataset in ('proposal_results', 'votes_per_share') else 'item8.01'
+    make_text = _votes_section if item == 'item5.07' else _dividend_section
+
+    rows = []
+    for i in range(n):
+        accession = f'0000{seed:04d}-20-{i:06d}'
+        text = make_text(rng)
+        rows.append({'entry_id': make_entry_id(accession, 'form8-k.htm', item, text), 'accession': accession,
+                     'cik': str(1000 + rng.randint(0, n // 4 + 1)), 'filing_date': f'202001{rng.randint(1, 31):02d}',
+                     'document': 'form8-k.htm', 'item': item, 'source': '', 'text': text})
+    return rows
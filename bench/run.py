@@ -0,0 +1,424 @@
+import argparse
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench.corpus import MOCK_RESPONSES, load_portfolio, record, recorded_months, synthetic_sections
+from utils.datasets import DATASETS
+from utils.metrics import Metrics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Offline benchmarks: recorded filings instead of the datamule API, the mock server instead of Gemini.
+# python -m bench.run                          everything, report to bench/bench_report.json
+# python -m bench.run --only llm output        a subset
+# python -m bench.run --compare baseline.json  exit 1 if anything got slower or bigger than --tolerance
+# python -m bench.run --record 2020-01 --limit 300   freeze a month of real 8-Ks (needs the datamule API once)
+
+
+def _mock_build(dataset, rows, args, metrics, on_result=None):
+    """Run rows through a DatasetBuilder against the seeded mock server"""
+    from utils.builder import DatasetBuilder
+    from utils.controller import AdaptiveController
+    from utils.mock_llm import MockLLMServer
+
+    os.environ.setdefault('GEMINI_API_KEY', 'mock')
+    with MockLLMServer(latency=args.latency, jitter=args.latency / 2, error_rate=args.error_rate, seed=args.seed,
+                       response=MOCK_RESPONSES[dataset.name]) as server:
+        builder = DatasetBuilder(
+            prompt=dataset.prompt,
+            schema=dataset.schema,
+            model=dataset.model,
+            entries=[],
+            rpm=100000,
+            controller=AdaptiveController(initial=10, maximum=40),
+            base_url=server.url,
+            on_result=on_result,
+            release=True,
+            metrics=metrics,
+            **dataset.builder_kwargs,
+        )
+        builder.build_stream(((row['entry_id'], row['text']) for row in rows), window=1000)
+    return builder, dict(server.counts)
+
+
+def _result_rows(n, dataset):
+    """n output rows, metadata plus the mock response rows"""
+    template = MOCK_RESPONSES[dataset.name]['data']
+    rows = []
+    for i, section in enumerate(synthetic_sections(n // len(template) + 1, dataset.name, seed=1)):
+        for result in template:
+            rows.append({'accession': section['accession'], 'cik': section['cik'], 'filing_date': section['filing_date'],
+                         'entry_id': section['entry_id'], **result})
+    return rows[:n]
+
+
+def _timings(metrics, name):
+    stats = metrics.summary()['timings']
+    return {key: value for key, value in stats.items() if key.startswith(name)}
+
+
+def bench_extract(args, scratch):
+    """Section extraction over a recorded month"""
+    from utils.extract import extract_sections
+
+    month = args.fixture or next(iter(recorded_months()), None)
+    portfolio = load_portfolio(month, scratch) if month else None
+    if portfolio is None:
+        return {'skipped': 'no recorded month, run with --record YYYY-MM first'}
+
+    dataset = DATASETS[args.dataset]
+    metrics = Metrics()
+    start = time.perf_counter()
+    rows = extract_sections(portfolio, dataset.items, workers=args.workers, metrics=metrics)
+    seconds = time.perf_counter() - start
+
+    counters = metrics.summary()['counters']
+    submissions = counters.get('submissions_parsed', 0)
+    return {
+        'month': month,
+        'submissions': submissions,
+        'documents': counters.get('documents_parsed', 0),
+        'sections': len(rows),
+        'seconds': round(seconds, 3),
+        'get_section_seconds': counters.get('get_section_seconds', 0),
+        'submissions_per_s': round(submissions / seconds, 2),
+        'sections_per_s': round(len(rows) / seconds, 2),
+    }
+
+
+def bench_llm(args, scratch):
+    """Builder throughput against the mock, batching, controller and retries included"""
+    dataset = DATASETS[args.dataset]
+    rows = synthetic_sections(args.entries, dataset.name, seed=args.seed)
+    metrics = Metrics()
+    start = time.perf_counter()
+    builder, server_counts = _mock_build(dataset, rows, args, metrics)
+    seconds = time.perf_counter() - start
+
+    counters = metrics.summary()['counters']
+    latency = next(iter(_timings(metrics, 'llm_latency_seconds').values()), {})
+    extracted = sum(value for key, value in counters.items() if key.startswith('entries_extracted'))
+    return {
+        'entries': len(rows),
+        'extracted': extracted,
+        'failed': len(builder.entries),
+        'llm_calls': sum(value for key, value in counters.items() if key.startswith('llm_calls')),
+        'seconds': round(seconds, 3),
+        'entries_per_s': round(extracted / seconds, 2),
+        'latency_p50_seconds': latency.get('p50'),
+        'latency_p99_seconds': latency.get('p99'),
+        'server': server_counts,
+    }
+
+
+def bench_output(args, scratch):
+    """Streaming rows into a shard, then the parquet copy"""
+    from utils.parquet import write_parquet
+    from utils.store import ShardedStore
+
+    dataset = DATASETS[args.dataset]
+    rows = _result_rows(args.rows_per_month, dataset)
+    store = ShardedStore(os.path.join(scratch, dataset.name))
+
+    start = time.perf_counter()
+    with store.open_shard('2020-01', dataset.fieldnames()) as writer:
+        writer.writerows(rows)
+    csv_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_parquet(list(store.iter_rows(['2020-01'])), dataset.row_model, os.path.join(scratch, 'parquet'), basename='2020-01')
+    parquet_seconds = time.perf_counter() - start
+
+    return {
+        'rows': len(rows),
+        'shard_bytes': os.path.getsize(store.shard_path('2020-01')),
+        'csv_seconds': round(csv_seconds, 3),
+        'parquet_seconds': round(parquet_seconds, 3),
+        'csv_rows_per_s': round(len(rows) / csv_seconds, 1),
+        'parquet_rows_per_s': round(len(rows) / parquet_seconds, 1),
+    }
+
+
+def _legacy_append(path, rows, fieldnames):
+    """What full/proposal_results used to do every month: read the whole dataset, append, rewrite it"""
+    existing = []
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as infile:
+            existing = list(csv.DictReader(infile))
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(existing)
+        writer.writerows(rows)
+
+
+def bench_store_growth(args, scratch):
+    """Cost of adding month N as history grows, sharded store against the old cumulative rewrite"""
+    from utils.store import ShardedStore
+
+    dataset = DATASETS[args.dataset]
+    rows = _result_rows(args.rows_per_month, dataset)
+    fieldnames = dataset.fieldnames()
+    store = ShardedStore(os.path.join(scratch, dataset.name))
+    legacy_path = os.path.join(scratch, 'legacy.csv.gz')
+
+    sharded = []
+    legacy = []
+    for month in range(args.months):
+        key = f'{2010 + month // 12}-{month % 12 + 1:02d}'
+        start = time.perf_counter()
+        store.write_shard(key, rows, fieldnames)
+        sharded.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        _legacy_append(legacy_path, rows, fieldnames)
+        legacy.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    store.compact(os.path.join(scratch, 'compacted.csv.gz'))
+    compact_seconds = time.perf_counter() - start
+
+    return {
+        'months': args.months,
+        'rows_per_month': len(rows),
+        'sharded_first_seconds': round(sharded[0], 4),
+        'sharded_last_seconds': round(sharded[-1], 4),
+        'legacy_first_seconds': round(legacy[0], 4),
+        'legacy_last_seconds': round(legacy[-1], 4),
+        'legacy_total_seconds': round(sum(legacy), 3),
+        'sharded_total_seconds': round(sum(sharded), 3),
+        'compact_seconds': round(compact_seconds, 3),
+    }
+
+
+def bench_month(args, scratch):
+    """One month end to end: sections, dedup, spill, LLM (mock), shard, parquet"""
+    from utils.dedup import DedupIndex
+    from utils.extract import extract_sections
+    from utils.parquet import write_parquet
+    from utils.store import ShardedStore
+    from utils.stream import StreamingJoin, entry_metadata, iter_entries, spill_entries
+
+    dataset = DATASETS[args.dataset]
+    metrics = Metrics()
+    start = time.perf_counter()
+
+    month = args.fixture or next(iter(recorded_months()), None)
+    portfolio = load_portfolio(month, scratch) if month else None
+    with metrics.timer('sections'):
+        if portfolio is not None:
+            rows = extract_sections(portfolio, dataset.items, workers=args.workers, metrics=metrics)
+        else:
+            rows = synthetic_sections(args.entries, dataset.name, seed=args.seed)
+
+    with metrics.timer('dedup'):
+        dedup = DedupIndex(os.path.join(scratch, 'dedup.db'))
+        rows, duplicates = dedup.split(dataset.name, rows)
+
+    entries_path = os.path.join(scratch, 'entries.csv.gz')
+    with metrics.timer('spill'):
+        spill_entries(rows, entries_path)
+
+    metadata_lookup = {}
+
+    def entries():
+        for row in iter_entries(entries_path):
+            metadata_lookup[row['entry_id']] = entry_metadata(row)
+            yield row
+
+    store = ShardedStore(os.path.join(scratch, dataset.name))
+    with metrics.timer('build'):
+        with store.open_shard('month', dataset.fieldnames()) as writer:
+            join = StreamingJoin(writer, metadata_lookup, keep_field=dataset.keep_field)
+            _mock_build(dataset, entries(), args, metrics, on_result=join.on_result)
+            dedup.replay(dataset.name, duplicates, join)
+
+    with metrics.timer('write_parquet'):
+        write_parquet(list(store.iter_rows(['month'])), dataset.row_model, os.path.join(scratch, 'parquet'), basename='month')
+    seconds = time.perf_counter() - start
+
+    result = {
+        'source': month or 'synthetic',
+        'sections': len(rows) + len(duplicates),
+        'duplicates': len(duplicates),
+        'rows_written': join.rows,
+        'seconds': round(seconds, 3),
+        'sections_per_s': round((len(rows) + len(duplicates)) / seconds, 2),
+    }
+    for name, stats in _timings(metrics, '').items():
+        if '[' not in name and name.endswith('_seconds') and not name.startswith('llm') and not name.startswith('extract'):
+            result[name] = round(stats['sum'], 3)
+    return result
+
+
+BENCHMARKS = {
+    'extract': bench_extract,
+    'llm': bench_llm,
+    'output': bench_output,
+    'store_growth': bench_store_growth,
+    'month': bench_month,
+}
+
+
+def _child(name, args, conn):
+    """Run one benchmark in its own process, so peak RSS is its own"""
+    if not args.verbose:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+
+    scratch = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    try:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = BENCHMARKS[name](args, scratch)
+        # ru_maxrss is in KB on linux, workers count through RUSAGE_CHILDREN
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        if 'skipped' not in result:
+            result['peak_rss_mb'] = round(peak / 1024, 1)
+            result['start_rss_mb'] = round(baseline / 1024, 1)
+        conn.send(('ok', result))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        conn.close()
+
+
+def run_isolated(name, args):
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(name, args, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        status, payload = parent_conn.recv()
+    except EOFError:
+        status, payload = 'error', f'benchmark process died with exit code {process.exitcode}'
+    process.join()
+    if status == 'error':
+        return {'error': payload.strip().splitlines()[-1], 'traceback': payload}
+    return payload
+
+
+def best_of(results):
+    """Merge repeated runs, best throughput and time, worst memory, so one noisy run doesn't decide"""
+    if any('error' in result or 'skipped' in result for result in results):
+        return results[0]
+    merged = dict(results[0])
+    for key, value in merged.items():
+        if not isinstance(value, (int, float)):
+            continue
+        values = [result[key] for result in results if isinstance(result.get(key), (int, float))]
+        if key.endswith('_per_s'):
+            merged[key] = max(values)
+        elif key.endswith('seconds'):
+            merged[key] = min(values)
+        elif key == 'peak_rss_mb':
+            merged[key] = max(values)
+    merged['repeat'] = len(results)
+    return merged
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(report, baseline, tolerance):
+    """Print the change against a baseline report, return the regressions"""
+    regressions = []
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('created')}), tolerance {tolerance:.0%}")
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'skipped' in base or 'error' in base or 'skipped' in result or 'error' in result:
+            continue
+        for key, value in result.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            # throughput should not drop, time and memory should not grow
+            if key.endswith('_per_s'):
+                worse = value < old * (1 - tolerance)
+            elif key.endswith('seconds') or key == 'peak_rss_mb':
+                worse = value > old * (1 + tolerance)
+            else:
+                continue
+            change = value / old - 1
+            flag = '  REGRESSION' if worse else ''
+            print(f"- {name}.{key}: {old} -> {value} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f'{name}.{key}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the extraction pipeline')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--dataset', default='proposal_results', choices=list(DATASETS))
+    parser.add_argument('--fixture', default=None, help='recorded month to use, default the first one in bench/fixtures')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--entries', type=int, default=2000, help='synthetic sections for the llm and month benchmarks')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock LLM mean latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--rows-per-month', type=int, default=5000)
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'bench_report.json'))
+    parser.add_argument('--compare', default=None, help='baseline report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best is reported')
+    parser.add_argument('--verbose', action='store_true', help='show benchmark output')
+    parser.add_argument('--record', default=None, metavar='YYYY-MM', help='record a month of real filings and exit')
+    parser.add_argument('--limit', type=int, default=None, help='submissions to keep when recording')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, limit=args.limit)
+        return
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'verbose', 'record', 'limit')},
+        'results': {},
+    }
+    for name in args.only:
+        print(f"Running {name}...")
+        result = best_of([run_isolated(name, args) for _ in range(args.repeat)])
+        report['results'][name] = result
+        print(f"- {json.dumps({key: value for key, value in result.items() if key != 'traceback'})}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
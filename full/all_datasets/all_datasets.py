@@ -0,0 +1,268 @@
+from datetime import datetime
+import argparse
+import os
+import sys
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from utils.builder import DatasetBuilder, RateLimiter
+from utils.cache import LLMCache
+from utils.controller import AdaptiveController
+from utils.corpus import SectionCorpus
+from utils.datasets import DATASETS
+from utils.dates import covers_month, generate_monthly_date_ranges, month_is_complete
+from utils.dedup import DedupIndex
+from utils.entry_index import EntryIndex
+from utils.extract import extract_sections
+from utils.ledger import Ledger
+from utils.metrics import Metrics
+from utils.parquet import write_parquet
+from utils.pipeline import Pipeline
+from utils.query import QueryIndex
+from utils.reextract import ReextractQueue
+from utils.router import ROUTER_MODELS, ModelPool
+from utils.store import ShardedStore
+from utils.stream import StreamingJoin, entry_metadata, iter_entries, spill_entries
+from utils.submission_cache import SubmissionCache, download_cached
+
+logging.getLogger('google_genai.models').setLevel(logging.WARNING)
+
+# One download and one parse of each month's 8-Ks feeds every registered dataset.
+# Adding a dataset to utils/datasets.py only adds its LLM calls.
+
+
+def unit(dataset, date_tuple):
+    return f'{dataset.name}/{date_tuple[0][:7]}'
+
+
+def pending_datasets(date_tuple):
+    return [dataset for dataset in datasets if not ledger.is_done(unit(dataset, date_tuple))]
+
+
+def finish_month(dataset, date_tuple, rows):
+    # the current month is still filling up, leave it for the next run
+    if not month_is_complete(date_tuple):
+        return
+    # entries that failed every round keep the month pending, the next run redoes it from the
+    # response cache and only pays for them
+    missing = ledger.missing(unit(dataset, date_tuple))
+    if missing:
+        print(f"{unit(dataset, date_tuple)}: {len(missing)} entries failed, left for the next run")
+        return
+    ledger.mark_done(unit(dataset, date_tuple), rows=rows)
+
+
+def month_items(date_tuple):
+    """Every item any pending dataset wants, in a single parse of each document"""
+    return sorted({item for dataset in pending_datasets(date_tuple) for item in dataset.items})
+
+
+def download_month(date_tuple):
+    # months already in the section corpus skip download and parsing
+    if section_corpus.extracted(date_tuple[0][:7], month_items(date_tuple)):
+        return date_tuple, None
+    portfolio, stats = download_cached(os.path.join('8k_all', date_tuple[0][:7]), date_tuple, cache=submission_cache)
+    metrics.inc('bytes_downloaded', stats['bytes_downloaded'])
+    metrics.inc('submissions_cached', stats['restored'])
+    metrics.inc('submissions_downloaded', stats['downloaded'])
+    return date_tuple, portfolio
+
+
+def parse_month(downloaded):
+    date_tuple, portfolio = downloaded
+    month = date_tuple[0][:7]
+    todo = pending_datasets(date_tuple)
+
+    items = month_items(date_tuple)
+    if portfolio is None:
+        rows = list(section_corpus.iter_rows(months=month, items=items))
+        metrics.inc('sections_from_corpus', len(rows))
+    else:
+        rows = extract_sections(portfolio, items, extensions=('.htm', '.html'), metrics=metrics)
+        section_corpus.add(rows)
+        if covers_month(date_tuple) and month_is_complete(date_tuple):
+            section_corpus.mark_extracted(month, items)
+
+        # sections are extracted, free the disk before the next month lands
+        portfolio.delete()
+
+    # months served from the corpus are indexed too, re-extraction looks their entries up here
+    entry_index.add(rows)
+
+    # route sections to the datasets that want them
+    entries_paths = {}
+    for dataset in todo:
+        dataset_rows = [row for row in rows if row['item'] in dataset.items]
+        if dataset.prefilter is not None:
+            dataset_rows = dataset.prefilter.filter(dataset_rows, dropped_path=f'{dataset.name}_dropped.csv')
+
+        if len(dataset_rows) == 0:
+            finish_month(dataset, date_tuple, 0)
+            continue
+
+        dataset_rows, duplicates = dedup.split(dataset.name, dataset_rows)
+        metrics.inc('duplicate_sections', len(duplicates), dataset=dataset.name)
+
+        entries_path = f'{dataset.name}_entries_{month}.csv.gz'
+        with metrics.timer('spill', dataset=dataset.name):
+            spill_entries(dataset_rows, entries_path)
+        # a month left pending by an earlier run is redone whole, only this run's entries count
+        if unit(dataset, date_tuple) in ledger.submitted:
+            ledger.reset(unit(dataset, date_tuple))
+        ledger.mark_submitted(unit(dataset, date_tuple), [row['entry_id'] for row in dataset_rows])
+        entries_paths[dataset.name] = (entries_path, duplicates)
+
+    if not entries_paths:
+        return None
+    return date_tuple, entries_paths
+
+
+def build_dataset_month(dataset, date_tuple, entries_path, duplicates):
+    month = date_tuple[0][:7]
+    store = stores[dataset.name]
+
+    # only metadata stays in memory, texts are read back one window at a time
+    metadata_lookup = {}
+
+    def entries():
+        for row in iter_entries(entries_path):
+            metadata_lookup[row['entry_id']] = entry_metadata(row)
+            yield (row['entry_id'], row['text'])
+
+    with store.open_shard(month, dataset.fieldnames()) as writer:
+        join = StreamingJoin(writer, metadata_lookup, keep_field=dataset.keep_field, validator=validators[dataset.name])
+
+        # rows first, recording for dedup is best effort
+        def on_result(entry_id, results):
+            join.on_result(entry_id, results)
+            dedup.record(dataset.name, entry_id, results)
+
+        builder = DatasetBuilder(
+            prompt=dataset.prompt,
+            schema=dataset.schema,
+            model=dataset.model,
+            entries=[],
+            rpm=4000,
+            cache = cache,
+            controller = controllers.get(dataset.name),
+            router = routers.get(dataset.name),
+            checks = dataset.checks,
+            on_result = on_result,
+            release = True,
+            metrics = metrics,
+            **dataset.builder_kwargs,
+        )
+        builder.build_stream(entries(), window=1000)
+        dedup.replay(dataset.name, duplicates, join)
+
+    ledger.mark_completed(unit(dataset, date_tuple), join.completed)
+    os.remove(entries_path)
+    metrics.inc('rows_written', join.rows, dataset=dataset.name)
+    metrics.inc('entries_invalid', reextract_queue.add(dataset.name, month, join.issues), dataset=dataset.name)
+
+    with metrics.timer('write_parquet', dataset=dataset.name):
+        write_parquet(list(store.iter_rows([month])), dataset.row_model, f'{dataset.name}_parquet', basename=month)
+    finish_month(dataset, date_tuple, join.rows)
+    metrics.event('month', dataset=dataset.name, month=month, entries=len(join.completed), rows=join.rows)
+    metrics.flush()
+
+
+def build_month(parsed):
+    date_tuple, entries_paths = parsed
+    for dataset in datasets:
+        if dataset.name in entries_paths:
+            build_dataset_month(dataset, date_tuple, *entries_paths[dataset.name])
+    return date_tuple
+
+
+# extraction workers import this script, only a direct run goes past here
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', default='2010-04-01')
+    parser.add_argument('--end', default=datetime.today().strftime('%Y-%m-%d'))
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    args = parser.parse_args()
+
+    datasets = [DATASETS[name] for name in args.datasets]
+
+    # one store per dataset, one ledger unit per dataset and month, so a new dataset backfills on its own
+    stores = {dataset.name: ShardedStore(dataset.name) for dataset in datasets}
+
+    # results are normalized and checked as they are written, entries that still look wrong are
+    # queued and re-extracted alone at the end of the run
+    validators = {dataset.name: dataset.validator() for dataset in datasets}
+    reextract_queue = ReextractQueue('all_datasets_reextract.db')
+    ledger = Ledger('all_datasets_ledger.jsonl')
+
+    # all datasets share the cache and the API quota
+    cache = LLMCache(max_bytes=2 * 1024**3)
+
+    # raw submissions are kept compressed across reruns and shared with the other scripts, only misses are downloaded
+    submission_cache = SubmissionCache()
+
+    # section texts by entry id, kept across runs so new datasets and prompts over old months start from them
+    section_corpus = SectionCorpus()
+
+    # datasets with checks go to flash-lite first and move up to flash when the output fails them,
+    # or the section is long or has many numbers. Each dataset gets its own router and pools, so it
+    # adapts its own concurrency, while the datasets share one rate limiter per model
+    limiters = {model: RateLimiter(rpm) for model, rpm, _ in ROUTER_MODELS}
+
+    def make_pool(model, rpm, max_concurrent):
+        return ModelPool(model, rpm, max_concurrent, rate_limiter=limiters[model])
+
+    routers = {dataset.name: dataset.router(make_pool) for dataset in datasets if dataset.checks}
+
+    # datasets without checks stay on their model, with one controller each, kept across months. The
+    # builder lowers a controller's maximum to its own max_concurrent, a shared one would stay at the smallest dataset's
+    controllers = {
+        dataset.name: AdaptiveController(initial=10, maximum=dataset.builder_kwargs.get('max_concurrent', 40))
+        for dataset in datasets if not dataset.checks
+    }
+
+    # entry id -> filing, document and item, one index for every dataset
+    entry_index = EntryIndex('all_datasets_entries.db')
+
+    # duplicates are tracked per dataset, a section can be new to one dataset and seen by another
+    dedup = DedupIndex()
+
+    # stage timings, LLM latency, tokens and counters go to a json-lines run log, and to a
+    # Prometheus textfile when $SEC_METRICS_TEXTFILE is set. $SEC_PROFILE_PARSE=<dir> profiles the parse loop
+    metrics = Metrics('all_datasets_runs.jsonl', prom_path=os.environ.get('SEC_METRICS_TEXTFILE'))
+
+    date_tuples = generate_monthly_date_ranges(args.start, args.end)
+
+    # months every selected dataset has finished are skipped before anything touches the network
+    date_tuples = [date_tuple for date_tuple in date_tuples if pending_datasets(date_tuple)]
+    print(f"{len(date_tuples)} months to process for {', '.join(dataset.name for dataset in datasets)}")
+
+    pipeline = Pipeline([download_month, parse_month, build_month], maxsize=1, metrics=metrics)
+    pipeline.run(date_tuples)
+
+    # entries that failed validation go back to the LLM one by one, on the bigger model and past the
+    # response cache, and only their months' shards are rewritten
+    for dataset in datasets:
+        reextract_builder = DatasetBuilder(
+            prompt=dataset.prompt,
+            schema=dataset.schema,
+            model="gemini-2.5-flash",
+            entries=[],
+            rpm=1000,
+            max_concurrent=10,
+            timeout=60,
+            controller = AdaptiveController(initial=5, maximum=10),
+            chunker = dataset.builder_kwargs.get('chunker'),
+            metrics = metrics,
+        )
+        with metrics.timer('reextract', dataset=dataset.name):
+            for key in reextract_queue.run(dataset, stores[dataset.name], reextract_builder, section_corpus):
+                write_parquet(list(stores[dataset.name].iter_rows([key])), dataset.row_model, f'{dataset.name}_parquet', basename=key)
+
+    # Concatenate monthly shards into the published datasets, and sync the indexed copy
+    query_index = QueryIndex('sec_datasets.db')
+    for dataset in datasets:
+        with metrics.timer('compact', dataset=dataset.name):
+            stores[dataset.name].compact(f'{dataset.name}.csv.gz')
+        with metrics.timer('query_index', dataset=dataset.name):
+            query_index.load_store(dataset.name, stores[dataset.name])
+    metrics.close()
@@ -1,206 +1,289 @@
-from txt2dataset import DatasetBuilder
-from pydantic import BaseModel
-from typing import Optional, List, Literal
 from datetime import datetime
-import csv
-import gzip
+import argparse
 import os
-from datamule import Portfolio
-from datetime import datetime
-import calendar
-from tqdm import tqdm
+import subprocess
+import sys
 import logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from utils.builder import DatasetBuilder
+from utils.cache import LLMCache
+from utils.controller import AdaptiveController
+from utils.corpus import SectionCorpus
+from utils.datasets import PROPOSAL_RESULTS
+from utils.dates import covers_month, filing_month, generate_monthly_date_ranges, month_is_complete
+from utils.dedup import DedupIndex
+from utils.entry_index import EntryIndex
+from utils.extract import extract_sections
+from utils.ledger import Ledger
+from utils.metrics import Metrics
+from utils.parquet import write_parquet
+from utils.pipeline import Pipeline
+from utils.query import QueryIndex
+from utils.quota import SharedRateLimiter, WorkQueue
+from utils.reextract import ReextractQueue
+from utils.router import ModelPool
+from utils.store import ShardedStore
+from utils.stream import StreamingJoin, entry_metadata, iter_entries, spill_entries
+from utils.submission_cache import SubmissionCache, download_cached
+
 logging.getLogger('google_genai.models').setLevel(logging.WARNING)
 
-def generate_monthly_date_ranges(start_date_str, end_date_str):
-    start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-    end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-    
-    monthly_ranges = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        # Get the last day of the current month
-        last_day_of_month = calendar.monthrange(current_date.year, current_date.month)[1]
-        month_end = datetime(current_date.year, current_date.month, last_day_of_month)
-        
-        # Use the earlier of month_end or end_date
-        range_end = min(month_end, end_date)
-        
-        # Add tuple of (start_date_str, end_date_str) for this month
-        monthly_ranges.append((
-            current_date.strftime('%Y-%m-%d'),
-            range_end.strftime('%Y-%m-%d')
-        ))
-        
-        # Move to the first day of the next month
-        if current_date.month == 12:
-            current_date = datetime(current_date.year + 1, 1, 1)
-        else:
-            current_date = datetime(current_date.year, current_date.month + 1, 1)
-    
-    return monthly_ranges
-
-
-class ProposalResult(BaseModel):
-    proposal_description: Optional[str] = None  # What was being voted on
-    presentation_order: Optional[int] = None  # Sequential order (1, 2, 3...)
-    assigned_number: Optional[str] = None  # Assigned numbering (1a, 1b, 1c...)
-    votes_for: Optional[int] = None  # Votes in favor
-    votes_against: Optional[int] = None  # Votes against
-    abstentions: Optional[int] = None  # Abstention votes
-    broker_non_votes: Optional[int] = None  # Broker non-votes (if present)
-    proponent_type: Optional[str] = None  # "Management" or "Shareholder"
-    meeting_date: Optional[str] = None  # Date of the meeting, should specfic to date YYYY-MM-DD
-    meeting_type: Optional[Literal["Annual", "Special"]] = None  # Only "Annual" or "Special"
-
-
-class ProposalResultsExtraction(BaseModel):
-    info_found: bool
-    data: List[ProposalResult] = []
-
-
-# Load existing results if they exist
-all_results = []
-if os.path.exists('proposal_results.csv.gz'):
-    with gzip.open('proposal_results.csv.gz', 'rt', newline='', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        all_results = list(reader)
-
-portfolio = Portfolio('8k_proposals')
-# Item 5.07 is adopted around 2010
-date_tuples = generate_monthly_date_ranges('2010-04-01',datetime.today().strftime('%Y-%m-%d'))
-for date_tuple in date_tuples:
-    portfolio.download_submissions(submission_type=['8-K','8-K/A'],document_type=['8-K','8-K/A'],filing_date=(date_tuple[0],date_tuple[1]))
-
-    # construct entries
-    rows = []
-    for sub in tqdm(portfolio):
-        try:
-            accession = sub.metadata.content['accession-number']
-            filing_date = sub.metadata.content['filing-date']
-
-            # validation check if any item is a list - issue w/metadata in malformed sgml
-            if isinstance(accession,list):
-                accession = accession[0]
-
-            if isinstance(filing_date,list):
-                filing_date = filing_date[0]
-
-            filer = sub.metadata.content['filer']
-            
-            # handles when company names change
-            if not isinstance(filer, list):
-                filer = [filer]
-            
-            filer_cik = filer[0]['company-data']['cik']
-            for doc in sub.document_type(['8-K','8-K/A']):
-                if doc.extension in ['.htm','.html']:
-                    item507 = doc.get_section(title='item5.07',title_class='item', format='text')
-                    #print(doc.get_section(title_regex='item',title_class='item', format='text'))
-                    if len(item507) != 0:
-                        rows.append({'accession':accession,'cik':filer_cik,'filing_date':filing_date,'text':item507[0]})
-
-        except Exception as e:
-            print(e)
+def finish_month(date_tuple, rows):
+    month = date_tuple[0][:7]
+    # the current month is still filling up, leave it for the next run
+    if not month_is_complete(date_tuple):
+        return
+    # entries that failed every attempt keep the month pending, the next run redoes it from the
+    # response cache and only pays for them
+    missing = ledger.missing(month)
+    if missing:
+        print(f"{month}: {len(missing)} entries failed, left for the next run")
+        return
+    ledger.mark_done(month, rows=rows)
+
+
+# Stages below run concurrently: while month N-1 is at the LLM, month N is parsed and month N+1 downloads.
+# Each month gets its own portfolio directory and entries file, so neither stages nor worker processes
+# ever clobber each other.
+
+def finish_claim(date_tuple):
+    if work_queue is not None:
+        work_queue.done(date_tuple[0][:7])
+
+
+def download_month(date_tuple):
+    # months already in the section corpus skip download and parsing
+    if section_corpus.extracted(date_tuple[0][:7], PROPOSAL_RESULTS.items):
+        return date_tuple, None
+    portfolio, stats = download_cached(os.path.join('8k_proposals', date_tuple[0][:7]), date_tuple, cache=submission_cache)
+    metrics.inc('bytes_downloaded', stats['bytes_downloaded'])
+    metrics.inc('submissions_cached', stats['restored'])
+    metrics.inc('submissions_downloaded', stats['downloaded'])
+    return date_tuple, portfolio
+
+
+def parse_month(downloaded):
+    date_tuple, portfolio = downloaded
+    month = date_tuple[0][:7]
+
+    if portfolio is None:
+        rows = list(section_corpus.iter_rows(months=month, items=PROPOSAL_RESULTS.items))
+        metrics.inc('sections_from_corpus', len(rows))
+    else:
+        # construct entries, submissions are parsed across worker processes. Month workers split the cores
+        rows = extract_sections(portfolio, PROPOSAL_RESULTS.items, workers=max(1, (os.cpu_count() or 1) // args.workers),
+                                extensions=('.htm', '.html'), metrics=metrics)
+        section_corpus.add(rows)
+        if covers_month(date_tuple) and month_is_complete(date_tuple):
+            section_corpus.mark_extracted(month, PROPOSAL_RESULTS.items)
+
+        # sections are extracted, free the disk before the next month lands
+        portfolio.delete()
 
     # if empty skip
     if len(rows) == 0:
-        portfolio.delete()
-        continue
-
-    
-    with gzip.open('entries.csv.gz', 'wt', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['accession', 'cik', 'filing_date', 'text']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-        
-        writer.writeheader()
-        writer.writerows(rows)
-
-    # construct entries from rows and accession (accession,text)
-    entries = [(row['accession'], row['text']) for row in rows]
-
-    # Create builder
-    builder = DatasetBuilder(
-        prompt="""Extract shareholder proposal voting results from shareholder meeting reports. For each proposal voted on, extract:
-        1. Proposal description (what was being voted on). Summarize in your own words.
-        2. Presentation order (sequential: 1st, 2nd, 3rd proposal presented)
-        3. Assigned number/letter (e.g. if the text has a defined numbering system for proposals, use it)
-        4. Vote counts: For, Against, Abstentions, Broker Non-Votes (if mentioned)
-        5. Proponent type: 'Management' (if proposed by company/board) or 'Shareholder' (if shareholder proposal)
-        6. Meeting date and type (Annual or Special meeting)
-        
-        Only extract when actual voting results with vote counts are reported. Skip general descriptions without vote tallies.""",
-        schema=ProposalResultsExtraction,
-        model="gemini-2.5-flash-lite", # should use more powerful model as prompt is more complex, but google rate limits is being annoying
-        entries=entries,
-        rpm=4000,
-        max_concurrent = 40,
-        timeout = 60,
+        finish_month(date_tuple, 0)
+        finish_claim(date_tuple)
+        return None
+    entry_index.add(rows)
+
+    # an amendment repeating its 8-K would add the same proposals twice, only new texts go to the LLM
+    rows, duplicates = dedup.split(PROPOSAL_RESULTS.name, rows)
+    metrics.inc('duplicate_sections', len(duplicates), dataset=PROPOSAL_RESULTS.name)
+
+    # spill section texts to disk, the LLM stage streams them back
+    entries_path = f'entries_{month}.csv.gz'
+    with metrics.timer('spill'):
+        spill_entries(rows, entries_path)
+
+    # a month left pending by an earlier run is redone whole, only this run's entries count
+    if month in ledger.submitted:
+        ledger.reset(month)
+    ledger.mark_submitted(month, [row['entry_id'] for row in rows])
+
+    return date_tuple, entries_path, duplicates
+
+
+def build_month(parsed):
+    date_tuple, entries_path, duplicates = parsed
+    month = date_tuple[0][:7]
+
+    # only metadata stays in memory, texts are read back one window at a time
+    metadata_lookup = {}
+
+    def entries():
+        for row in iter_entries(entries_path):
+            metadata_lookup[row['entry_id']] = entry_metadata(row)
+            yield (row['entry_id'], row['text'])
+
+    new_fieldnames = PROPOSAL_RESULTS.fieldnames()
+    with store.open_shard(month, new_fieldnames) as writer:
+        # results are joined with metadata and written to this month's shard as they come back
+        join = StreamingJoin(writer, metadata_lookup, keep_field=PROPOSAL_RESULTS.keep_field, validator=validator)
+
+        # rows first, recording for dedup is best effort
+        def on_result(entry_id, results):
+            join.on_result(entry_id, results)
+            dedup.record(PROPOSAL_RESULTS.name, entry_id, results)
+
+        # Create builder
+        builder = DatasetBuilder(
+            prompt=PROPOSAL_RESULTS.prompt,
+            schema=PROPOSAL_RESULTS.schema,
+            model=PROPOSAL_RESULTS.model,
+            entries=[],
+            rpm=4000,
+            cache = cache,
+            router = router,
+            checks = PROPOSAL_RESULTS.checks,
+            on_result = on_result,
+            release = True,
+            metrics = metrics,
+            **PROPOSAL_RESULTS.builder_kwargs, # max_concurrent, timeout, batch_tokens, chunker
+        )
+
+        # Build dataset
+        builder.build_stream(entries(), window=1000)
+
+        # a repeated section gets the original's proposals under its own entry id
+        dedup.replay(PROPOSAL_RESULTS.name, duplicates, join)
+
+    ledger.mark_completed(month, join.completed)
+    os.remove(entries_path)
+    metrics.inc('rows_written', join.rows, dataset=PROPOSAL_RESULTS.name)
+    metrics.inc('entries_invalid', reextract_queue.add(PROPOSAL_RESULTS.name, month, join.issues), dataset=PROPOSAL_RESULTS.name)
+
+    # typed copy partitioned by filing year, for analysis without re-parsing the csv
+    with metrics.timer('write_parquet'):
+        write_parquet(list(store.iter_rows([month])), PROPOSAL_RESULTS.row_model, 'proposal_results_parquet', basename=month)
+    finish_month(date_tuple, join.rows)
+    finish_claim(date_tuple)
+    metrics.event('month', dataset=PROPOSAL_RESULTS.name, month=month, entries=len(join.completed), rows=join.rows)
+    metrics.flush()
+
+    return date_tuple
+
+
+# extraction workers import this script, only a direct run goes past here
+if __name__ == '__main__':
+    # --workers N runs N worker processes, each claiming months from a shared queue and drawing on one
+    # global quota per model. This process then waits for them and does the reextract, compact and index steps
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    parallel = args.workers > 1
+
+    # One shard per month, written once. proposal_results.csv.gz is compacted from the shards at the end
+    store = ShardedStore('proposal_results')
+
+    # record of finished months, so a crashed or nightly run resumes at the first incomplete month
+    ledger = Ledger('proposal_results_ledger.jsonl')
+
+    # migrate the old single file dataset into monthly shards
+    if not store.keys() and os.path.exists('proposal_results.csv.gz'):
+        store.import_legacy('proposal_results.csv.gz', key_func=lambda row: filing_month(row['filing_date']))
+        current_month = datetime.today().strftime('%Y-%m')
+        for key in store.keys():
+            write_parquet(list(store.iter_rows([key])), PROPOSAL_RESULTS.row_model, 'proposal_results_parquet', basename=key)
+            if key < current_month:
+                ledger.mark_done(key, rows=store.manifest['shards'][key]['rows'])
+
+    # responses are reused across nightly reruns, capped at 2GB
+    cache = LLMCache(max_bytes=2 * 1024**3)
+
+    # raw submissions are kept compressed across reruns and shared with the other scripts, only misses are downloaded
+    submission_cache = SubmissionCache()
+
+    # section texts by entry id, kept across runs so a new prompt or schema over old months starts from them
+    section_corpus = SectionCorpus()
+
+    # entry id -> filing, document and item, so any output row can be traced or re-extracted alone
+    entry_index = EntryIndex('proposal_results_entries.db')
+
+    # 8-K/A amendments and reused boilerplate are matched against every section seen before
+    dedup = DedupIndex()
+
+    # months to process, claimed one at a time by the worker processes
+    work_queue = WorkQueue('proposal_results_queue.db') if parallel else None
+
+    def make_pool(model, rpm, max_concurrent):
+        """A router pool, in parallel mode limited by the quota all workers share and with a share of the concurrency"""
+        if not parallel:
+            return ModelPool(model, rpm, max_concurrent)
+        return ModelPool(model, rpm, max(1, -(-max_concurrent // args.workers)), rate_limiter=SharedRateLimiter(model, rpm))
+
+    # entries go to flash-lite first and move up to flash when the output fails the dataset's checks
+    # or the section is long or has many vote counts. Each model has its own quota and its own
+    # adaptive concurrency, shared across months so it keeps what it learned
+    router = PROPOSAL_RESULTS.router(make_pool)
+
+    # results are normalized (dates, counts, proponent types) and checked as they are written,
+    # entries that still look wrong are queued and re-extracted alone at the end of the run
+    validator = PROPOSAL_RESULTS.validator()
+    reextract_queue = ReextractQueue('proposal_results_reextract.db')
+
+    # stage timings, LLM latency, tokens and counters go to a json-lines run log, and to a
+    # Prometheus textfile when $SEC_METRICS_TEXTFILE is set (not by workers, they would overwrite each other).
+    # $SEC_PROFILE_PARSE=<dir> profiles the parse loop
+    metrics = Metrics('proposal_results_runs.jsonl', prom_path=None if args.worker else os.environ.get('SEC_METRICS_TEXTFILE'))
+
+    # Item 5.07 is adopted around 2010
+    date_tuples = generate_monthly_date_ranges('2010-04-01',datetime.today().strftime('%Y-%m-%d'))
+
+    # bounded queues: at most one finished month waits between stages, so disk and memory stay capped
+    pipeline = Pipeline([download_month, parse_month, build_month], maxsize=1, metrics=metrics)
+
+    if args.worker is not None:
+        # a worker takes the next month as soon as its download stage is free, until the queue is drained
+        pipeline.run(work_queue.iter_claims(args.worker))
+        metrics.close()
+        sys.exit(0)
+
+    # finished months are skipped before anything touches the network
+    date_tuples = ledger.pending(date_tuples, key=lambda date_tuple: date_tuple[0][:7])
+    print(f"{len(date_tuples)} months to process")
+
+    if parallel:
+        # every unfinished month is queued again, so months claimed by workers of a killed run are picked up
+        work_queue.add(date_tuples)
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--workers', str(args.workers), '--worker', str(i)])
+                   for i in range(args.workers)]
+        failed = [i for i, worker in enumerate(workers) if worker.wait() != 0]
+        print(f"Workers done, months {work_queue.counts()}")
+        if failed:
+            print(f"Workers {failed} failed, their months are retried on the next run")
+
+        # shards, ledger records and queued re-extractions were written by the workers
+        store.reload()
+        ledger.reload()
+    else:
+        pipeline.run(date_tuples)
+
+    # entries that failed validation go back to the LLM one by one, on the bigger model and past the
+    # response cache, and only their months' shards are rewritten
+    reextract_builder = DatasetBuilder(
+        prompt=PROPOSAL_RESULTS.prompt,
+        schema=PROPOSAL_RESULTS.schema,
+        model="gemini-2.5-flash",
+        entries=[],
+        rpm=1000,
+        max_concurrent=10,
+        timeout=60,
+        controller = AdaptiveController(initial=5, maximum=10),
+        chunker = PROPOSAL_RESULTS.builder_kwargs.get('chunker'),
+        metrics = metrics,
     )
+    with metrics.timer('reextract'):
+        for key in reextract_queue.run(PROPOSAL_RESULTS, store, reextract_builder, section_corpus):
+            write_parquet(list(store.iter_rows([key])), PROPOSAL_RESULTS.row_model, 'proposal_results_parquet', basename=key)
+
+    # Concatenate monthly shards into the published dataset
+    with metrics.timer('compact'):
+        store.compact('proposal_results.csv.gz')
 
-    # Build dataset
-    builder.build()
-
-    # Save to regular csv first, then gzip it
-    builder.save('results.csv')
-
-    # Gzip the results file
-    with open('results.csv', 'rb') as f_in:
-        with gzip.open('results.csv.gz', 'wb') as f_out:
-            f_out.writelines(f_in)
-
-    # Remove the uncompressed file
-    os.remove('results.csv')
-
-    # Create enhanced CSV with metadata using only csv module
-    metadata_lookup = {row['accession']: {'cik': row['cik'], 'filing_date': row['filing_date']} for row in rows}
-
-    # Read this month's results and add to all_results
-    current_month_results = []
-    with gzip.open('results.csv.gz', 'rt', newline='', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        original_fields = reader.fieldnames
-        
-        for row in reader:
-            # Get metadata for this accession
-            accession = row['_id']
-            metadata = metadata_lookup.get(accession, {})
-            
-            # Create new row with metadata
-            new_row = {
-                'accession': accession,
-                'cik': metadata.get('cik', ''),
-                'filing_date': metadata.get('filing_date', '')
-            }
-            
-            # Add all other fields except _id
-            for field in original_fields:
-                if field != '_id':
-                    new_row[field] = row[field]
-            
-            # only add if proposal data has actual data
-            if new_row.get('proposal_description') and new_row.get('proposal_description').strip():
-                current_month_results.append(new_row)
-    
-    # Add current month results to all results
-    all_results.extend(current_month_results)
-    
-    # Save cumulative results
-    if all_results:  # Only write if we have data
-        with gzip.open('proposal_results.csv.gz', 'wt', newline='', encoding='utf-8') as outfile:
-            # Use fieldnames from the structure we know
-            new_fieldnames = ['accession', 'cik', 'filing_date'] + [f for f in original_fields if f != '_id']
-            
-            writer = csv.DictWriter(outfile, fieldnames=new_fieldnames, quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-            writer.writerows(all_results)
-
-    # Clean up intermediate files
-    if os.path.exists('entries.csv.gz'):
-        os.remove('entries.csv.gz')
-    if os.path.exists('results.csv.gz'):
-        os.remove('results.csv.gz')
-
-    # cleanup portfolio
-    portfolio.delete()
+    # indexed copy for lookups by cik, date, proponent and support ratio, only changed months are reloaded
+    with metrics.timer('query_index'):
+        QueryIndex('proposal_results.db').load_store(PROPOSAL_RESULTS.name, store)
+    metrics.close()
@@ -0,0 +1,76 @@
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from utils.builder import DatasetBuilder, batch_schema
+from utils.cache import LLMCache
+from utils.mock_llm import MockLLMServer
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+# answers single calls and batched calls alike, the batch part only for sections 0 and 1
+RESPONSE = {
+    'info_found': True,
+    'data': [{'value': 9}],
+    'results': [
+        {'entry_id': '0', 'info_found': True, 'data': [{'value': 0}]},
+        {'entry_id': '1', 'info_found': False, 'data': []},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+
+
+def make_builder(entries, **kwargs):
+    return DatasetBuilder('prompt', Extraction, 'mock', entries, rpm=1000, api_key='mock', **kwargs)
+
+
+def test_batch_schema():
+    schema = batch_schema(Extraction)
+    parsed = schema(results=[{'entry_id': '3', 'info_found': True, 'data': [{'value': 1}]}])
+    assert parsed.results[0].entry_id == '3'
+    assert parsed.results[0].data[0].value == 1
+
+
+def test_make_batches():
+    entries = [('short', 'x' * 40), ('long', 'x' * 4000), ('a', 'x' * 40), ('b', 'x' * 40), ('c', 'x' * 40)]
+    builder = make_builder(entries, batch_tokens=30, max_batch_size=2)
+    # 10 tokens each, the long one is sent alone and a batch of one is no batch
+    assert builder._make_batches() == [[0, 2], [3, 4]]
+    builder = make_builder(entries, batch_tokens=30, max_batch_size=20)
+    assert builder._make_batches() == [[0, 2, 3]]
+
+
+def test_results_map_back_and_missing_entries_fall_back(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    entries = [('a', 'text a'), ('b', 'text b'), ('c', 'text c')]
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder = make_builder(entries, base_url=server.url, batch_tokens=100, cache=cache)
+        builder.build()
+    # one batched call answers a and b, c is missing from it and gets a single call
+    assert server.counts['ok'] == 2
+    assert sorted((r['_id'], r['value']) for r in builder.get_results()) == [('a', 0), ('c', 9)]
+    # batched answers are cached per section
+    assert cache.get('mock', 'prompt', Extraction, 'text b')[0] == []
+
+
+def test_batch_timeout_scales_with_the_batch():
+    entries = [(str(i), f'text {i}') for i in range(2)]
+    with MockLLMServer(latency=0.3, jitter=0, response=RESPONSE) as server:
+        builder = make_builder(entries, base_url=server.url, batch_tokens=100, timeout=0.2)
+        builder.build()
+    # a single call would time out, the batch of two gets 0.4s
+    assert len(builder.get_results()) == 1
+    assert not builder.get_errors()
@@ -0,0 +1,83 @@
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+import utils.builder
+from utils.builder import DatasetBuilder
+from utils.controller import AdaptiveController
+from utils.mock_llm import MockLLMServer
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+RESPONSE = {'info_found': True, 'data': [{'value': 1}]}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+    monkeypatch.setattr(utils.builder, 'backoff', lambda attempt, base=1.0, cap=60.0: 0)
+
+
+def entries(n):
+    return [(str(i), f'text {i}') for i in range(n)]
+
+
+def test_mock_server_round_trip():
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'mock', entries(5), rpm=1000, base_url=server.url)
+        builder.build()
+    assert sorted(result['_id'] for result in builder.get_results()) == ['0', '1', '2', '3', '4']
+    assert builder.get_results()[0]['value'] == 1
+    assert server.counts['ok'] == 5
+
+
+def test_without_a_controller_failures_are_left_as_errors():
+    with MockLLMServer(latency=0, jitter=0, error_rate=1.0, response=RESPONSE) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'mock', entries(3), rpm=1000, base_url=server.url)
+        builder.build()
+    assert len(builder.get_errors()) == 3
+    assert server.counts['errors'] == 3
+
+
+def test_controller_retries_and_reschedules():
+    with MockLLMServer(latency=0, jitter=0, error_rate=0.3, response=RESPONSE) as server:
+        controller = AdaptiveController(initial=4, maximum=8)
+        builder = DatasetBuilder('prompt', Extraction, 'mock', entries(30), rpm=1000, base_url=server.url,
+                                 controller=controller, max_retries=3, rounds=3)
+        builder.build()
+    # 0.3 ** 12 per entry, every entry gets through
+    assert len(builder.get_results()) == 30
+    # the last attempt of a call isn't a retry, the entry is rescheduled instead
+    assert 0 < controller.retries <= server.counts['errors']
+
+
+def test_quota_throttles_shrink_the_limit():
+    with MockLLMServer(latency=0.05, jitter=0, max_concurrent=2, response=RESPONSE) as server:
+        controller = AdaptiveController(initial=8, maximum=8, cooldown=0)
+        builder = DatasetBuilder('prompt', Extraction, 'mock', entries(20), rpm=1000, max_concurrent=50,
+                                 base_url=server.url, controller=controller, max_retries=5)
+        assert controller.maximum == 8
+        builder.build()
+    assert len(builder.get_results()) == 20
+    assert controller.throttles == server.counts['throttled'] > 0
+    assert controller.limit < 8
+
+
+def test_seeded_mock_server_is_repeatable():
+    counts = []
+    for _ in range(2):
+        with MockLLMServer(latency=0, jitter=0, error_rate=0.3, seed=7, response=RESPONSE) as server:
+            builder = DatasetBuilder('prompt', Extraction, 'mock', entries(20), rpm=1000, base_url=server.url)
+            builder.build()
+        counts.append((dict(server.counts), sorted(error['id'] for error in builder.get_errors())))
+    assert counts[0] == counts[1]
+    assert counts[0][0]['errors'] > 0
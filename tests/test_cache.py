@@ -0,0 +1,58 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from utils.builder import DatasetBuilder
+from utils.cache import LLMCache
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+def test_get_set(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    assert cache.get('model', 'prompt', Extraction, 'text') is None
+    cache.set('model', 'prompt', Extraction, 'text', [{'value': 1}], tokens=7)
+    assert cache.get('model', 'prompt', Extraction, 'text') == ([{'value': 1}], 7)
+    # any part of the key changing is a miss
+    assert cache.get('model', 'other prompt', Extraction, 'text') is None
+    assert cache.get('other model', 'prompt', Extraction, 'text') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 3
+
+    reopened = LLMCache(str(tmp_path / 'cache.db'))
+    assert reopened.get('model', 'prompt', Extraction, 'text') == ([{'value': 1}], 7)
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    for text in ('a', 'b', 'c'):
+        cache.set('model', 'prompt', Extraction, text, [{'value': 1}])
+    cache.get('model', 'prompt', Extraction, 'a')
+    size = cache.stats()['bytes'] // 3
+    assert cache.evict(max_bytes=2 * size) == 1
+    assert cache.get('model', 'prompt', Extraction, 'b') is None
+    assert cache.get('model', 'prompt', Extraction, 'a') is not None
+    assert cache.evict(max_age=-1) == 2
+
+
+def test_builder_hits_skip_the_api(tmp_path, monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'unused')
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    cache.set('model', 'prompt', Extraction, 'one', [{'value': 1}], tokens=3)
+    cache.set('model', 'prompt', Extraction, 'two', [], tokens=3)
+
+    builder = DatasetBuilder('prompt', Extraction, 'model', [('a', 'one'), ('b', 'two')], cache=cache)
+
+    async def no_calls(text):
+        raise AssertionError('cache hit went to the API')
+    builder._make_api_call = no_calls
+    builder.build()
+
+    assert builder.entries == [('a', 'one', [{'_id': 'a', 'value': 1}], 0), ('b', 'two', [], 0)]
+    assert builder.get_results() == [{'_id': 'a', 'value': 1}]
@@ -0,0 +1,85 @@
+from utils.checks import (
+    DIVIDEND_CHECKS,
+    PROPOSAL_CHECKS,
+    VOTES_PER_SHARE_CHECKS,
+    numbers_in,
+)
+from utils.datasets import DATASETS
+from utils.router import ModelRouter
+from utils.schemas import (
+    DividendExtraction,
+    ProposalResultsExtraction,
+    VotingRightsExtraction,
+)
+
+TEXT = 'Proposal 1 For 1,234,567 Against 5 Proposal 2 For 90 Against 10'
+
+
+def reason(checks, parsed, text=TEXT):
+    return ModelRouter([]).check(checks, parsed, text)
+
+
+def proposals(*data):
+    return ProposalResultsExtraction(info_found=True, data=list(data))
+
+
+def test_numbers_in():
+    assert numbers_in('For 1,234,567 and 89.5, $0.25') == {1234567, 89, 0}
+
+
+def test_proposal_checks():
+    assert reason(PROPOSAL_CHECKS, proposals({'presentation_order': 1, 'votes_for': 1234567, 'votes_against': 5},
+                                             {'presentation_order': 2, 'votes_for': 90, 'votes_against': 10})) is None
+    assert reason(PROPOSAL_CHECKS, ProposalResultsExtraction(info_found=False)) is None
+    assert reason(PROPOSAL_CHECKS, proposals()) == 'missing_counts'
+    assert reason(PROPOSAL_CHECKS, proposals({'presentation_order': 1})) == 'missing_counts'
+    assert reason(PROPOSAL_CHECKS, proposals({'votes_for': 1234568, 'votes_against': 5})) == 'counts_not_in_text'
+    assert reason(PROPOSAL_CHECKS, proposals({'votes_for': 90, 'votes_against': -10})) == 'negative_count'
+    assert reason(PROPOSAL_CHECKS, proposals({'votes_for': 90, 'votes_against': 10, 'meeting_date': 'sometime in May'})) == 'bad_date'
+    assert reason(PROPOSAL_CHECKS, proposals({'votes_for': 90, 'votes_against': 10, 'meeting_date': 'May 14, 2020'})) is None
+    assert reason(PROPOSAL_CHECKS, proposals({'presentation_order': 1, 'votes_for': 90, 'votes_against': 10},
+                                             {'presentation_order': 1, 'votes_for': 5})) == 'duplicate_order'
+
+
+def test_dividend_checks():
+    text = 'declared a quarterly dividend of 25 cents per share'
+    assert reason(DIVIDEND_CHECKS, DividendExtraction(info_found=True, data=[{'dividend_per_share': 0.25}]), text) is None
+    assert reason(DIVIDEND_CHECKS, DividendExtraction(info_found=True, data=[{'dividend_per_share': 0.3}]), text) == 'amount_not_in_text'
+    assert reason(DIVIDEND_CHECKS, DividendExtraction(info_found=True, data=[{'dividend_per_share': 2500.0}]), text) == 'implausible_amount'
+    assert reason(DIVIDEND_CHECKS, DividendExtraction(info_found=True, data=[]), text) == 'missing_amount'
+
+
+def test_votes_per_share_checks():
+    assert reason(VOTES_PER_SHARE_CHECKS, VotingRightsExtraction(info_found=True, data=[{'share_class': 'Class B', 'votes_per_share': 10.0}])) is None
+    assert reason(VOTES_PER_SHARE_CHECKS, VotingRightsExtraction(info_found=True, data=[{'share_class': 'Class B'}])) == 'missing_fields'
+    assert reason(VOTES_PER_SHARE_CHECKS, VotingRightsExtraction(info_found=True, data=[{'share_class': 'Class B', 'votes_per_share': -1.0}])) == 'implausible_votes'
+
+
+def flagged(dataset, parsed, text):
+    """(router reason, validator problems) for the same response"""
+    rows = [dict(item.model_dump(), entry_id='e1') for item in parsed.data]
+    problems = {issue['problem'] for issue in dataset.validator().validate(rows).get('e1', [])}
+    return reason(dataset.checks, parsed, text), problems
+
+
+def test_router_and_validator_agree():
+    text = 'Proposal 1 For 100 Against 5 Proposal 2 For 90 Against 10 Class B 20000 votes $0.25 dividend'
+    cases = [
+        ('proposal_results', proposals({'presentation_order': 1, 'votes_for': 100, 'votes_against': 5},
+                                       {'presentation_order': 1, 'votes_for': 90, 'votes_against': 10}), 'duplicate_order'),
+        ('proposal_results', proposals({'presentation_order': 1, 'votes_for': 100, 'votes_against': -5}), 'negative_count'),
+        ('proposal_results', proposals({'presentation_order': 1, 'votes_for': 100, 'votes_against': 5,
+                                        'meeting_date': 'sometime in May'}), 'bad_date'),
+        ('dividends_per_share', DividendExtraction(info_found=True, data=[{'dividend_per_share': 2500.0}]), 'implausible_amount'),
+        ('votes_per_share', VotingRightsExtraction(info_found=True, data=[{'share_class': 'Class B', 'votes_per_share': 20000.0}]),
+         'implausible_votes'),
+    ]
+    for name, parsed, problem in cases:
+        router_reason, problems = flagged(DATASETS[name], parsed, text)
+        assert router_reason == problem
+        assert problem in problems
+
+
+def test_blank_date_passes_both():
+    parsed = proposals({'presentation_order': 1, 'votes_for': 100, 'votes_against': 5, 'meeting_date': 'n/a'})
+    assert flagged(DATASETS['proposal_results'], parsed, 'For 100 Against 5') == (None, set())
@@ -0,0 +1,91 @@
+import pytest
+
+from utils.builder import DatasetBuilder
+from utils.cache import LLMCache
+from utils.chunking import ProposalChunker, proposal_boundaries
+from utils.datasets import PROPOSAL_RESULTS
+from utils.mock_llm import MockLLMServer
+
+HEADER = 'Item 5.07 Submission of Matters to a Vote of Security Holders.\nThe annual meeting was held on May 1, 2020.\n'
+
+RESPONSE = {'info_found': True, 'data': [
+    {'presentation_order': 1, 'proposal_description': 'Elect directors', 'votes_for': 900, 'votes_against': 100},
+    {'presentation_order': 2, 'proposal_description': 'Ratify auditors', 'votes_for': 950, 'votes_against': 50},
+]}
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+
+
+def _section(proposals, words=60):
+    return HEADER + ''.join(f'Proposal No. {n}\n' + 'votes for against abstain ' * words + '\n' for n in range(1, proposals + 1))
+
+
+def test_boundaries():
+    text = 'Item 5.07 Results\nProposal No. 1 Elect\nPROPOSAL TWO Ratify\n3. Say on pay\n(4) Frequency\nItem 1 - Directors\n'
+    starts = proposal_boundaries(text)
+    assert [text[start:].split()[0] for start in starts] == ['Proposal', 'PROPOSAL', '3.', '(4)', 'Item']
+
+
+def test_short_sections_are_not_split():
+    chunker = ProposalChunker(max_tokens=3000)
+    assert chunker.split(_section(3)) == [_section(3)]
+    # long but with nowhere to cut
+    text = 'no proposals here ' * 1000
+    assert ProposalChunker(max_tokens=100).split(text) == [text]
+
+
+def test_split_repeats_header_and_seam():
+    text = _section(10)
+    chunks = ProposalChunker(max_tokens=1000).split(text)
+    assert len(chunks) > 1
+    assert all(chunk.startswith(HEADER) for chunk in chunks)
+    assert all(len(chunk) // 4 <= 1000 for chunk in chunks)
+    # the last proposal of a chunk opens the next one
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last = previous[previous.rindex('Proposal No.'):]
+        assert chunk[len(HEADER):].startswith(last)
+    # every proposal is in some chunk
+    assert all(any(f'Proposal No. {n}\n' in chunk for chunk in chunks) for n in range(1, 11))
+
+
+def test_merge_drops_seam_duplicates_and_renumbers():
+    first = [{'presentation_order': 2, 'proposal_description': 'Ratify auditors', 'votes_for': 950, 'meeting_date': '2020-05-01'},
+             {'presentation_order': 1, 'proposal_description': 'Elect directors', 'votes_for': 900, 'meeting_date': '2020-05-01'}]
+    second = [{'presentation_order': 1, 'proposal_description': 'Ratification of auditors', 'votes_for': 950},
+              {'presentation_order': 2, 'proposal_description': 'Say on pay', 'votes_for': None},
+              {'presentation_order': 3, 'proposal_description': 'say on  PAY', 'votes_for': None}]
+    merged = ProposalChunker().merge([first, second])
+    assert [(r['presentation_order'], r['proposal_description']) for r in merged] == [
+        (1, 'Elect directors'), (2, 'Ratify auditors'), (3, 'Say on pay')]
+    # meeting fields a chunk left out are filled in
+    assert all(r['meeting_date'] == '2020-05-01' for r in merged)
+
+
+def test_builder_extracts_long_entries_in_chunks(tmp_path):
+    text = _section(10)
+    chunks = ProposalChunker(max_tokens=1000).split(text)
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    results = {}
+
+    def builder(server):
+        return DatasetBuilder(PROPOSAL_RESULTS.prompt, PROPOSAL_RESULTS.schema, 'mock',
+                              entries=[('long', text), ('short', 'Proposal No. 1 Elect directors')], rpm=1000,
+                              base_url=server.url, cache=cache, chunker=ProposalChunker(max_tokens=1000),
+                              on_result=results.__setitem__)
+
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder(server).build()
+        assert server.counts['ok'] == len(chunks) + 1
+
+    # every chunk answered the same two proposals, they are kept once
+    assert [(r['_id'], r['presentation_order']) for r in results['long']] == [('long', 1), ('long', 2)]
+    assert len(results['short']) == 2
+
+    # the merged result and each chunk are cached, a rerun sends nothing
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder(server).build()
+        assert server.counts['ok'] == 0
+    assert cache.stats()['entries'] == len(chunks) + 2
@@ -0,0 +1,60 @@
+import asyncio
+
+from utils.controller import AdaptiveController, backoff, is_throttle
+
+
+class Throttled(Exception):
+    code = 429
+
+
+def run(controller, latencies, errors=()):
+    async def go():
+        for i, latency in enumerate(latencies):
+            await controller.acquire()
+            await controller.release(latency, error=Throttled('429') if i in errors else None)
+    asyncio.run(go())
+
+
+def test_grows_after_a_window_of_healthy_calls():
+    controller = AdaptiveController(initial=2, maximum=4)
+    run(controller, [0.1] * 2)
+    assert controller.limit == 3
+    run(controller, [0.1] * 20)
+    assert controller.limit == 4
+
+
+def test_slow_calls_are_not_healthy():
+    controller = AdaptiveController(initial=2, target_latency=1.0)
+    run(controller, [5.0] * 10)
+    assert controller.limit == 2
+
+
+def test_throttles_halve_once_per_cooldown():
+    controller = AdaptiveController(initial=16, cooldown=60)
+    run(controller, [0.1] * 3, errors={0, 1, 2})
+    assert controller.limit == 8
+    assert controller.stats()['throttles'] == 3
+
+    controller.cooldown = 0
+    run(controller, [0.1] * 10, errors=set(range(10)))
+    assert controller.limit == controller.minimum
+
+
+def test_acquire_waits_at_the_limit():
+    controller = AdaptiveController(initial=1)
+
+    async def go():
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await controller.release(0.1)
+        await asyncio.wait_for(waiting, 1)
+    asyncio.run(go())
+
+
+def test_is_throttle():
+    assert is_throttle(Throttled())
+    assert is_throttle(Exception('API request timed out after 5 seconds'))
+    assert not is_throttle(Exception('500 INTERNAL'))
+    assert all(0 <= backoff(attempt) <= min(60, 2 ** attempt) for attempt in range(10))
@@ -0,0 +1,58 @@
+import os
+
+from utils.corpus import SectionCorpus
+
+
+def _row(n, filing_date='20200109', item='item5.07'):
+    return {'entry_id': f'e{n}', 'accession': f'000000000020{n:06d}', 'cik': '320193', 'filing_date': filing_date,
+            'period': '20200108', 'document': 'd.htm', 'item': item, 'source': 'html', 'text': f'section {n} ' * 50}
+
+
+def test_month_from_yyyymmdd_filing_date(tmp_path):
+    corpus = SectionCorpus(str(tmp_path))
+    assert corpus.add([_row(n) for n in range(3)] + [_row(3, filing_date='20200203')]) == 4
+    corpus.mark_extracted('2020-01', ['item5.07'])
+
+    assert corpus.months() == ['2020-01', '2020-02']
+    assert corpus.extracted('2020-01', ['item5.07'])
+    assert not corpus.extracted('2020-01', ['item5.07', 'item8.01'])
+    assert not corpus.extracted('2020-02', ['item5.07'])
+    rows = list(corpus.iter_rows(months='2020-01', items='item5.07'))
+    assert [row['entry_id'] for row in rows] == ['e0', 'e1', 'e2']
+    corpus.close()
+
+
+def test_rows_come_back_as_extracted(tmp_path):
+    corpus = SectionCorpus(str(tmp_path))
+    rows = [_row(n, item='item8.01' if n % 2 else 'item5.07') for n in range(10)]
+    corpus.add(rows)
+    # stored entry ids are skipped
+    assert corpus.add(rows[:3]) == 0
+    assert len(corpus) == 10 and 'e4' in corpus and 'e10' not in corpus
+
+    assert corpus.get('e1') == rows[1]
+    assert corpus.text('e2') == rows[2]['text']
+    assert corpus.get('missing') is None
+    # keyset pages smaller than the selection
+    assert list(corpus.iter_rows(items=['item8.01'], batch=2)) == rows[1::2]
+
+    # appends after a read are mapped too
+    corpus.add([_row(10)])
+    assert corpus.get('e10')['text'] == 'section 10 ' * 50
+    corpus.close()
+
+
+def test_unindexed_tail_is_cut_on_open(tmp_path):
+    corpus = SectionCorpus(str(tmp_path))
+    corpus.add([_row(0)])
+    size = os.path.getsize(tmp_path / 'sections.dat')
+    corpus.close()
+
+    # a crash between the append and the index leaves bytes nothing points at
+    with open(tmp_path / 'sections.dat', 'ab') as f:
+        f.write(b'partial record')
+    corpus = SectionCorpus(str(tmp_path))
+    assert os.path.getsize(tmp_path / 'sections.dat') == size
+    corpus.add([_row(1)])
+    assert [row['entry_id'] for row in corpus.iter_rows()] == ['e0', 'e1']
+    corpus.close()
@@ -0,0 +1,11 @@
+from utils.datasets import DATASETS, PROPOSAL_RESULTS
+
+
+def test_registry():
+    assert list(DATASETS) == ['proposal_results', 'dividends_per_share', 'votes_per_share']
+    fieldnames = PROPOSAL_RESULTS.fieldnames()
+    assert fieldnames[:3] == ['accession', 'cik', 'filing_date']
+    assert PROPOSAL_RESULTS.keep_field in fieldnames
+    for dataset in DATASETS.values():
+        # the builder's schema wraps rows of the output row model
+        assert type(dataset.schema(info_found=True, data=[{}]).data[0]) is dataset.row_model
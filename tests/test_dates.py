@@ -0,0 +1,29 @@
+from utils.dates import covers_month, generate_monthly_date_ranges, month_is_complete, parse_date
+
+
+def test_monthly_date_ranges():
+    assert generate_monthly_date_ranges('2019-12-15', '2020-02-10') == [
+        ('2019-12-15', '2019-12-31'),
+        ('2020-01-01', '2020-01-31'),
+        ('2020-02-01', '2020-02-10'),
+    ]
+
+
+def test_month_is_complete():
+    assert month_is_complete(('2020-01-01', '2020-01-31'))
+    assert not month_is_complete(('2020-01-01', '2999-01-31'))
+
+
+def test_covers_month():
+    assert covers_month(('2020-02-01', '2020-02-29'))
+    assert not covers_month(('2020-02-01', '2020-02-28'))
+    assert not covers_month(('2019-12-15', '2019-12-31'))
+
+
+def test_parse_date():
+    assert parse_date('May 14, 2020') == '2020-05-14'
+    assert parse_date('2020-05-14T00:00:00') == '2020-05-14'
+    # filing dates as datamule writes them
+    assert parse_date('20200514') == '2020-05-14'
+    assert parse_date('20201314') is None
+    assert parse_date('sometime in May') is None
@@ -0,0 +1,89 @@
+from utils.dedup import DedupIndex
+
+DIVIDEND = ("On {month} 12, 2020, the Board of Directors of Example Corp. declared a quarterly cash dividend of $0.25 "
+            "per share of common stock, payable to shareholders of record at the close of business on the record date.")
+
+
+def _row(n, text, cik='320193', period='20200312', accession=None, item='item8.01'):
+    accession = accession or f'a{n}'
+    return {'entry_id': f'{accession}:doc.htm:{item}', 'accession': accession, 'cik': cik, 'filing_date': '20200312',
+            'period': period, 'item': item, 'text': text}
+
+
+class Join:
+    """Just enough of StreamingJoin"""
+
+    def __init__(self):
+        self.metadata_lookup = {}
+        self.rows = 0
+        self.written = {}
+        self.issues = {}
+
+    def on_result(self, entry_id, results):
+        self.written[entry_id] = results
+        self.rows += len(results)
+
+
+def test_near_duplicates_are_extracted(tmp_path):
+    dedup = DedupIndex(str(tmp_path / 'dedup.db'))
+    march, june = _row(0, DIVIDEND.format(month='March')), _row(1, DIVIDEND.format(month='June'), period='20200612')
+    unique, duplicates = dedup.split('d', [march, june])
+    assert [row['accession'] for row in unique] == ['a0', 'a1']
+    assert duplicates == []
+
+
+def test_markup_and_spacing_dont_matter(tmp_path):
+    dedup = DedupIndex(str(tmp_path / 'dedup.db'))
+    text = DIVIDEND.format(month='March')
+    unique, duplicates = dedup.split('d', [_row(0, text), _row(1, '  ' + text.replace(' ', '\n  ').upper() + ' ;')])
+    assert len(unique) == 1 and len(duplicates) == 1
+
+
+def test_only_the_same_event_is_dropped(tmp_path):
+    dedup = DedupIndex(str(tmp_path / 'dedup.db'))
+    text = DIVIDEND.format(month='March')
+    rows = [
+        _row(0, text),
+        _row(0, text, accession='a0', item='item7.01'),  # same filing, another item
+        _row(1, text),  # 8-K/A of the same event
+        _row(2, text, period='20200612'),  # same filer, same text, another event
+        _row(3, text, cik='789019'),  # another filer
+    ]
+    unique, duplicates = dedup.split('d', rows)
+    assert [row['accession'] for row in unique] == ['a0']
+    original = 'a0:doc.htm:item8.01'
+    assert [(d['entry_id'], d['original'], d['same_event']) for d in duplicates] == [
+        ('a0:doc.htm:item7.01', original, True), ('a1:doc.htm:item8.01', original, True),
+        ('a2:doc.htm:item8.01', original, False), ('a3:doc.htm:item8.01', original, False),
+    ]
+
+    # everything that isn't the same event gets the original's result under its own id
+    dedup.record('d', original, [{'_id': original, 'dividend_per_share': 0.25}])
+    join = Join()
+    assert dedup.replay('d', duplicates, join) == 2
+    assert sorted(join.written) == ['a2:doc.htm:item8.01', 'a3:doc.htm:item8.01']
+    assert join.metadata_lookup['a3:doc.htm:item8.01'] == {'accession': 'a3', 'cik': '789019', 'filing_date': '20200312'}
+
+
+def test_persists_per_dataset(tmp_path):
+    text = DIVIDEND.format(month='March')
+    DedupIndex(str(tmp_path / 'dedup.db')).split('d', [_row(0, text)])
+    dedup = DedupIndex(str(tmp_path / 'dedup.db'))
+    assert dedup.split('d', [_row(1, text, cik='789019')])[1][0]['original'] == 'a0:doc.htm:item8.01'
+    assert dedup.split('other', [_row(1, text, cik='789019')])[1] == []
+
+
+def test_duplicates_without_a_result_are_queued(tmp_path):
+    dedup = DedupIndex(str(tmp_path / 'dedup.db'))
+    text = DIVIDEND.format(month='March')
+    _, duplicates = dedup.split('d', [_row(0, text), _row(1, text, cik='789019')])
+
+    # the original is still in flight, e.g. in another worker's month
+    join = Join()
+    assert dedup.replay('d', duplicates, join) == 0
+    assert join.issues['a1:doc.htm:item8.01'][0]['problem'] == 'original_without_result'
+
+    # another process (here another connection) sees each row and result as soon as it is written
+    other = DedupIndex(str(tmp_path / 'dedup.db'))
+    assert dedup.record('d', 'a0:doc.htm:item8.01', [{'dividend_per_share': 0.25}])
+    assert other.results('d', 'a0:doc.htm:item8.01') == [{'dividend_per_share': 0.25}]
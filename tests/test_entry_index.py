@@ -0,0 +1,36 @@
+from utils.entry_index import EntryIndex
+from utils.extract import make_entry_id
+
+
+def _row(accession, document, item, text):
+    return {'entry_id': make_entry_id(accession, document, item, text), 'accession': accession, 'cik': '320193',
+            'filing_date': '20200312', 'document': document, 'item': item, 'source': '', 'text': text}
+
+
+def test_entry_ids_are_per_section_and_stable():
+    ids = {
+        make_entry_id('a0', 'doc.htm', 'item7.01', 'same text'),
+        make_entry_id('a0', 'doc.htm', 'item8.01', 'same text'),
+        make_entry_id('a0', 'other.htm', 'item8.01', 'same text'),
+        make_entry_id('a0', 'doc.htm', 'item8.01', 'other text'),
+    }
+    assert len(ids) == 4
+    assert make_entry_id('a0', 'doc.htm', 'item8.01', 'same text') in ids
+    assert make_entry_id('a0', 'doc.htm', 'item8.01', 'same text').startswith('a0:doc.htm:item8.01:')
+
+
+def test_add_and_lookup(tmp_path):
+    index = EntryIndex(str(tmp_path / 'entries.db'))
+    rows = [_row('a0', 'doc.htm', 'item8.01', 'dividend'), _row('a0', 'doc.htm', 'item7.01', 'press release'),
+            _row('a1', 'doc.htm', 'item8.01', 'dividend')]
+    index.add(rows)
+    index.add(rows[:1])  # re-indexing on a rerun is harmless
+
+    entry = index.get(rows[0]['entry_id'])
+    assert (entry['accession'], entry['document'], entry['item'], entry['chars']) == ('a0', 'doc.htm', 'item8.01', 8)
+    assert index.get('missing') is None
+    assert sorted(entry['item'] for entry in index.for_accession('a0')) == ['item7.01', 'item8.01']
+
+    # persisted
+    index.close()
+    assert EntryIndex(str(tmp_path / 'entries.db')).get(rows[2]['entry_id'])['accession'] == 'a1'
@@ -0,0 +1,60 @@
+import json
+
+from utils.ledger import Ledger
+
+
+def test_done_units_are_skipped(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    ledger = Ledger(path)
+    ledger.mark_done('2020-01', rows=3)
+    ledger.close()
+
+    ledger = Ledger(path)
+    assert ledger.pending(['2020-01', '2020-02']) == ['2020-02']
+    assert ledger.done['2020-01']['rows'] == 3
+    ledger.reset('2020-01')
+    assert ledger.pending(['2020-01']) == ['2020-01']
+
+
+def test_missing_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    ledger = Ledger(path)
+    ledger.mark_submitted('2020-01', ['a', 'b', 'c'])
+    ledger.mark_completed('2020-01', ['a', 'c'])
+    assert ledger.missing('2020-01') == {'b'}
+    ledger.close()
+
+    ledger = Ledger(path)
+    assert ledger.missing('2020-01') == {'b'}
+    assert ledger.pending(['2020-01']) == ['2020-01']
+    ledger.reset('2020-01')
+    assert ledger.missing('2020-01') == set()
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = tmp_path / 'ledger.jsonl'
+    ledger = Ledger(str(path))
+    ledger.mark_done('2020-01', rows=1)
+    ledger.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"unit": "2020-02", "ev')
+
+    ledger = Ledger(str(path))
+    ledger.mark_done('2020-03', rows=2)
+    ledger.close()
+    assert set(Ledger(str(path)).done) == {'2020-01', '2020-03'}
+    assert json.loads(path.read_text().splitlines()[-1])['unit'] == '2020-03'
+
+
+def test_processes_share_a_ledger(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    main, worker = Ledger(path), Ledger(path)
+    worker.mark_submitted('2020-01', ['e0'])
+    worker.mark_done('2020-01', rows=1)
+    main.mark_done('2020-02', rows=2)
+
+    # records of other processes show after a reload
+    assert not main.is_done('2020-01')
+    main.reload()
+    assert main.is_done('2020-01') and main.is_done('2020-02')
+    assert [json.loads(line)['unit'] for line in open(path)] == ['2020-01', '2020-01', '2020-02']
@@ -0,0 +1,94 @@
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from utils.builder import DatasetBuilder
+from utils.metrics import Metrics, dir_bytes, percentile
+from utils.mock_llm import MockLLMServer
+from utils.pipeline import Pipeline
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+def test_percentile_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile(samples, 0) == 1
+    assert percentile([], 50) is None
+
+
+def test_summary_run_log_and_textfile(tmp_path):
+    metrics = Metrics(str(tmp_path / 'runs.jsonl'), prom_path=str(tmp_path / 'sec.prom'))
+    metrics.inc('sections_found', 2, item='item5.07')
+    metrics.inc('sections_found', item='item5.07')
+    for value in (0.1, 0.2, 0.3):
+        metrics.observe('llm_latency_seconds', value, model='m')
+    with metrics.timer('spill'):
+        pass
+    metrics.event('month', month='2020-01', rows=3)
+    summary = metrics.close()
+
+    assert summary['counters'] == {'sections_found[item=item5.07]': 3}
+    latency = summary['timings']['llm_latency_seconds[model=m]']
+    assert (latency['count'], latency['p50'], latency['max']) == (3, 0.2, 0.3)
+    assert summary['timings']['spill_seconds']['count'] == 1
+
+    with open(tmp_path / 'runs.jsonl', encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    assert [event['event'] for event in events] == ['start', 'month', 'summary']
+    assert len({event['run'] for event in events}) == 1
+
+    prom = (tmp_path / 'sec.prom').read_text()
+    assert 'sec_sections_found{item="item5.07"} 3' in prom
+    assert 'sec_llm_latency_seconds{model="m",quantile="0.5"} 0.2' in prom
+    assert 'sec_llm_latency_seconds_count{model="m"} 3' in prom
+
+
+def test_dir_bytes(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'doc.htm').write_bytes(b'x' * 10)
+    (tmp_path / 'b.txt').write_bytes(b'x' * 5)
+    assert dir_bytes(str(tmp_path)) == 15
+
+
+def increment(x):
+    return x + 1
+
+
+def double(x):
+    return x * 2
+
+
+def test_pipeline_times_stages():
+    metrics = Metrics()
+    pipeline = Pipeline([increment, double], metrics=metrics)
+    assert sorted(pipeline.run([1, 2, 3])) == [4, 6, 8]
+    timings = metrics.summary()['timings']
+    assert timings['stage_seconds[stage=increment]']['count'] == 3
+    assert timings['stage_wait_seconds[stage=double]']['count'] == 3
+
+
+def test_builder_records_calls_and_cache(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+    metrics = Metrics()
+    response = {'info_found': True, 'data': [{'value': 1}]}
+    with MockLLMServer(latency=0, jitter=0, response=response) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'mock', [(str(i), f'text {i}') for i in range(4)], rpm=1000,
+                                 base_url=server.url, metrics=metrics)
+        builder.build()
+
+    summary = metrics.summary()
+    assert summary['counters']['llm_calls[model=mock]'] == 4
+    assert summary['counters']['entries_submitted[model=mock]'] == 4
+    assert summary['counters']['entries_extracted[model=mock]'] == 4
+    assert summary['counters']['entries_failed[model=mock]'] == 0
+    assert summary['timings']['llm_latency_seconds[model=mock]']['count'] == 4
@@ -0,0 +1,30 @@
+import csv
+import gzip
+import os
+from datetime import date
+
+from utils.parquet import _parse_date, read_parquet, write_parquet
+from utils.schemas import ProposalResult
+
+DEBUG_CSV = os.path.join(os.path.dirname(__file__), '..', 'debug', 'proposal_results', 'proposal_results.csv.gz')
+
+
+def test_parse_date():
+    assert _parse_date('20200109') == date(2020, 1, 9)
+    assert _parse_date('2020-01-09') == date(2020, 1, 9)
+
+
+def test_round_trip_debug_rows(tmp_path):
+    with gzip.open(DEBUG_CSV, 'rt', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['filing_date'].isdigit() and len(rows[0]['filing_date']) == 8
+
+    write_parquet(rows, ProposalResult, str(tmp_path), basename='2020-01')
+    assert os.listdir(tmp_path) == ['filing_year=2020']
+
+    table = read_parquet(str(tmp_path), start='2020-01-01', end='2020-12-31')
+    assert table.num_rows == len(rows)
+    assert table.column('filing_date').null_count == 0
+
+    cik = rows[0]['cik']
+    assert read_parquet(str(tmp_path), cik=cik).num_rows == sum(row['cik'] == cik for row in rows)
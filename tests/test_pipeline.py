@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import Pipeline
+
+
+def test_stages_overlap_and_keep_order():
+    running = set()
+    overlapped = threading.Event()
+    lock = threading.Lock()
+
+    def stage(name):
+        def run(item):
+            with lock:
+                running.add(name)
+                if len(running) > 1:
+                    overlapped.set()
+            time.sleep(0.02)
+            with lock:
+                running.discard(name)
+            return item + [name]
+        run.__name__ = name
+        return run
+
+    outputs = Pipeline([stage('download'), stage('parse'), stage('build')]).run([[i] for i in range(5)])
+    assert outputs == [[i, 'download', 'parse', 'build'] for i in range(5)]
+    assert overlapped.is_set()
+
+
+def test_none_drops_an_item():
+    outputs = Pipeline([lambda x: None if x % 2 else x, lambda x: x * 10]).run(range(6))
+    assert outputs == [0, 20, 40]
+
+
+def test_queues_are_bounded():
+    fed = []
+
+    def slow(item):
+        time.sleep(0.05)
+        return item
+
+    def items():
+        for i in range(6):
+            fed.append((i, time.monotonic()))
+            yield i
+
+    start = time.monotonic()
+    Pipeline([slow], maxsize=1).run(items())
+    # the feeder can only get a couple of items ahead of the slow stage
+    assert fed[-1][1] - start > 0.15
+
+
+def test_stage_error_stops_the_run():
+    def fail(item):
+        if item == 2:
+            raise ValueError('bad month')
+        return item
+
+    with pytest.raises(RuntimeError, match='fail failed: bad month'):
+        Pipeline([fail, lambda x: x]).run(range(100))
@@ -0,0 +1,76 @@
+import csv
+
+from utils.prefilter import DIVIDEND_FILTER, RelevanceFilter
+
+
+class LabelCache:
+    """Cached responses by text, like LLMCache.get"""
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def get(self, model, prompt, schema, text, count=True):
+        if text not in self.labels:
+            return None
+        return (self.labels[text], None)
+
+
+def section(accession, text, item='item8.01'):
+    return {'entry_id': f'{accession}:doc.htm:{item}', 'accession': accession, 'item': item, 'text': text}
+
+
+def test_dividend_filter_scores():
+    kept = "The Board declared a quarterly cash dividend of $0.25 per share, payable to holders of record on March 1."
+    assert DIVIDEND_FILTER.keep(kept)
+    assert not DIVIDEND_FILTER.keep("The Company issued a press release announcing its results.")
+
+
+def test_recall_is_estimated_from_dropped_audit_sample():
+    prefilter = RelevanceFilter('test', required=[r'dividend'], audit_rate=0.5)
+    rows = [section(f'kept-{i}', f'dividend {i}') for i in range(20)]
+    rows += [section(f'dropped-{i}', f'distribution {i}') for i in range(200)]
+
+    sent = prefilter.filter(rows)
+    audit = [row for row in sent if row['accession'].startswith('dropped-')]
+    assert 0 < len(audit) < 200
+    # the sample is the same on every run
+    assert prefilter.filter(rows) == sent
+
+    # the LLM found data in every kept section and in a quarter of the audited dropped ones
+    labels = {row['text']: [{'amount': 1}] for row in rows[:20]}
+    for i, row in enumerate(audit):
+        labels[row['text']] = [{'amount': 1}] if i % 4 == 0 else []
+    # a dropped section labelled outside the audit does not count
+    outside = next(row for row in rows[20:] if row not in audit)
+    labels[outside['text']] = [{'amount': 1}]
+
+    report = prefilter.evaluate(rows, LabelCache(labels), 'model', 'prompt', None)
+    assert report['audited'] == len(audit)
+    assert report['fn'] == len(range(0, len(audit), 4))
+    relevant_dropped = report['fn'] / len(audit) * 200
+    assert report['recall'] == 20 / (20 + relevant_dropped)
+    assert report['recall'] < 1.0
+
+
+def test_no_audit_no_recall():
+    prefilter = RelevanceFilter('test', required=[r'dividend'])
+    rows = [section('a', 'dividend'), section('b', 'other')]
+    assert prefilter.filter(rows) == rows[:1]
+    report = prefilter.evaluate(rows, LabelCache({'dividend': [{'amount': 1}], 'other': [{'amount': 1}]}), 'm', 'p', None)
+    assert report['recall'] is None
+    assert report['precision'] == 1.0
+
+
+def test_dropped_log_keeps_ids_not_texts(tmp_path):
+    prefilter = RelevanceFilter('test', required=[r'dividend'], audit_rate=0.5)
+    rows = [section('a', 'dividend')] + [section(f'd{i}', 'long text without the keyword ' * 100) for i in range(20)]
+    path = tmp_path / 'dropped.csv'
+    sent = prefilter.filter(rows, dropped_path=str(path))
+    prefilter.filter(rows, dropped_path=str(path))
+
+    with open(path, newline='', encoding='utf-8') as f:
+        logged = list(csv.DictReader(f))
+    assert set(logged[0]) == {'filter', 'entry_id', 'accession', 'item', 'score', 'audited'}
+    assert len(logged) == 2 * 20
+    assert sum(row['audited'] == '1' for row in logged[:20]) == len(sent) - 1
+    assert path.stat().st_size < 4000
@@ -0,0 +1,47 @@
+import os
+
+from utils.query import QueryIndex
+
+DEBUG_CSV = os.path.join(os.path.dirname(__file__), '..', 'debug', 'proposal_results', 'proposal_results.csv.gz')
+
+
+def test_yyyymmdd_filing_dates_are_stored_iso(tmp_path):
+    index = QueryIndex(str(tmp_path / 'q.db'))
+    rows = index.load_csv('proposal_results', DEBUG_CSV)
+    assert rows == 429
+
+    assert len(index.query('proposal_results', start='2020-01-01', end='2020-12-31')) == rows
+    # the same bounds written the way datamule writes dates
+    assert len(index.query('proposal_results', start='20200101', end='20201231')) == rows
+    assert index.query('proposal_results', start='2021-01-01') == []
+
+    dates = {row['filing_date'] for row in index.sql('SELECT DISTINCT filing_date FROM proposal_results')}
+    assert all(len(d) == 10 and d[4] == '-' for d in dates)
+    index.close()
+
+
+def test_load_store_reloads_changed_shards_only(tmp_path):
+    from utils.datasets import PROPOSAL_RESULTS
+    from utils.store import ShardedStore
+
+    def proposal(accession, votes_for, votes_against, filing_date='20200312'):
+        return {'accession': accession, 'cik': '320193', 'filing_date': filing_date, 'entry_id': f'{accession}:doc.htm:item5.07:0',
+                'proposal_description': 'Election', 'presentation_order': '1', 'votes_for': votes_for,
+                'votes_against': votes_against, 'proponent_type': 'Shareholder', 'meeting_date': 'March 10, 2020'}
+
+    store = ShardedStore(str(tmp_path / 'store'))
+    fieldnames = PROPOSAL_RESULTS.fieldnames()
+    store.write_shard('2020-03', [proposal('a0', '75', '25')], fieldnames)
+    store.write_shard('2020-04', [proposal('a1', '10', '90', '20200414')], fieldnames)
+
+    index = QueryIndex(str(tmp_path / 'q.db'))
+    assert index.load_store('proposal_results', store) == 2
+    assert index.load_store('proposal_results', store) == 0
+    store.write_shard('2020-04', [proposal('a1', '10', '90', '20200414'), proposal('a2', '50', '50', '20200415')], fieldnames)
+    assert index.load_store('proposal_results', store) == 1
+
+    rows = index.proposals(min_support=0.5)
+    assert [(row['accession'], row['support_ratio']) for row in rows] == [('a0', 0.75), ('a2', 0.5)]
+    assert rows[1]['filing_date'] == '2020-04-15' and rows[0]['meeting_date'] == '2020-03-10'
+    assert len(index.proposals(cik=320193, start='20200301', end='20200331')) == 1
+    index.close()
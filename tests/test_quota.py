@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from utils.quota import SharedRateLimiter, WorkQueue
+
+MONTHS = [('2020-01-01', '2020-01-31'), ('2020-02-01', '2020-02-29'), ('2020-03-01', '2020-03-31')]
+
+
+def test_bucket_is_shared(tmp_path):
+    path = str(tmp_path / 'quota.db')
+    # two processes' limiters on one bucket, 600 rpm with a burst of 3
+    first = SharedRateLimiter('flash', 600, path=path, burst=3)
+    second = SharedRateLimiter('flash', 600, path=path, burst=3)
+    assert [first.take(), second.take(), first.take()] == [0, 0, 0]
+    wait = second.take()
+    assert 0 < wait <= 0.1
+
+    # other models have their own bucket
+    assert SharedRateLimiter('flash-lite', 600, path=path, burst=3).take() == 0
+
+
+def test_acquire_waits_for_the_refill(tmp_path):
+    limiter = SharedRateLimiter('flash', 1200, path=str(tmp_path / 'quota.db'), burst=1)
+
+    async def take(n):
+        for _ in range(n):
+            await limiter.acquire()
+
+    start = time.monotonic()
+    asyncio.run(take(5))
+    # one in the bucket, then one every 50ms
+    assert 0.15 < time.monotonic() - start < 1
+
+
+def test_months_are_claimed_once(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = WorkQueue(path)
+    assert queue.add(MONTHS) == 3
+
+    # two workers on the same queue get different months, oldest first
+    other = WorkQueue(path)
+    assert queue.claim(0) == MONTHS[0]
+    assert other.claim(1) == MONTHS[1]
+    queue.done('2020-01')
+    assert list(other.iter_claims(1)) == [MONTHS[2]]
+    assert queue.claim(0) is None
+    assert queue.counts() == {'claimed': 2, 'done': 1}
+
+
+def test_claims_of_a_killed_run_are_queued_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.add(MONTHS)
+    queue.claim(0)
+    queue.done('2020-01')
+    queue.claim(0)  # the worker dies with 2020-02
+
+    # the next run queues every unfinished month again
+    queue.add(MONTHS[1:])
+    assert list(queue.iter_claims(1)) == MONTHS[1:]
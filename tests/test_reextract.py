@@ -0,0 +1,76 @@
+import pytest
+
+from utils.builder import DatasetBuilder
+from utils.corpus import SectionCorpus
+from utils.datasets import PROPOSAL_RESULTS
+from utils.mock_llm import MockLLMServer
+from utils.reextract import ReextractQueue
+from utils.store import ShardedStore
+
+GOOD = {'info_found': True, 'data': [
+    {'presentation_order': 1, 'proposal_description': 'Elect directors', 'votes_for': 900, 'votes_against': 100},
+    {'presentation_order': 2, 'proposal_description': 'Ratify auditors', 'votes_for': 950, 'votes_against': 50},
+]}
+BAD = {'info_found': True, 'data': [
+    {'presentation_order': 1, 'proposal_description': 'Elect directors', 'votes_for': 900, 'votes_against': 100},
+    {'presentation_order': 1, 'proposal_description': 'Ratify auditors', 'votes_for': 950, 'votes_against': 50},
+]}
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+
+
+def _section(n):
+    return {'entry_id': f'e{n}', 'accession': f'a{n}', 'cik': '320193', 'filing_date': '20200109', 'period': '20200108',
+            'document': 'd.htm', 'item': 'item5.07', 'source': '', 'text': f'section {n}'}
+
+
+def _setup(tmp_path):
+    """A 2020-01 shard where e0 came out wrong and is queued, e1 is fine, e2's text was never kept"""
+    store = ShardedStore(str(tmp_path / 'store'))
+    fieldnames = PROPOSAL_RESULTS.fieldnames()
+    rows = [{'accession': 'a0', 'cik': '320193', 'filing_date': '20200109', 'entry_id': 'e0',
+             'proposal_description': 'Elect directors', 'presentation_order': 1, 'votes_for': -900},
+            {'accession': 'a1', 'cik': '320193', 'filing_date': '20200109', 'entry_id': 'e1',
+             'proposal_description': 'Say on pay', 'presentation_order': 1, 'votes_for': 800}]
+    store.write_shard('2020-01', rows, fieldnames)
+
+    corpus = SectionCorpus(str(tmp_path / 'corpus'))
+    corpus.add([_section(0), _section(1)])
+
+    queue = ReextractQueue(str(tmp_path / 'queue.db'))
+    queue.add(PROPOSAL_RESULTS.name, '2020-01', {'e0': [{'field': 'votes', 'problem': 'negative_count', 'value': ''}],
+                                                 'e2': [{'field': 'votes', 'problem': 'negative_count', 'value': ''}]})
+    return store, corpus, queue
+
+
+def _builder(server):
+    return DatasetBuilder(PROPOSAL_RESULTS.prompt, PROPOSAL_RESULTS.schema, 'mock', entries=[], rpm=1000,
+                          base_url=server.url)
+
+
+def test_fixed_entries_are_swapped_into_their_shard(tmp_path):
+    store, corpus, queue = _setup(tmp_path)
+    with MockLLMServer(latency=0, jitter=0, response=GOOD) as server:
+        assert queue.run(PROPOSAL_RESULTS, store, _builder(server), corpus) == ['2020-01']
+
+    rows = list(store.iter_rows(['2020-01']))
+    assert [(row['entry_id'], row['presentation_order'], row['votes_for']) for row in rows] == [
+        ('e0', '1', '900'), ('e0', '2', '950'), ('e1', '1', '800')]
+    assert queue.counts(PROPOSAL_RESULTS.name) == {'done': 1, 'missing_text': 1}
+    assert queue.pending(PROPOSAL_RESULTS.name) == []
+
+
+def test_entries_still_failing_are_retried_then_given_up(tmp_path):
+    store, corpus, queue = _setup(tmp_path)
+    with MockLLMServer(latency=0, jitter=0, response=BAD) as server:
+        assert queue.run(PROPOSAL_RESULTS, store, _builder(server), corpus) == []
+        [(entry_id, shard, problems)] = queue.pending(PROPOSAL_RESULTS.name)
+        assert (entry_id, shard, problems[0]['problem']) == ('e0', '2020-01', 'duplicate_order')
+
+        # max_attempts reached, it stays as it is
+        assert queue.run(PROPOSAL_RESULTS, store, _builder(server), corpus) == []
+    assert queue.counts(PROPOSAL_RESULTS.name) == {'failed': 1, 'missing_text': 1}
+    assert [row['votes_for'] for row in store.iter_rows(['2020-01'])] == ['-900', '800']
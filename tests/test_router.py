@@ -0,0 +1,108 @@
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+import utils.builder
+from utils.builder import DatasetBuilder, RateLimiter
+from utils.datasets import DATASETS, PROPOSAL_RESULTS
+from utils.metrics import Metrics
+from utils.mock_llm import MockLLMServer
+from utils.router import ROUTER_MODELS, ModelPool, ModelRouter
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+RESPONSE = {'info_found': True, 'data': [{'value': 1}]}
+
+
+def flagged(parsed, text):
+    """Fails sections that say so"""
+    return 'flagged' if 'bad' in text else None
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+    monkeypatch.setattr(utils.builder, 'backoff', lambda attempt, base=1.0, cap=60.0: 0)
+
+
+def make_router(**kwargs):
+    return ModelRouter([ModelPool('lite', rpm=1000, max_concurrent=5), ModelPool('flash', rpm=1000, max_concurrent=5)], **kwargs)
+
+
+def test_start_tier():
+    router = make_router(long_tokens=10, max_numbers=3)
+    assert router.start('short text') == 0
+    assert router.start('x' * 100) == 1
+    assert router.start('1 2 3 4 5') == 1
+    assert router.stats()['started'] == {'lite': 1, 'flash': 2}
+    assert router.key == 'lite>flash'
+
+
+def test_failed_checks_move_up_a_pool():
+    router = make_router()
+    metrics = Metrics()
+    entries = [('0', 'good'), ('1', 'bad'), ('2', 'good')]
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'unused', entries, base_url=server.url, router=router,
+                                 checks=(flagged,), metrics=metrics)
+        builder.build()
+
+    assert len(builder.get_results()) == 3
+    stats = router.stats()
+    assert stats['started'] == {'lite': 3, 'flash': 0}
+    assert stats['accepted'] == {'lite': 2, 'flash': 1}
+    assert stats['escalations'] == {'flagged': 1}
+    assert server.counts['ok'] == 4
+    counters = metrics.summary()['counters']
+    assert counters['llm_calls[model=lite]'] == 3 and counters['llm_calls[model=flash]'] == 1
+    assert counters['escalations[model=lite][reason=flagged]'] == 1
+
+
+def test_batched_entries_count_as_started():
+    router = make_router()
+    entries = [('0', 'good'), ('1', 'bad'), ('2', 'good'), ('3', 'good')]
+    with MockLLMServer(latency=0, jitter=0, response=RESPONSE) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'unused', entries, base_url=server.url, router=router,
+                                 checks=(flagged,), batch_tokens=1000)
+        builder.build()
+
+    assert len(builder.get_results()) == 4
+    stats = router.stats()
+    # one batch on lite, the flagged entry then goes straight to a single flash call
+    assert server.counts['ok'] == 2
+    assert stats['started'] == {'lite': 4, 'flash': 0}
+    assert stats['accepted'] == {'lite': 3, 'flash': 1}
+
+
+def test_failed_calls_escalate_and_the_last_pool_is_final():
+    router = make_router()
+    with MockLLMServer(latency=0, jitter=0, error_rate=1.0, response=RESPONSE) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'unused', [('0', 'good')], base_url=server.url, router=router,
+                                 checks=(flagged,), max_retries=0, rounds=1)
+        builder.build()
+    assert len(builder.get_errors()) == 1
+    assert router.stats()['escalations'] == {'error': 1}
+    assert server.counts['errors'] == 2
+
+
+def test_dataset_routers_have_their_own_pools():
+    limiters = {model: RateLimiter(rpm) for model, rpm, _ in ROUTER_MODELS}
+
+    def make_pool(model, rpm, max_concurrent):
+        return ModelPool(model, rpm, max_concurrent, rate_limiter=limiters[model])
+
+    routers = [dataset.router(make_pool) for dataset in DATASETS.values()]
+    assert all(router is not None for router in routers)
+    # separate controllers, shared quota per model
+    assert routers[0].pools[0].controller is not routers[1].pools[0].controller
+    assert routers[0].pools[0].rate_limiter is routers[1].pools[0].rate_limiter
+    assert PROPOSAL_RESULTS.router().pools[0].rate_limiter is not limiters[ROUTER_MODELS[0][0]]
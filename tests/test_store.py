@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from utils.dates import filing_month
+from utils.store import ShardedStore
+
+DEBUG_CSV = os.path.join(os.path.dirname(__file__), '..', 'debug', 'proposal_results', 'proposal_results.csv.gz')
+
+
+def test_filing_month():
+    assert filing_month('20200109') == '2020-01'
+    assert filing_month('2020-01-31') == '2020-01'
+    with pytest.raises(ValueError):
+        filing_month('')
+
+
+def test_import_legacy_keys_by_month(tmp_path):
+    store = ShardedStore(str(tmp_path / 'store'))
+    store.import_legacy(DEBUG_CSV, key_func=lambda row: filing_month(row['filing_date']))
+    assert store.keys() == ['2020-01']
+    assert store.manifest['shards']['2020-01']['rows'] == 429
+
+    count = store.compact(str(tmp_path / 'out.csv.gz'))
+    assert count == 429
+
+
+def test_write_shard_replaces(tmp_path):
+    store = ShardedStore(str(tmp_path / 'store'))
+    store.write_shard('2020-01', [{'a': 1}, {'a': 2}], ['a'])
+    store.write_shard('2020-02', [{'a': 3}], ['a', 'b'])
+    store.write_shard('2020-01', [{'a': 4}], ['a'])
+
+    reopened = ShardedStore(str(tmp_path / 'store'))
+    assert reopened.keys() == ['2020-01', '2020-02']
+    assert [row['a'] for row in reopened.iter_rows()] == ['4', '3']
+    assert reopened.fieldnames() == ['a', 'b']
+
+
+def test_processes_share_a_manifest(tmp_path):
+    main = ShardedStore(str(tmp_path / 'store'))
+    worker = ShardedStore(str(tmp_path / 'store'))
+    main.write_shard('2020-01', [{'a': 1}], ['a'])
+    # the worker's manifest predates 2020-01, writing its shard keeps it
+    worker.write_shard('2020-02', [{'a': 2}], ['a'])
+
+    assert ShardedStore(str(tmp_path / 'store')).keys() == ['2020-01', '2020-02']
+    assert main.keys() == ['2020-01']
+    main.reload()
+    assert main.keys() == ['2020-01', '2020-02']
@@ -0,0 +1,56 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from utils.builder import DatasetBuilder
+from utils.mock_llm import MockLLMServer
+from utils.store import ShardedStore
+from utils.stream import StreamingJoin, iter_entries, spill_entries
+
+
+class Item(BaseModel):
+    value: Optional[int] = None
+
+
+class Extraction(BaseModel):
+    info_found: bool
+    data: List[Item] = []
+
+
+def test_spill_round_trip(tmp_path):
+    rows = [{'entry_id': 'a:doc.htm:item5.07:0', 'accession': 'a', 'cik': '1', 'filing_date': '20200109', 'document': 'doc.htm',
+             'item': 'item5.07', 'text': 'line\nbreak, "quoted"'}]
+    spill_entries(rows, str(tmp_path / 'entries.csv.gz'))
+    assert list(iter_entries(str(tmp_path / 'entries.csv.gz'))) == rows
+
+
+def test_join_writes_rows_with_a_value(tmp_path):
+    store = ShardedStore(str(tmp_path / 'store'))
+    with store.open_shard('2020-01', ['accession', 'cik', 'filing_date', 'entry_id', 'value']) as writer:
+        join = StreamingJoin(writer, {'a': {'accession': 'a0', 'cik': '1', 'filing_date': '20200109'}}, keep_field='value')
+        join.on_result('a', [{'_id': 'a', 'value': 0}, {'_id': 'a', 'value': None}])
+        join.on_result('b', [])
+        # nothing shows up until the shard is closed
+        assert store.keys() == []
+    assert join.rows == 1 and join.completed == {'a', 'b'}
+    assert store.manifest['shards']['2020-01']['rows'] == 1
+    assert list(store.iter_rows(['2020-01'])) == [{'accession': 'a0', 'cik': '1', 'filing_date': '20200109', 'entry_id': 'a', 'value': '0'}]
+
+
+def test_build_stream_hands_results_over_and_releases(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'mock')
+    seen = []
+
+    def on_result(entry_id, results):
+        seen.append((entry_id, [result['value'] for result in results]))
+
+    response = {'info_found': True, 'data': [{'value': 1}]}
+    with MockLLMServer(latency=0, jitter=0, response=response) as server:
+        builder = DatasetBuilder('prompt', Extraction, 'mock', [], rpm=1000, base_url=server.url,
+                                 on_result=on_result, release=True)
+        builder.build_stream(((str(i), f'text {i}') for i in range(7)), window=3)
+
+    assert sorted(seen) == [(str(i), [1]) for i in range(7)]
+    assert builder.streamed_results == 7
+    # only failures are kept
+    assert builder.entries == []
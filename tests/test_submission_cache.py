@@ -0,0 +1,100 @@
+import io
+import os
+import tarfile
+
+from utils.submission_cache import SubmissionCache, query_key
+
+QUERY = query_key(('8-K', '8-K/A'), ('8-K', '8-K/A'))
+
+
+def _tar(path, files):
+    with tarfile.open(path, 'w') as tar:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def _portfolio(path):
+    """One submission in each of the layouts datamule leaves behind"""
+    os.makedirs(path / '000000000120000001')
+    (path / '000000000120000001' / 'metadata.json').write_bytes(b'{"a": 1}')
+    (path / '000000000120000001' / 'doc.htm').write_bytes(b'<p>dir</p>')
+    _tar(path / '0000000001-20-000002.tar', [('doc.htm', b'<p>tar</p>'), ('metadata.json', b'{"a": 2}')])
+    _tar(path / 'batch_000.tar', [('000000000120000003/metadata.json', b'{"a": 3}'),
+                                  ('000000000120000003/doc.htm', b'<p>batch</p>')])
+
+
+def _members(path):
+    with tarfile.open(path, 'r') as tar:
+        return [(m.name, tar.extractfile(m).read()) for m in tar.getmembers()]
+
+
+def test_query_key_ignores_order():
+    assert query_key(['8-K/A', '8-K'], ['8-K']) == query_key(['8-K', '8-K/A'], ['8-K'])
+    assert query_key(['8-K'], ['8-K']) != query_key(['8-K'], ['EX-99.1'])
+
+
+def test_store_and_restore(tmp_path):
+    _portfolio(tmp_path / 'download')
+    cache = SubmissionCache(str(tmp_path / 'cache'))
+    assert cache.store('2020-03', QUERY, tmp_path / 'download') == 3
+    # already cached submissions are skipped
+    assert cache.store('2020-03', QUERY, tmp_path / 'download') == 0
+    assert cache.accessions('2020-03', QUERY) == {'000000000120000001', '000000000120000002', '000000000120000003'}
+
+    assert cache.restore('2020-03', QUERY, tmp_path / 'restored') == 3
+    members = _members(tmp_path / 'restored' / '000000000120000002.tar')
+    # metadata.json goes first, the layout datamule reads
+    assert members == [('metadata.json', b'{"a": 2}'), ('doc.htm', b'<p>tar</p>')]
+    assert dict(_members(tmp_path / 'restored' / '000000000120000003.tar'))['doc.htm'] == b'<p>batch</p>'
+
+    # one accession, dashed or not
+    assert cache.restore('2020-03', QUERY, tmp_path / 'one', accessions=['0000000001-20-000001']) == 1
+    assert os.listdir(tmp_path / 'one') == ['000000000120000001.tar']
+
+    # other months and queries are apart
+    assert cache.restore('2020-04', QUERY, tmp_path / 'other') == 0
+    assert cache.restore('2020-03', query_key(['8-K'], ['EX-99.1']), tmp_path / 'other') == 0
+    assert cache.stats()['entries'] == 3
+
+
+def test_complete_months(tmp_path):
+    cache = SubmissionCache(str(tmp_path / 'cache'))
+    assert not cache.is_complete('2020-03', QUERY)
+    cache.mark_complete('2020-03', QUERY)
+    assert cache.is_complete('2020-03', QUERY)
+    assert not cache.is_complete('2020-03', query_key(['8-K'], ['8-K']))
+
+    # persisted
+    cache.close()
+    assert SubmissionCache(str(tmp_path / 'cache')).is_complete('2020-03', QUERY)
+
+
+def test_lost_file_is_forgotten(tmp_path):
+    _portfolio(tmp_path / 'download')
+    cache = SubmissionCache(str(tmp_path / 'cache'))
+    cache.store('2020-03', QUERY, tmp_path / 'download')
+    cache.mark_complete('2020-03', QUERY)
+
+    with open(tmp_path / 'cache' / '2020-03' / '000000000120000001.tar.gz', 'wb') as f:
+        f.write(b'truncated')
+    assert cache.restore('2020-03', QUERY, tmp_path / 'restored') == 2
+    assert not os.path.exists(tmp_path / 'restored' / '000000000120000001.tar')
+    # it is downloaded again on the next run
+    assert '000000000120000001' not in cache.accessions('2020-03', QUERY)
+    assert not cache.is_complete('2020-03', QUERY)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    _portfolio(tmp_path / 'download')
+    cache = SubmissionCache(str(tmp_path / 'cache'), max_bytes=None)
+    cache.store('2020-03', QUERY, tmp_path / 'download')
+    sizes = cache.stats()['bytes']
+
+    # the restored submission is the most recently used, the other two go first
+    cache.restore('2020-03', QUERY, tmp_path / 'restored', accessions=['000000000120000002'])
+    cache.max_bytes = sizes // 3 + 10
+    assert cache.evict() == 2
+    assert cache.accessions('2020-03', QUERY) == {'000000000120000002'}
+    assert os.listdir(tmp_path / 'cache' / '2020-03') == ['000000000120000002.tar.gz']
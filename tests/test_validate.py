@@ -0,0 +1,94 @@
+from utils.schemas import ProposalResult, SingleDividend
+from utils.validate import (
+    DIVIDEND_ROW_CHECKS,
+    ENUMS,
+    PROPOSAL_ROW_CHECKS,
+    Validator,
+    to_enum,
+    to_number,
+)
+
+
+def test_to_number():
+    assert to_number('1,234,567 shares') == 1234567
+    assert to_number('$0.25') == 0.25
+    assert to_number('-5') == -5
+    assert to_number(12) == 12.0
+    assert to_number('1,234.') == 1234
+    assert to_number('none reported') is None
+    # dots as thousands separators read as a count or a decimal, neither is guessed
+    assert to_number('1.234.567') is None
+    assert to_number('1.234,56') is None
+
+
+def test_to_enum():
+    allowed = ['Management', 'Shareholder']
+    synonyms = ENUMS['proponent_type']
+    assert to_enum('management', allowed, synonyms) == 'Management'
+    assert to_enum('Board of Directors', allowed, synonyms) == 'Management'
+    assert to_enum('Stockholders', allowed, synonyms) == 'Shareholder'
+    # the longer phrase wins over a word elsewhere in the text
+    assert to_enum('Stockholder proposal opposed by the board', allowed, synonyms) == 'Shareholder'
+    # whole words, then the earliest
+    assert to_enum('Management (on behalf of holders)', allowed, synonyms) == 'Management'
+    assert to_enum('Management (on behalf of shareholders)', allowed, synonyms) == 'Management'
+    assert to_enum('a supermajority', allowed, synonyms) is None
+
+
+def test_literal_fields_use_their_own_options():
+    assert to_enum('annual meeting', ('Annual', 'Special')) == 'Annual'
+    assert to_enum('Special Meeting of Stockholders', ('Annual', 'Special')) == 'Special'
+    assert to_enum('annually', ('Annual', 'Special')) is None
+
+    validator = Validator(ProposalResult)
+    rows = [{'entry_id': 'e1', 'meeting_type': 'annual meeting', 'proponent_type': 'company'}]
+    assert validator.validate(rows) == {}
+    assert (rows[0]['meeting_type'], rows[0]['proponent_type']) == ('Annual', 'Management')
+
+
+def test_normalize_repairs_and_blanks():
+    validator = Validator(ProposalResult, PROPOSAL_ROW_CHECKS)
+    rows = [
+        {'entry_id': 'e1', 'presentation_order': '1', 'votes_for': '1,000', 'votes_against': 'n/a',
+         'meeting_date': 'May 14, 2020', 'proponent_type': 'Stockholder proposal'},
+        {'entry_id': 'e1', 'presentation_order': 2, 'votes_for': '1.234.567', 'meeting_date': '2020-05-14'},
+    ]
+    issues = validator.validate(rows)
+    assert rows[0] == {'entry_id': 'e1', 'presentation_order': 1, 'votes_for': 1000, 'votes_against': None,
+                       'meeting_date': '2020-05-14', 'proponent_type': 'Shareholder', 'abstentions': None,
+                       'broker_non_votes': None, 'meeting_type': None}
+    assert rows[1]['votes_for'] is None
+    assert issues == {'e1': [{'field': 'votes_for', 'problem': 'bad_number', 'value': '1.234.567'}]}
+
+
+def test_proposal_row_checks():
+    validator = Validator(ProposalResult, PROPOSAL_ROW_CHECKS)
+    good = [{'entry_id': 'e1', 'presentation_order': n, 'votes_for': 900 + n, 'votes_against': 100} for n in range(1, 4)]
+    assert validator.validate(good) == {}
+
+    outlier = good[:2] + [{'entry_id': 'e1', 'presentation_order': 3, 'votes_for': 10, 'votes_against': 0}]
+    problems = [issue['problem'] for issue in validator.validate(outlier)['e1']]
+    assert problems == ['vote_total_outlier']
+
+    rows = [{'entry_id': 'e2', 'presentation_order': 1, 'votes_for': -5, 'meeting_date': '2020-05-14'},
+            {'entry_id': 'e2', 'presentation_order': 1, 'votes_for': 5, 'meeting_date': '2020-06-14'},
+            {'entry_id': 'e3', 'presentation_order': 1, 'votes_for': 5}]
+    issues = validator.validate(rows)
+    assert sorted(issue['problem'] for issue in issues['e2']) == ['duplicate_order', 'inconsistent_meeting_date', 'negative_count']
+    # checks run per entry
+    assert 'e3' not in issues
+
+
+def test_dividend_row_checks():
+    validator = Validator(SingleDividend, DIVIDEND_ROW_CHECKS)
+    rows = [{'entry_id': 'e1', 'filing_date': '20200109', 'dividend_per_share': '$0.25',
+             'record_date': '2020-02-01 00:00:00', 'payment_date': 'February 15, 2020'}]
+    assert validator.validate(rows) == {}
+    assert (rows[0]['dividend_per_share'], rows[0]['record_date'], rows[0]['payment_date']) == (0.25, '2020-02-01', '2020-02-15')
+
+    rows = [{'entry_id': 'e1', 'filing_date': '20200109', 'dividend_per_share': 2500,
+             'record_date': '2020-03-01', 'payment_date': '2020-02-15'},
+            {'entry_id': 'e2', 'filing_date': '20200109', 'dividend_per_share': 0.25, 'payment_date': '2015-02-15'}]
+    issues = validator.validate(rows)
+    assert sorted(issue['problem'] for issue in issues['e1']) == ['implausible_amount', 'record_after_payment']
+    assert [issue['problem'] for issue in issues['e2']] == ['implausible_date']
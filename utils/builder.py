@@ -0,0 +1,556 @@
+import asyncio
+import csv
+import os
+import time
+from collections import deque
+from itertools import islice
+from types import SimpleNamespace
+from typing import List
+
+from google import genai
+from pydantic import create_model
+from tqdm import tqdm
+
+from .controller import backoff
+
+BATCH_INSTRUCTIONS = """The text below contains several independent sections, each starting with a line "=== ENTRY <n> ===".
+Apply the instructions to each section separately and return exactly one result per section, with entry_id set to its <n>."""
+
+
+def batch_schema(schema):
+    """Wrapper schema for several entries in one call, each result keyed by entry_id"""
+    entry = create_model(f'{schema.__name__}BatchEntry', entry_id=(str, ...), __base__=schema)
+    return create_model(f'{schema.__name__}Batch', results=(List[entry], []))
+
+
+class RateLimiter:
+    """Sliding window requests per minute, usable across builds"""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.request_times = deque()
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self):
+        # asyncio primitives bind to a loop, and each build() runs its own loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def acquire(self):
+        async with self._get_lock():
+            now = time.time()
+            while self.request_times and now - self.request_times[0] >= 60:
+                self.request_times.popleft()
+            if len(self.request_times) >= self.rpm:
+                await asyncio.sleep(60 - (now - self.request_times[0]) + 0.1)
+                now = time.time()
+                while self.request_times and now - self.request_times[0] >= 60:
+                    self.request_times.popleft()
+            self.request_times.append(now)
+
+
+class DatasetBuilder:
+    """Structured extraction of texts with Gemini. Same interface as the txt2dataset DatasetBuilder it replaces.
+
+    entries: list of (id, text). build() turns each into (id, text, results, tokens), or
+        (id, text, error) when its call fails, and a later build() only redoes those
+    rpm, max_concurrent, timeout: requests per minute, calls in flight and seconds per call
+    api_key: defaults to $GEMINI_API_KEY
+    cache: optional LLMCache, hits skip the API call entirely
+    controller: optional AdaptiveController, concurrency then adapts below max_concurrent,
+        throttled calls retry with jittered backoff and failed entries are rescheduled
+    max_retries: retries per call when a controller is set
+    rounds: passes over failed entries when a controller is set
+    base_url: point the client somewhere else, e.g. the local mock server
+    batch_tokens: pack short entries into one call up to this many estimated input tokens,
+        entries missing from a batch response fall back to single calls
+    max_batch_size: most entries per batched call
+    batch_timeout: seconds per batched call, by default timeout times the entries in the batch
+    on_result: optional callback(entry_id, results), called as each entry finishes
+    release: once an entry is handed to on_result, drop its text and results from memory
+    metrics: optional Metrics, records calls, latency, retries, tokens and cache hits
+    router: optional ModelRouter, entries then start on its cheapest pool and move up a pool when
+        a call fails or the output fails one of `checks`. model, rpm and controller are unused
+    checks: validation checks on each parsed response, see utils/checks.py
+    chunker: optional chunker (split(text) -> texts, merge(results per chunk) -> results), e.g.
+        utils.chunking.ProposalChunker. Long entries are split and their chunks extracted in
+        parallel, each through the router and checks on its own
+    """
+
+    def __init__(self, prompt, schema, model, entries, rpm=60, api_key=None, max_concurrent=10, timeout=60,
+                 cache=None, controller=None, max_retries=3, rounds=3, base_url=None,
+                 batch_tokens=None, max_batch_size=20, batch_timeout=None, on_result=None, release=False, metrics=None,
+                 router=None, checks=(), chunker=None):
+        api_key = api_key or os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise ValueError("API key must be provided either as an argument or through the GEMINI_API_KEY environment variable.")
+
+        self.prompt = prompt
+        self.schema = schema
+        self.model = model
+        self.entries = entries
+        self.rpm = rpm
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.cache = cache
+        self.controller = controller
+        self.max_retries = max_retries
+        self.rounds = rounds
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.batch_timeout = batch_timeout
+        self.on_result = on_result
+        self.release = release
+        self.metrics = metrics
+        self.streamed_results = 0
+        self.router = router
+        self.checks = checks
+        self.chunker = chunker
+        self.start_tiers = {}
+
+        if router is not None:
+            # cached responses are whatever the router ended up accepting
+            self.model = router.key
+            self.max_concurrent = sum(pool.max_concurrent for pool in router.pools)
+
+        if base_url is None:
+            self.client = genai.Client(api_key=api_key)
+        else:
+            self.client = genai.Client(api_key=api_key, http_options={'base_url': base_url})
+        self.rate_limiter = RateLimiter(rpm)
+        self.pbar = None
+        self.success_count = 0
+        self.error_count = 0
+
+        # the controller does the limiting, max_concurrent is only the ceiling
+        if controller is not None:
+            controller.maximum = min(controller.maximum, self.max_concurrent)
+
+    def _calculate_input_tokens_single(self, prompt, text):
+        """Rough estimate, four characters a token"""
+        return len(f"{prompt}: {text}") // 4
+
+    def _get_entry_state(self, entry):
+        return {2: 'unprocessed', 3: 'error', 4: 'success'}.get(len(entry), 'unknown')
+
+    def _get_entries_to_process(self):
+        return [i for i, entry in enumerate(self.entries) if self._get_entry_state(entry) in ('unprocessed', 'error')]
+
+    def _update_progress(self, success=False, error=False):
+        # every call runs on the build's one event loop, no lock needed
+        if success:
+            self.success_count += 1
+        if error:
+            self.error_count += 1
+        if self.pbar is not None:
+            self.pbar.set_description(f"✓{self.success_count} ✗{self.error_count}")
+            self.pbar.update(1)
+
+    async def _generate(self, contents, schema, timeout=None, pool=None):
+        """Rate limited structured call with a timeout, self.timeout by default, on a router pool's model and quota if given"""
+        timeout = timeout or self.timeout
+        await (self.rate_limiter if pool is None else pool.rate_limiter).acquire()
+        try:
+            return await asyncio.wait_for(
+                self.client.aio.models.generate_content(
+                    model=self.model if pool is None else pool.model,
+                    contents=contents,
+                    config={
+                        "response_mime_type": "application/json",
+                        "response_schema": schema,
+                    },
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            raise Exception(f"API request timed out after {timeout} seconds")
+
+    def _record_call(self, latency, error=None, model=None):
+        if self.metrics is None:
+            return
+        model = model or self.model
+        self.metrics.inc('llm_calls', model=model)
+        self.metrics.observe('llm_latency_seconds', latency, model=model)
+        if error is not None:
+            self.metrics.inc('llm_errors', model=model)
+
+    async def _call(self, make_call, pool=None):
+        """Run an API call through the controller (the pool's, with a router), retrying with jittered backoff"""
+        controller = self.controller if pool is None else pool.controller
+        model = self.model if pool is None else pool.model
+        # without a controller a call is tried once
+        attempts = 1 if controller is None else self.max_retries + 1
+
+        for attempt in range(attempts):
+            if controller is not None:
+                await controller.acquire()
+            start = time.monotonic()
+            try:
+                response = await make_call()
+            except Exception as e:
+                latency = time.monotonic() - start
+                self._record_call(latency, error=e, model=model)
+                if controller is not None:
+                    await controller.release(latency, error=e)
+                if attempt == attempts - 1:
+                    raise
+                controller.retries += 1
+                if self.metrics is not None:
+                    self.metrics.inc('llm_retries', model=model)
+                await asyncio.sleep(backoff(attempt))
+                continue
+            latency = time.monotonic() - start
+            self._record_call(latency, model=model)
+            if controller is not None:
+                await controller.release(latency)
+            return response
+
+    async def _make_api_call(self, text):
+        return await self._call(lambda: self._generate(f"{self.prompt}: {text}", self.schema))
+
+    def _process_response(self, response, entry_id):
+        """(results, output tokens) of a response, one result per data item with _id added"""
+        parsed = response.parsed
+        # output that doesn't match the schema is an error, not an empty answer
+        if parsed is None:
+            raise Exception("response does not match the schema")
+        tokens = len(response.text or '') // 4
+        if not getattr(parsed, 'info_found', False) or not getattr(parsed, 'data', None):
+            return [], tokens
+        data = parsed.data if isinstance(parsed.data, list) else [parsed.data]
+        return [{'_id': entry_id, **item.model_dump()} for item in data], tokens
+
+    def _apply_cache(self):
+        """Mark entries with a cached response as done before anything is sent"""
+        if self.cache is None:
+            return
+        for i in self._get_entries_to_process():
+            entry_id, text = self.entries[i][:2]
+            cached = self.cache.get(self.model, self.prompt, self.schema, text)
+            if self.metrics is not None:
+                self.metrics.inc('cache_hits' if cached is not None else 'cache_misses', model=self.model)
+            if cached is not None:
+                results, tokens = cached
+                self.entries[i] = (entry_id, text, [{'_id': entry_id, **result} for result in results], 0)
+                self._finish(i, store=False)
+
+    def _finish(self, entry_index, store=True):
+        """Cache a finished entry, hand it to on_result, and release it if asked"""
+        entry = self.entries[entry_index]
+        if self._get_entry_state(entry) != 'success':
+            return
+        if self.metrics is not None:
+            self.metrics.inc('entries_extracted', model=self.model)
+            self.metrics.inc('llm_tokens', entry[3], model=self.model)
+        if store and self.cache is not None:
+            results = [{k: v for k, v in result.items() if k != '_id'} for result in entry[2]]
+            self.cache.set(self.model, self.prompt, self.schema, entry[1], results, entry[3])
+        if self.on_result is not None:
+            self.on_result(entry[0], entry[2])
+            self.streamed_results += len(entry[2])
+        if self.release:
+            self.entries[entry_index] = (entry[0], '', [], entry[3])
+
+    async def _process_single_entry(self, entry_index):
+        chunks = None if self.chunker is None else self.chunker.split(self.entries[entry_index][1])
+        if chunks is not None and len(chunks) > 1:
+            await self._process_chunked(entry_index, chunks)
+            self._finish(entry_index)
+            return
+
+        if self.router is not None:
+            await self._process_routed(entry_index)
+            self._finish(entry_index)
+            return
+
+        entry_id, text = self.entries[entry_index][:2]
+        async with self.semaphore:
+            try:
+                response = await self._make_api_call(text)
+                results, tokens = self._process_response(response, entry_id)
+            except Exception as e:
+                self.entries[entry_index] = (entry_id, text, str(e))
+                print(f"✗ Error processing entry {entry_id}: {e}")
+                self._update_progress(error=True)
+                return
+
+        self.entries[entry_index] = (entry_id, text, results, tokens)
+        self._update_progress(success=True)
+        self._finish(entry_index)
+
+    def _escalate(self, reason, model):
+        self.router.escalate(reason)
+        if self.metrics is not None:
+            self.metrics.inc('escalations', reason=reason, model=model)
+
+    async def _route(self, text, tier=None):
+        """Walk the router's pools from tier (the router's pick by default) until one gives output that passes the checks"""
+        if tier is None:
+            tier = self.router.start(text)
+        last = len(self.router.pools) - 1
+
+        while True:
+            pool = self.router.pools[tier]
+            try:
+                response = await self._call(lambda: self._generate(f"{self.prompt}: {text}", self.schema, pool=pool), pool=pool)
+                # output that doesn't match the schema fails like a call
+                if response.parsed is None:
+                    raise Exception("response does not match the schema")
+                # the last pool's answer is taken as is
+                reason = None if tier == last else self.router.check(self.checks, response.parsed, text)
+            except Exception:
+                if tier == last:
+                    raise
+                reason = 'error'
+
+            if reason is None:
+                self.router.accept(pool.model)
+                return response
+
+            self._escalate(reason, pool.model)
+            tier += 1
+
+    async def _process_routed(self, entry_index):
+        async with self.semaphore:
+            entry_id, text = self.entries[entry_index][:2]
+            try:
+                # entries escalated out of a batch were already counted as started
+                response = await self._route(text, self.start_tiers.pop(entry_index, None))
+                results, tokens = self._process_response(response, entry_id)
+            except Exception as e:
+                self.entries[entry_index] = (entry_id, text, str(e))
+                print(f"✗ Error processing entry {entry_id}: {e}")
+                self._update_progress(error=True)
+                return
+
+            self.entries[entry_index] = (entry_id, text, results, tokens)
+            self._update_progress(success=True)
+
+    async def _extract_chunk(self, entry_id, chunk):
+        """(results, tokens) of one chunk. Chunks are cached on their own, so a rescheduled entry only redoes failed ones"""
+        if self.cache is not None:
+            cached = self.cache.get(self.model, self.prompt, self.schema, chunk, count=False)
+            if cached is not None:
+                return [{'_id': entry_id, **result} for result in cached[0]], 0
+
+        async with self.semaphore:
+            if self.router is None:
+                response = await self._make_api_call(chunk)
+            else:
+                response = await self._route(chunk)
+        results, tokens = self._process_response(response, entry_id)
+
+        if self.cache is not None:
+            self.cache.set(self.model, self.prompt, self.schema, chunk, [{k: v for k, v in r.items() if k != '_id'} for r in results], tokens)
+        return results, tokens
+
+    async def _process_chunked(self, entry_index, chunks):
+        """Extract a long entry's chunks in parallel and merge them, the entry fails if any chunk does"""
+        entry_id, text = self.entries[entry_index][:2]
+        self.start_tiers.pop(entry_index, None)
+        if self.metrics is not None:
+            self.metrics.inc('chunked_entries', model=self.model)
+            self.metrics.inc('chunks', len(chunks), model=self.model)
+
+        parts = await asyncio.gather(*[self._extract_chunk(entry_id, chunk) for chunk in chunks], return_exceptions=True)
+        errors = [part for part in parts if isinstance(part, Exception)]
+        if errors:
+            self.entries[entry_index] = (entry_id, text, f"{len(errors)} of {len(chunks)} chunks failed: {errors[0]}")
+            print(f"✗ Error processing entry {entry_id}: {self.entries[entry_index][2]}")
+            self._update_progress(error=True)
+            return
+
+        results = self.chunker.merge([results for results, _ in parts])
+        self.entries[entry_index] = (entry_id, text, results, sum(tokens for _, tokens in parts))
+        self._update_progress(success=True)
+
+    def _make_batches(self):
+        """Greedy packing of short entries, in order, up to batch_tokens"""
+        batches = []
+        current = []
+        current_tokens = 0
+        for i in self._get_entries_to_process():
+            tokens = self._calculate_input_tokens_single('', self.entries[i][1])
+            # long entries gain nothing from batching
+            if tokens > self.batch_tokens // 2:
+                continue
+            if current and (current_tokens + tokens > self.batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if len(current) > 1:
+            batches.append(current)
+        return [batch for batch in batches if len(batch) > 1]
+
+    async def _process_batch(self, indices, schema):
+        # a batch does the work of len(indices) calls, a per call timeout would fail it every time
+        timeout = self.batch_timeout or self.timeout * len(indices)
+        # with a router, batches go to the cheapest pool
+        pool = None if self.router is None else self.router.pools[0]
+        async with self.semaphore:
+            sections = '\n\n'.join(f"=== ENTRY {n} ===\n{self.entries[i][1]}" for n, i in enumerate(indices))
+            try:
+                response = await self._call(lambda: self._generate(f"{self.prompt}\n\n{BATCH_INSTRUCTIONS}: {sections}", schema, timeout, pool), pool=pool)
+                results = response.parsed.results
+            except Exception as e:
+                # every entry falls back to a single call
+                print(f"✗ Batch of {len(indices)} failed, falling back: {e}")
+                return 0
+
+            by_id = {}
+            for result in results:
+                by_id.setdefault(result.entry_id.strip(), result)
+
+            tokens = (len(response.text) // 4) // len(indices)
+            mapped = 0
+            for n, i in enumerate(indices):
+                result = by_id.get(str(n))
+                if result is None:
+                    continue
+                entry_id, text = self.entries[i][:2]
+                single = self.schema(**result.model_dump(exclude={'entry_id'}))
+                if self.router is not None:
+                    # answered here, so it started on the cheapest pool
+                    self.router.begin(pool.model)
+                    reason = self.router.check(self.checks, single, text)
+                    if reason is not None:
+                        # goes to a single call on the next pool up
+                        self._escalate(reason, pool.model)
+                        self.start_tiers[i] = min(1, len(self.router.pools) - 1)
+                        continue
+                    self.router.accept(pool.model)
+                rows, _ = self._process_response(SimpleNamespace(parsed=single, text=''), entry_id)
+                self.entries[i] = (entry_id, text, rows, tokens)
+                self._finish(i)
+                mapped += 1
+            return mapped
+
+    async def _build_batches(self):
+        batches = self._make_batches()
+        if not batches:
+            return
+        schema = batch_schema(self.schema)
+        batched = sum(len(batch) for batch in batches)
+        print(f"Batching {batched} short entries into {len(batches)} requests")
+        mapped = await asyncio.gather(*[self._process_batch(batch, schema) for batch in batches])
+        print(f"- {sum(mapped)} entries answered in batches, {batched - sum(mapped)} fall back to single calls")
+
+    async def _run(self):
+        """One pass over every entry not yet done"""
+        to_process = self._get_entries_to_process()
+        if not to_process:
+            print("No entries need processing")
+            return
+
+        input_tokens = sum(self._calculate_input_tokens_single(self.prompt, self.entries[i][1]) for i in to_process)
+        print(f"Processing {len(to_process)} entries, {self.rpm} rpm, at most {self.max_concurrent} at a time, "
+              f"~{input_tokens:,} input tokens")
+
+        self.success_count = 0
+        self.error_count = 0
+        self.pbar = tqdm(total=len(to_process), desc="✓0 ✗0", unit="entries")
+        try:
+            await asyncio.gather(*[self._process_single_entry(i) for i in to_process])
+        finally:
+            self.pbar.close()
+            self.pbar = None
+        self._print_summary()
+
+    async def _build(self):
+        # asyncio primitives bind to the loop they are first used on, and every build() runs a new loop
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.start_tiers = {}
+
+        if self.metrics is not None:
+            self.metrics.inc('entries_submitted', len(self._get_entries_to_process()), model=self.model)
+
+        self._apply_cache()
+
+        if self.batch_tokens:
+            await self._build_batches()
+
+        await self._run()
+
+        # reschedule failed entries instead of dropping them
+        if self.controller is not None or self.router is not None:
+            for round in range(1, self.rounds):
+                errors = [entry for entry in self.entries if self._get_entry_state(entry) == 'error']
+                if not errors:
+                    break
+                wait = backoff(round, base=5.0)
+                print(f"Rescheduling {len(errors)} failed entries in {wait:.1f}s (round {round + 1}/{self.rounds})")
+                await asyncio.sleep(wait)
+                await self._run()
+
+        if self.metrics is not None:
+            failed = sum(1 for entry in self.entries if self._get_entry_state(entry) == 'error')
+            self.metrics.inc('entries_failed', failed, model=self.model)
+
+    def _print_summary(self):
+        states = [self._get_entry_state(entry) for entry in self.entries]
+        done = [entry for entry, state in zip(self.entries, states) if state == 'success']
+        print(f"Successful: {len(done)}, errors: {states.count('error')}, unprocessed: {states.count('unprocessed')}, "
+              f"{sum(len(entry[2]) for entry in done)} results, {sum(entry[3] for entry in done):,} tokens")
+
+    def build_stream(self, entries, window=500):
+        """Build from an iterable of (id, text) in windows, so only one window of texts is in memory.
+
+        Use with on_result to write results out as they arrive.
+        """
+        entries = iter(entries)
+        failed = []
+        while True:
+            self.entries = list(islice(entries, window))
+            if not self.entries:
+                break
+            self.build()
+            failed.extend(entry for entry in self.entries if self._get_entry_state(entry) == 'error')
+
+        # only failures stay around, for get_errors / print_errors
+        self.entries = failed
+
+    def build(self):
+        asyncio.run(self._build())
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} cached responses")
+        if self.router is not None:
+            print(f"Router: {self.router.stats()}")
+        elif self.controller is not None:
+            print(f"Controller: {self.controller.stats()}")
+
+    def get_results(self):
+        return [result for entry in self.entries if self._get_entry_state(entry) == 'success' for result in entry[2]]
+
+    def save(self, filename):
+        """Results to a csv with every field quoted, columns sorted"""
+        results = self.get_results()
+        if not results:
+            print("No results to save")
+            return
+        fieldnames = sorted({field for result in results for field in result})
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Saved {len(results)} records to {filename}")
+
+    def get_errors(self):
+        return [{'id': entry[0], 'text': entry[1][:100] + '...' if len(entry[1]) > 100 else entry[1], 'error': entry[2]}
+                for entry in self.entries if self._get_entry_state(entry) == 'error']
+
+    def print_errors(self):
+        errors = self.get_errors()
+        if not errors:
+            print("No errors found")
+            return
+        print(f"\nFound {len(errors)} errors:")
+        for error in errors:
+            print(f"ID {error['id']}: {error['error']}")
+            print(f"  Text: {error['text']}")
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get('SEC_LLM_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'structured-output', 'llm_cache.db'
+)
+
+
+class LLMCache:
+    """Persistent, content addressed cache of structured LLM responses.
+
+    Keyed on a hash of (model, prompt, schema json, text), so any change to the prompt or schema is a miss.
+    Stores the extracted rows (without _id) so they can be re-attached to any entry id.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=None, max_bytes=None):
+        self.path = path
+        self.max_age = max_age  # seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            value TEXT,
+            tokens INTEGER,
+            size INTEGER,
+            created REAL,
+            accessed REAL
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.conn.commit()
+
+        self.evict()
+
+    @staticmethod
+    def make_key(model, prompt, schema, text):
+        """Hash of everything that determines the response"""
+        schema_json = schema.model_json_schema() if hasattr(schema, 'model_json_schema') else schema
+        payload = json.dumps([model, prompt, schema_json, text], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model, prompt, schema, text, count=True):
+        """Return (results, tokens) or None. count=False looks without touching counters or LRU order"""
+        key = self.make_key(model, prompt, schema, text)
+        with self.lock:
+            row = self.conn.execute('SELECT value, tokens FROM responses WHERE key = ?', (key,)).fetchone()
+            if not count:
+                return None if row is None else (json.loads(row[0]), row[1])
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, model, prompt, schema, text, results, tokens=0):
+        key = self.make_key(model, prompt, schema, text)
+        # default=str matches how csv writes datetimes
+        value = json.dumps(results, default=str, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model, value, tokens, len(value), now, now)
+            )
+            self.conn.commit()
+
+    def evict(self, max_age=None, max_bytes=None):
+        """Drop entries older than max_age, then least recently used until under max_bytes"""
+        max_age = max_age if max_age is not None else self.max_age
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        removed = 0
+        with self.lock:
+            if max_age is not None:
+                cur = self.conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - max_age,))
+                removed += cur.rowcount
+
+            if max_bytes is not None:
+                total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+                if total > max_bytes:
+                    to_delete = []
+                    for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY accessed ASC'):
+                        if total <= max_bytes:
+                            break
+                        to_delete.append((key,))
+                        total -= size
+                    self.conn.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+                    removed += len(to_delete)
+            self.conn.commit()
+        return removed
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': count, 'bytes': size}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,119 @@
+import re
+
+from .validate import (
+    VOTE_FIELDS,
+    check_dividend_amounts,
+    check_meeting_dates,
+    check_negative_counts,
+    check_proposal_order,
+    check_votes_per_share,
+)
+
+# Validation checks on a parsed LLM response. Each takes (parsed, text), parsed being the
+# extraction schema instance and text the section it came from, and returns None when the
+# output looks right, otherwise a short reason. The router escalates on any reason.
+#
+# Rules on the values alone are utils/validate.py's row checks, run here on the response's rows,
+# so a response the router accepts isn't then flagged by the output validator for the same thing.
+# Only the checks against the section text live here.
+
+_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+_AMOUNT = re.compile(r'\d*\.\d+|\d+')
+
+
+def numbers_in(text):
+    """Whole numbers written in the text, '1,234,567' and '1,234,567.89' both count as 1234567"""
+    numbers = set()
+    for match in _NUMBER.findall(text):
+        try:
+            numbers.add(int(float(match.replace(',', ''))))
+        except ValueError:
+            continue
+    return numbers
+
+
+def _found(parsed):
+    return bool(getattr(parsed, 'info_found', False))
+
+
+def _rows(parsed):
+    return [item.model_dump() for item in parsed.data]
+
+
+def _reason(problems):
+    """First problem of a row check, as a reason"""
+    return problems[0][1] if problems else None
+
+
+def proposal_counts_missing(parsed, text):
+    if not _found(parsed):
+        return None
+    if not parsed.data:
+        return 'missing_counts'
+    if any(p.votes_for is None and p.votes_against is None for p in parsed.data):
+        return 'missing_counts'
+    return None
+
+
+def proposal_counts_in_text(parsed, text):
+    """Vote counts are copied, not computed, so each one should appear in the section.
+
+    Zeros are skipped, filings write them as '-', '—' or 'None'.
+    """
+    if not _found(parsed):
+        return None
+    reason = _reason(check_negative_counts(_rows(parsed)))
+    if reason is not None:
+        return reason
+    numbers = numbers_in(text)
+    for p in parsed.data:
+        for field in VOTE_FIELDS:
+            value = getattr(p, field)
+            if value is None or value == 0:
+                continue
+            if value not in numbers:
+                return 'counts_not_in_text'
+    return None
+
+
+def proposal_dates(parsed, text):
+    if not _found(parsed):
+        return None
+    return _reason(check_meeting_dates(_rows(parsed)))
+
+
+def proposal_order(parsed, text):
+    if not _found(parsed):
+        return None
+    return _reason(check_proposal_order(_rows(parsed)))
+
+
+def dividend_amounts(parsed, text):
+    """Each amount should be plausible and written in the text, in dollars or in cents"""
+    if not _found(parsed):
+        return None
+    if not parsed.data or any(dividend.dividend_per_share is None for dividend in parsed.data):
+        return 'missing_amount'
+    reason = _reason(check_dividend_amounts(_rows(parsed)))
+    if reason is not None:
+        return reason
+    amounts = [float(match) for match in _AMOUNT.findall(text.replace(',', ''))]
+    for dividend in parsed.data:
+        value = dividend.dividend_per_share
+        if not any(abs(amount - value) < 1e-6 or abs(amount / 100 - value) < 1e-6 for amount in amounts):
+            return 'amount_not_in_text'
+    return None
+
+
+def votes_per_share_values(parsed, text):
+    if not _found(parsed):
+        return None
+    for share_class in parsed.data:
+        if share_class.votes_per_share is None or share_class.share_class is None:
+            return 'missing_fields'
+    return _reason(check_votes_per_share(_rows(parsed)))
+
+
+PROPOSAL_CHECKS = (proposal_counts_missing, proposal_counts_in_text, proposal_dates, proposal_order)
+DIVIDEND_CHECKS = (dividend_amounts,)
+VOTES_PER_SHARE_CHECKS = (votes_per_share_values,)
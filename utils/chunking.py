@@ -0,0 +1,98 @@
+import re
+
+from .validate import VOTE_FIELDS
+
+# Where a proposal starts: "Proposal No. 2", "PROPOSAL TWO", "Matter 3:", "Item 1 -" (but not
+# "Item 5.07"), or a numbered line "4. Ratification ..." / "(4) Ratification ..."
+_NUMBER_WORDS = 'one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve'
+_BOUNDARY = re.compile(
+    r'^[ \t]*(?:'
+    rf'(?:proposal|matter|item)(?![a-z])\s*(?:no\.?|number|#)?\s*(?!\d+\.\d)(?:\d{{1,2}}[a-z]?|[a-z]|{_NUMBER_WORDS})(?![a-z0-9])'
+    r'|\(?\d{1,2}[.)][ \t]+(?-i:[A-Z])'
+    r')',
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def proposal_boundaries(text):
+    """Offsets where a proposal starts"""
+    return [match.start() for match in _BOUNDARY.finditer(text)]
+
+
+def proposal_key(result):
+    """Identity of a proposal across chunks. Vote counts when there are any, the description otherwise"""
+    counts = tuple(result.get(field) for field in VOTE_FIELDS)
+    if any(count for count in counts):
+        return ('counts',) + counts
+    return ('description', ' '.join(str(result.get('proposal_description') or '').lower().split()))
+
+
+class ProposalChunker:
+    """Splits long Item 5.07 sections on proposal boundaries and merges the chunks' results.
+
+    max_tokens: sections over this many estimated tokens are split, chunks are packed up to it
+    overlap: proposals repeated at the start of the next chunk, so one cut mid-proposal is
+        still seen whole once. merge() drops the repeat
+    header_chars: the text before the first proposal (meeting date and type, share counts) is
+        prepended to every chunk, up to this many characters
+
+    Pass as the builder's chunker, the chunks of a section are extracted in parallel.
+    """
+
+    def __init__(self, max_tokens=3000, overlap=1, header_chars=1500):
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.header_chars = header_chars
+
+    def split(self, text):
+        """[text] when short or without proposal boundaries, otherwise the chunks in order"""
+        if len(text) // 4 <= self.max_tokens:
+            return [text]
+        starts = proposal_boundaries(text)
+        if len(starts) < 2:
+            return [text]
+
+        header = text[:starts[0]][:self.header_chars]
+        segments = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+        budget = self.max_tokens * 4 - len(header)
+
+        chunks = []
+        current, carried = [], 0
+        for segment in segments:
+            # a chunk holding only the carried over proposals would repeat them for nothing
+            if len(current) > carried and sum(map(len, current)) + len(segment) > budget:
+                chunks.append(current)
+                current = current[-self.overlap:] if self.overlap else []
+                carried = len(current)
+            current.append(segment)
+        if len(current) > carried:
+            chunks.append(current)
+
+        if len(chunks) < 2:
+            return [text]
+        return [header + ''.join(chunk) for chunk in chunks]
+
+    def merge(self, parts):
+        """Each chunk's results, in chunk order -> one list in presentation order, seam duplicates dropped"""
+        merged = []
+        seen = set()
+        for results in parts:
+            # each chunk numbers its proposals from 1
+            for result in sorted(results, key=lambda r: (r.get('presentation_order') is None, r.get('presentation_order') or 0)):
+                key = proposal_key(result)
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(result)
+
+        for order, result in enumerate(merged, 1):
+            result['presentation_order'] = order
+
+        # every chunk sees the header, but fill in a chunk that left the meeting out
+        for field in ('meeting_date', 'meeting_type'):
+            value = next((result[field] for result in merged if result.get(field)), None)
+            if value is not None:
+                for result in merged:
+                    if not result.get(field):
+                        result[field] = value
+        return merged
@@ -0,0 +1,106 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+
+def is_throttle(error):
+    """True for errors that mean we are pushing too hard (429s, overloaded, timeouts)"""
+    code = getattr(error, 'code', None)
+    if code in (429, 503):
+        return True
+    message = str(error)
+    return any(s in message for s in ('429', 'RESOURCE_EXHAUSTED', 'UNAVAILABLE', '503', 'timed out'))
+
+
+class AdaptiveController:
+    """AIMD concurrency controller for LLM calls.
+
+    The concurrency limit grows by `increase` after every limit's worth of healthy calls and is
+    multiplied by `decrease` on a 429/timeout, at most once per `cooldown` seconds so a burst of
+    throttles counts as one signal. Calls are healthy while the median latency of the recent
+    window stays under target_latency (if set).
+    """
+
+    def __init__(self, initial=10, minimum=1, maximum=100, increase=1, decrease=0.5,
+                 target_latency=None, cooldown=5, window=50):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.healthy_streak = 0
+        self.last_decrease = 0.0
+
+        # counters
+        self.calls = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+
+        self._condition = None
+        self._loop = None
+
+    def _get_condition(self):
+        """asyncio primitives bind to a loop, and each build() runs its own loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+            self.in_flight = 0
+        return self._condition
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            while self.in_flight >= int(self.limit):
+                await condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency, error=None):
+        self.calls += 1
+        now = time.monotonic()
+        if error is None:
+            self.latencies.append(latency)
+            median = sorted(self.latencies)[len(self.latencies) // 2]
+            if self.target_latency is None or median <= self.target_latency:
+                self.healthy_streak += 1
+                if self.healthy_streak >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + self.increase)
+                    self.healthy_streak = 0
+            else:
+                self.healthy_streak = 0
+        else:
+            self.errors += 1
+            self.healthy_streak = 0
+            if is_throttle(error):
+                self.throttles += 1
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'limit': int(self.limit),
+            'calls': self.calls,
+            'errors': self.errors,
+            'throttles': self.throttles,
+            'retries': self.retries,
+            'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+        }
+
+
+def backoff(attempt, base=1.0, cap=60.0):
+    """Full jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,210 @@
+import mmap
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+from .dates import filing_month
+from .locks import file_lock
+
+DEFAULT_CORPUS_PATH = os.environ.get('SEC_SECTION_CORPUS') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'structured-output', 'sections'
+)
+
+ROW_FIELDS = ['entry_id', 'accession', 'cik', 'filing_date', 'period', 'document', 'item', 'source']
+
+
+class SectionCorpus:
+    """Append-only store of extracted section texts, read back by entry id through mmap.
+
+    Texts are zlib compressed one by one and appended to <path>/sections.dat. <path>/index.db maps
+    each entry id to its offset and length, plus the section metadata, so a section is read without
+    touching the rest of the file and a month or item streams back in file order with constant memory.
+
+    Months are marked extracted per item once fully parsed, so a rerun over them can skip download
+    and parsing altogether. Worker processes can share a corpus, appends go through a file lock.
+    """
+
+    def __init__(self, path=DEFAULT_CORPUS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        self.data_path = os.path.join(path, 'sections.dat')
+        self.lock_path = os.path.join(path, 'sections.lock')
+        self.file = open(self.data_path, 'ab')
+        self.reader = open(self.data_path, 'rb')
+        self.map = None
+
+        self.conn = sqlite3.connect(os.path.join(path, 'index.db'), timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS sections (
+            entry_id TEXT PRIMARY KEY,
+            accession TEXT,
+            cik TEXT,
+            filing_date TEXT,
+            period TEXT,
+            document TEXT,
+            item TEXT,
+            source TEXT,
+            month TEXT,
+            offset INTEGER,
+            length INTEGER
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS sections_month_item ON sections (month, item, offset)')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS months (
+            month TEXT,
+            item TEXT,
+            sections INTEGER,
+            extracted TEXT,
+            PRIMARY KEY (month, item)
+        )""")
+        self.conn.commit()
+
+        # a crash between appending a text and indexing it leaves unindexed bytes at the end, cut them off
+        # (under the lock, another process's append in flight looks just the same)
+        with file_lock(self.lock_path):
+            indexed_end = self.conn.execute('SELECT COALESCE(MAX(offset + length), 0) FROM sections').fetchone()[0]
+            if os.path.getsize(self.data_path) > indexed_end:
+                self.file.truncate(indexed_end)
+                self.file.seek(0, os.SEEK_END)
+
+    def _mapped(self, end):
+        """The data file mapped at least up to end, remapped after appends"""
+        if self.map is None or len(self.map) < end:
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.reader.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def add(self, rows):
+        """Append section rows from extract_sections, entry ids already stored are skipped. Returns how many were added"""
+        with self.lock, file_lock(self.lock_path):
+            # other processes append too, write from the current end of the file
+            self.file.seek(0, os.SEEK_END)
+            known = set()
+            ids = [row['entry_id'] for row in rows]
+            for i in range(0, len(ids), 900):
+                chunk = ids[i:i + 900]
+                known.update(r[0] for r in self.conn.execute(
+                    f'SELECT entry_id FROM sections WHERE entry_id IN ({", ".join("?" * len(chunk))})', chunk))
+
+            records = []
+            for row in rows:
+                if row['entry_id'] in known:
+                    continue
+                known.add(row['entry_id'])
+                data = zlib.compress(row['text'].encode('utf-8'), 6)
+                offset = self.file.tell()
+                self.file.write(data)
+                records.append((row['entry_id'], row['accession'], row['cik'], row['filing_date'], row.get('period', ''),
+                                row.get('document', ''), row['item'], row.get('source', ''), filing_month(row['filing_date']),
+                                offset, len(data)))
+            # texts hit the disk before the index points at them
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.conn.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', records)
+            self.conn.commit()
+        return len(records)
+
+    def mark_extracted(self, month, items):
+        """Every section of these items in this month is stored"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            for item in items:
+                count = self.conn.execute('SELECT COUNT(*) FROM sections WHERE month = ? AND item = ?', (month, item)).fetchone()[0]
+                self.conn.execute('INSERT OR REPLACE INTO months VALUES (?, ?, ?, ?)', (month, item, count, now))
+            self.conn.commit()
+
+    def extracted(self, month, items):
+        """True when every one of items was marked extracted for month"""
+        with self.lock:
+            done = {row[0] for row in self.conn.execute('SELECT item FROM months WHERE month = ?', (month,))}
+        return set(items) <= done
+
+    def _read(self, offset, length):
+        return zlib.decompress(self._mapped(offset + length)[offset:offset + length]).decode('utf-8')
+
+    def text(self, entry_id):
+        with self.lock:
+            row = self.conn.execute('SELECT offset, length FROM sections WHERE entry_id = ?', (entry_id,)).fetchone()
+            return None if row is None else self._read(*row)
+
+    def get(self, entry_id):
+        """The section row, the same shape extract_sections produces, or None"""
+        with self.lock:
+            row = self.conn.execute(f'SELECT {", ".join(ROW_FIELDS)}, offset, length FROM sections WHERE entry_id = ?',
+                                    (entry_id,)).fetchone()
+            if row is None:
+                return None
+            return {**dict(zip(ROW_FIELDS, row[:-2])), 'text': self._read(*row[-2:])}
+
+    def iter_rows(self, months=None, items=None, batch=1000):
+        """Stream section rows in file order, optionally only some months ('YYYY-MM') and items"""
+        conditions, params = [], []
+        for column, values in (('month', months), ('item', items)):
+            if values is not None:
+                values = [values] if isinstance(values, str) else list(values)
+                conditions.append(f'{column} IN ({", ".join("?" * len(values))})')
+                params += values
+        conditions.append('offset > ?')
+        where = ' AND '.join(conditions)
+
+        # keyset pages, so neither the index query nor the texts are ever held in full
+        last = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f'SELECT {", ".join(ROW_FIELDS)}, offset, length FROM sections WHERE {where} ORDER BY offset LIMIT ?',
+                    params + [last, batch]).fetchall()
+                texts = [self._read(*row[-2:]) for row in rows]
+            if not rows:
+                return
+            for row, text in zip(rows, texts):
+                yield {**dict(zip(ROW_FIELDS, row[:-2])), 'text': text}
+            last = rows[-1][-2]
+
+    def months(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT DISTINCT month FROM sections ORDER BY month')]
+
+    def __contains__(self, entry_id):
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM sections WHERE entry_id = ?', (entry_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM sections').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+            self.reader.close()
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.corpus                                    what is stored
+    # python -m utils.corpus --months 2020-01 --items item5.07 --out entries.csv.gz
+    import argparse
+
+    from .stream import spill_entries
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default=DEFAULT_CORPUS_PATH)
+    parser.add_argument('--months', nargs='+', default=None)
+    parser.add_argument('--items', nargs='+', default=None)
+    parser.add_argument('--out', default=None, help='spill the selected sections to an entries csv.gz')
+    args = parser.parse_args()
+
+    corpus = SectionCorpus(args.path)
+    if args.out:
+        spill_entries(corpus.iter_rows(months=args.months, items=args.items), args.out)
+        print(f"Wrote {args.out}")
+    else:
+        months = corpus.months()
+        print(f"{len(corpus)} sections over {len(months)} months ({months[0] if months else '-'} to {months[-1] if months else '-'})")
@@ -0,0 +1,128 @@
+from .checks import DIVIDEND_CHECKS, PROPOSAL_CHECKS, VOTES_PER_SHARE_CHECKS
+from .chunking import ProposalChunker
+from .prefilter import DIVIDEND_FILTER, VOTES_PER_SHARE_FILTER
+from .schemas import (
+    DividendExtraction,
+    ProposalResult,
+    ProposalResultsExtraction,
+    ShareClassVotingRights,
+    SingleDividend,
+    VotingRightsExtraction,
+)
+from .validate import DIVIDEND_ROW_CHECKS, PROPOSAL_ROW_CHECKS, VOTES_PER_SHARE_ROW_CHECKS, Validator
+
+
+class Dataset:
+    """Everything needed to build one dataset from 8-K item sections.
+
+    name: also the output directory / file stem
+    prompt, schema, model: passed to the DatasetBuilder
+    row_model: schema of one output row, drives output columns and parquet types
+    items: item sections the dataset reads, e.g. ['item5.07']
+    keep_field: output rows without a value here are dropped
+    prefilter: optional RelevanceFilter run before the LLM
+    checks: validation checks on each response, a ModelRouter escalates entries that fail them
+    row_checks: checks on each entry's output rows after normalization, see utils/validate.py
+    builder_kwargs: extra DatasetBuilder arguments (max_concurrent, timeout, batch_tokens, chunker, ...)
+    """
+
+    def __init__(self, name, prompt, schema, row_model, items, keep_field, model="gemini-2.5-flash-lite",
+                 prefilter=None, checks=(), row_checks=(), **builder_kwargs):
+        self.name = name
+        self.prompt = prompt
+        self.schema = schema
+        self.row_model = row_model
+        self.items = items
+        self.keep_field = keep_field
+        self.model = model
+        self.prefilter = prefilter
+        self.checks = checks
+        self.row_checks = row_checks
+        self.builder_kwargs = builder_kwargs
+
+    def router(self, make_pool=None):
+        """A ModelRouter over ROUTER_MODELS for this dataset's checks, None without checks.
+
+        Each call gets its own pools, so each dataset adapts its own concurrency.
+        make_pool(model, rpm, max_concurrent) builds the pools, e.g. to share one rate limiter per model.
+        """
+        from .router import ROUTER_MODELS, ModelPool, ModelRouter
+
+        if not self.checks:
+            return None
+        make_pool = make_pool or ModelPool
+        return ModelRouter([make_pool(model, rpm, max_concurrent) for model, rpm, max_concurrent in ROUTER_MODELS],
+                           long_tokens=8000, max_numbers=120)
+
+    def validator(self):
+        return Validator(self.row_model, self.row_checks)
+
+    def fieldnames(self):
+        return ['accession', 'cik', 'filing_date', 'entry_id'] + sorted(self.row_model.model_fields)
+
+    def __repr__(self):
+        return f"Dataset({self.name}, items={self.items}, model={self.model})"
+
+
+DATASETS = {}
+
+
+def register(dataset):
+    """Add a dataset to the registry, the shared driver builds every registered dataset"""
+    DATASETS[dataset.name] = dataset
+    return dataset
+
+
+PROPOSAL_RESULTS = register(Dataset(
+    name='proposal_results',
+    prompt="""Extract shareholder proposal voting results from shareholder meeting reports. For each proposal voted on, extract:
+        1. Proposal description (what was being voted on). Summarize in your own words.
+        2. Presentation order (sequential: 1st, 2nd, 3rd proposal presented)
+        3. Assigned number/letter (e.g. if the text has a defined numbering system for proposals, use it)
+        4. Vote counts: For, Against, Abstentions, Broker Non-Votes (if mentioned)
+        5. Proponent type: 'Management' (if proposed by company/board) or 'Shareholder' (if shareholder proposal)
+        6. Meeting date and type (Annual or Special meeting)
+        
+        Only extract when actual voting results with vote counts are reported. Skip general descriptions without vote tallies.""",
+    schema=ProposalResultsExtraction,
+    row_model=ProposalResult,
+    items=['item5.07'],
+    keep_field='proposal_description',
+    model="gemini-2.5-flash-lite", # without a router, with one entries that fail the checks move up to flash
+    checks=PROPOSAL_CHECKS,
+    row_checks=PROPOSAL_ROW_CHECKS,
+    max_concurrent=40,
+    timeout=60,
+    batch_tokens=4000,
+    # meetings with dozens of proposals and per-nominee tallies go out in parallel chunks of proposals
+    chunker=ProposalChunker(max_tokens=3000),
+))
+
+DIVIDENDS_PER_SHARE = register(Dataset(
+    name='dividends_per_share',
+    prompt="Extract ALL dividend information from this text.",
+    schema=DividendExtraction,
+    row_model=SingleDividend,
+    items=['item7.01', 'item8.01'],
+    keep_field='dividend_per_share',
+    prefilter=DIVIDEND_FILTER,
+    checks=DIVIDEND_CHECKS,
+    row_checks=DIVIDEND_ROW_CHECKS,
+    max_concurrent=20,
+    timeout=5,
+    batch_tokens=4000,
+))
+
+VOTES_PER_SHARE = register(Dataset(
+    name='votes_per_share',
+    prompt="Extract voting rights per share class ONLY when explicitly stated (e.g., 'Class A shares have 10 votes per share'). Do NOT infer from vote counts - only record when exact votes per share are clearly mentioned.",
+    schema=VotingRightsExtraction,
+    row_model=ShareClassVotingRights,
+    items=['item5.07'],
+    keep_field='votes_per_share',
+    prefilter=VOTES_PER_SHARE_FILTER,
+    checks=VOTES_PER_SHARE_CHECKS,
+    row_checks=VOTES_PER_SHARE_ROW_CHECKS,
+    max_concurrent=20,
+    timeout=5,
+))
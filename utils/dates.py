@@ -0,0 +1,76 @@
+import calendar
+import re
+from datetime import datetime
+
+DATE_FORMATS = ['%B %d, %Y', '%b %d, %Y', '%B %d %Y', '%m/%d/%Y', '%d %B %Y']
+
+
+def generate_monthly_date_ranges(start_date_str, end_date_str):
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+    
+    monthly_ranges = []
+    current_date = start_date
+    
+    while current_date <= end_date:
+        # Get the last day of the current month
+        last_day_of_month = calendar.monthrange(current_date.year, current_date.month)[1]
+        month_end = datetime(current_date.year, current_date.month, last_day_of_month)
+        
+        # Use the earlier of month_end or end_date
+        range_end = min(month_end, end_date)
+        
+        # Add tuple of (start_date_str, end_date_str) for this month
+        monthly_ranges.append((
+            current_date.strftime('%Y-%m-%d'),
+            range_end.strftime('%Y-%m-%d')
+        ))
+        
+        # Move to the first day of the next month
+        if current_date.month == 12:
+            current_date = datetime(current_date.year + 1, 1, 1)
+        else:
+            current_date = datetime(current_date.year, current_date.month + 1, 1)
+    
+    return monthly_ranges
+
+
+def month_is_complete(date_tuple):
+    """The current month is still filling up"""
+    return date_tuple[1] < datetime.today().strftime('%Y-%m-%d')
+
+
+def filing_month(filing_date):
+    """'YYYY-MM' of a filing date, '20200109' (as datamule writes them) and '2020-01-09' alike"""
+    match = re.match(r'(\d{4})-?(\d{2})-?\d{2}', str(filing_date).strip())
+    if match is None:
+        raise ValueError(f"not a filing date: {filing_date!r}")
+    return f'{match.group(1)}-{match.group(2)}'
+
+
+def covers_month(date_tuple):
+    """The range is a whole calendar month, not part of one"""
+    start, end = date_tuple
+    year, month = int(start[:4]), int(start[5:7])
+    return start.endswith('-01') and end == f'{start[:7]}-{calendar.monthrange(year, month)[1]:02d}'
+
+
+def parse_date(value):
+    """'May 14, 2020', '2020-05-14T00:00:00' or datamule's '20200514' -> '2020-05-14', None if it isn't a date"""
+    value = str(value).strip()
+    if re.match(r'\d{4}-\d{2}-\d{2}', value):
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            return None
+    if re.fullmatch(r'\d{8}', value):
+        try:
+            return datetime.strptime(value, '%Y%m%d').date().isoformat()
+        except ValueError:
+            return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from .stream import entry_metadata
+
+DEFAULT_DEDUP_PATH = os.environ.get('SEC_DEDUP_INDEX') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'structured-output', 'dedup.db'
+)
+
+_WORD = re.compile(r'[a-z0-9]+(?:[.,][0-9]+)*')
+
+
+def tokenize(text):
+    """Lowercased words and numbers, punctuation, markup leftovers and spacing dropped"""
+    return _WORD.findall(text.lower())
+
+
+def digest(text):
+    """Hash of the normalized text, the same for copies that only differ in markup or spacing"""
+    return hashlib.sha256(' '.join(tokenize(text)).encode('utf-8')).hexdigest()
+
+
+class DedupIndex:
+    """Persistent index of section texts, per dataset, for exact duplicate detection.
+
+    Two sections are duplicates when their normalized texts match. split() drops a duplicate of the
+    same event: same filer and the same filing (one press release under two items), or the same
+    period of report (an 8-K/A repeating its 8-K), since the data is already in the dataset. Any other
+    duplicate, e.g. a filer repeating last quarter's text or another filer's copy, reuses the structured
+    result recorded for the earlier section instead of a new extraction.
+    """
+
+    def __init__(self, path=DEFAULT_DEDUP_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shared by every script and worker process, writes are short and wait for each other
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS sections (
+            dataset TEXT,
+            entry_id TEXT,
+            item TEXT,
+            accession TEXT,
+            cik TEXT,
+            period TEXT,
+            digest TEXT,
+            results TEXT,
+            PRIMARY KEY (dataset, entry_id, item)
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS sections_digest ON sections (dataset, digest)')
+        self.conn.commit()
+
+    def match(self, dataset, entry_id, item, digest):
+        """Earliest other section with this digest, as {'entry_id', 'accession', 'cik', 'period'}, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT entry_id, accession, cik, period FROM sections WHERE dataset = ? AND digest = ? '
+                'AND NOT (entry_id = ? AND item = ?) ORDER BY rowid LIMIT 1',
+                (dataset, digest, entry_id, item)
+            ).fetchone()
+        return None if row is None else dict(zip(('entry_id', 'accession', 'cik', 'period'), row))
+
+    def add(self, dataset, row, digest, commit=True):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sections (dataset, entry_id, item, accession, cik, period, digest, results) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT results FROM sections WHERE dataset = ? AND entry_id = ? AND item = ?))',
+                (dataset, row['entry_id'], row['item'], row['accession'], row['cik'], row.get('period'), digest,
+                 dataset, row['entry_id'], row['item'])
+            )
+            if commit:
+                self.conn.commit()
+
+    @staticmethod
+    def same_event(row, original):
+        if original['cik'] != row['cik']:
+            return False
+        return original['accession'] == row['accession'] or (bool(row.get('period')) and original['period'] == row['period'])
+
+    def split(self, dataset, rows):
+        """Split section rows into (unique rows to extract, duplicates).
+
+        Unique rows are indexed right away, so duplicates within the same run are found too.
+        Each duplicate is the row's metadata plus 'original' (entry id it duplicates) and 'same_event'.
+        """
+        unique = []
+        duplicates = []
+        for row in rows:
+            text_digest = digest(row['text'])
+            original = self.match(dataset, row['entry_id'], row['item'], text_digest)
+            if original is None:
+                # committed row by row, a month's worth of rows would hold the write lock for seconds
+                self.add(dataset, row, text_digest)
+                unique.append(row)
+            else:
+                duplicates.append({
+                    'entry_id': row['entry_id'],
+                    'accession': row['accession'],
+                    'cik': row['cik'],
+                    'filing_date': row['filing_date'],
+                    'item': row['item'],
+                    'original': original['entry_id'],
+                    'same_event': self.same_event(row, original),
+                })
+
+        if duplicates:
+            same = sum(duplicate['same_event'] for duplicate in duplicates)
+            print(f"{dataset}: {len(duplicates)} duplicate sections, {same} repeating the same event dropped, "
+                  f"{len(duplicates) - same} reuse earlier results")
+        return unique, duplicates
+
+    def record(self, dataset, entry_id, results):
+        """Store the structured result of an extracted section, pass as (part of) the builder's on_result.
+
+        Best effort: if the index stays locked, later duplicates of this section are extracted
+        instead of reusing it. Returns whether the result was stored.
+        """
+        value = json.dumps(results, default=str, ensure_ascii=False)
+        with self.lock:
+            try:
+                self.conn.execute('UPDATE sections SET results = ? WHERE dataset = ? AND entry_id = ?', (value, dataset, entry_id))
+                self.conn.commit()
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                print(f"{dataset}: result of {entry_id} not recorded for dedup: {e}")
+                return False
+        return True
+
+    def results(self, dataset, entry_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT results FROM sections WHERE dataset = ? AND entry_id = ? AND results IS NOT NULL',
+                (dataset, entry_id)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def replay(self, dataset, duplicates, join):
+        """Write the earlier results of duplicates that aren't the same event under their own entry ids. Returns rows written"""
+        before = join.rows
+        missing = 0
+        for duplicate in duplicates:
+            if duplicate['same_event']:
+                continue
+            results = self.results(dataset, duplicate['original'])
+            if results is None:
+                # the original failed, or is still in flight in another worker's month. The duplicate
+                # is queued like an invalid entry, so it is extracted on its own at the end of the run
+                missing += 1
+                join.issues[duplicate['entry_id']] = [{'field': '', 'problem': 'original_without_result', 'value': duplicate['original']}]
+                continue
+            join.metadata_lookup[duplicate['entry_id']] = entry_metadata(duplicate)
+            join.on_result(duplicate['entry_id'], results)
+        if missing:
+            print(f"{dataset}: {missing} duplicates queued for re-extraction, their original has no result yet")
+        return join.rows - before
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
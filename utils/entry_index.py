@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from .dates import filing_month
+
+FIELDS = ['entry_id', 'accession', 'cik', 'filing_date', 'document', 'item', 'source', 'text_hash', 'chars', 'indexed']
+
+
+class EntryIndex:
+    """On-disk index from entry id to where the section came from.
+
+    Any output row can be traced back to its filing, document and item through its entry_id,
+    and re-extracted on its own without rebuilding the month it belongs to.
+    """
+
+    def __init__(self, path='entry_index.db'):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            entry_id TEXT PRIMARY KEY,
+            accession TEXT,
+            cik TEXT,
+            filing_date TEXT,
+            document TEXT,
+            item TEXT,
+            source TEXT,
+            text_hash TEXT,
+            chars INTEGER,
+            indexed TEXT
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS entries_accession ON entries (accession)')
+        self.conn.commit()
+
+    def add(self, rows):
+        """Index section rows from extract_sections"""
+        now = datetime.now().isoformat(timespec='seconds')
+        records = [
+            (row['entry_id'], row['accession'], row['cik'], row['filing_date'], row.get('document', ''),
+             row['item'], row.get('source', ''), hashlib.sha256(row['text'].encode('utf-8')).hexdigest(),
+             len(row['text']), now)
+            for row in rows
+        ]
+        with self.lock:
+            self.conn.executemany(f'INSERT OR REPLACE INTO entries VALUES ({", ".join("?" * len(FIELDS))})', records)
+            self.conn.commit()
+
+    def get(self, entry_id):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM entries WHERE entry_id = ?', (entry_id,)).fetchone()
+        return None if row is None else dict(zip(FIELDS, row))
+
+    def for_accession(self, accession):
+        """Every indexed section of one filing"""
+        with self.lock:
+            rows = self.conn.execute('SELECT * FROM entries WHERE accession = ? ORDER BY entry_id', (accession,)).fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def reextract(self, entry_id, download_path='reextract', cache=None):
+        """Re-read one section from its filing, from the submission cache or a new download if the local copy is gone.
+
+        Returns the section row, the same shape extract_sections produces.
+        """
+        from datamule import Portfolio
+        from datamule.submission.submission import Submission
+        from .extract import extract_submission
+        from .submission_cache import query_key
+
+        entry = self.get(entry_id)
+        if entry is None:
+            raise KeyError(f"{entry_id} is not in {self.path}")
+
+        if entry['source'] and os.path.exists(entry['source']):
+            subs = [Submission(Path(entry['source']))]
+        else:
+            path = os.path.join(download_path, entry['accession'])
+            restored = 0
+            if cache is not None:
+                restored = cache.restore(filing_month(entry['filing_date']), query_key(('8-K', '8-K/A'), ('8-K', '8-K/A')),
+                                         path, accessions=[entry['accession']])
+            portfolio = Portfolio(path)
+            if not restored:
+                portfolio.download_submissions(accession_numbers=[entry['accession']])
+            subs = list(portfolio)
+
+        for sub in subs:
+            for row in extract_submission(sub, [entry['item']], document_types=('8-K', '8-K/A'), extensions=('.htm', '.html')):
+                if row['document'] != entry['document']:
+                    continue
+                if row['entry_id'] != entry_id:
+                    # the parser changed since the entry was indexed, the text no longer hashes the same
+                    print(f"{entry_id}: section text changed, re-extracted as {row['entry_id']}")
+                return row
+        raise LookupError(f"{entry_id}: {entry['item']} not found in {entry['document']}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
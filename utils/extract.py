@@ -0,0 +1,194 @@
+import cProfile
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from tqdm import tqdm
+
+
+def submission_metadata(sub):
+    """Return (accession, filing_date, cik, period of report) from a submission's metadata"""
+    accession = sub.metadata.content['accession-number']
+    filing_date = sub.metadata.content['filing-date']
+    # the event date of an 8-K, shared by its amendments
+    period = sub.metadata.content.get('period-of-report', '')
+
+    # validation check if any item is a list - issue w/metadata in malformed sgml
+    if isinstance(accession, list):
+        accession = accession[0]
+
+    if isinstance(filing_date, list):
+        filing_date = filing_date[0]
+
+    if isinstance(period, list):
+        period = period[0]
+
+    filer = sub.metadata.content['filer']
+
+    # handles when company names change
+    if not isinstance(filer, list):
+        filer = [filer]
+
+    filer_cik = filer[0]['company-data']['cik']
+    return accession, filing_date, filer_cik, period
+
+
+def make_entry_id(accession, document, item, text):
+    """Stable id of one section: accession:document:item:text hash.
+
+    Two items of one filing, or the same item in two documents of one submission, never share an id,
+    and the same section gets the same id on every run.
+    """
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+    return f'{accession}:{document}:{item}:{digest}'
+
+
+def submission_source(sub):
+    """Where a submission was read from, for tracing a section back"""
+    path = getattr(sub, 'path', None) or getattr(sub, 'batch_tar_path', None)
+    return str(path) if path is not None else ''
+
+
+def new_stats():
+    return {'submissions': 0, 'documents': 0, 'errors': 0, 'get_section_seconds': 0.0}
+
+
+def merge_stats(total, stats):
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def extract_submission(sub, items, document_types=('8-K', '8-K/A'), extensions=('.htm', '.html'), stats=None):
+    """Pull every requested item section out of one submission.
+
+    Each document is parsed once, get_section reuses the parse for every item.
+    stats: optional dict from new_stats(), counts are added to it
+    """
+    rows = []
+    stats = stats if stats is not None else new_stats()
+    stats['submissions'] += 1
+    try:
+        accession, filing_date, filer_cik, period = submission_metadata(sub)
+        source = submission_source(sub)
+        for doc in sub.document_type(list(document_types)):
+            if doc.extension in extensions:
+                stats['documents'] += 1
+                for item in items:
+                    start = time.perf_counter()
+                    section = doc.get_section(title=item, title_class='item', format='text')
+                    stats['get_section_seconds'] += time.perf_counter() - start
+                    if len(section) != 0:
+                        rows.append({'entry_id': make_entry_id(accession, doc.filename, item, section[0]),
+                                     'accession': accession, 'cik': filer_cik, 'filing_date': filing_date,
+                                     'period': period, 'document': doc.filename, 'item': item, 'source': source,
+                                     'text': section[0]})
+    except Exception as e:
+        stats['errors'] += 1
+        print(e)
+    return rows
+
+
+def _profiled(profile, func, *args):
+    """Run func under cProfile, dumping stats into the profile directory"""
+    if not profile:
+        return func(*args)
+    os.makedirs(profile, exist_ok=True)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(os.path.join(profile, f'parse_{os.getpid()}_{time.time_ns()}.prof'))
+
+
+def _extract_paths(paths, items, document_types, extensions, profile=None):
+    """Worker: open submissions from disk and extract sections, returns (rows, stats)"""
+    from datamule.submission.submission import Submission
+
+    def run():
+        rows = []
+        stats = new_stats()
+        for path in paths:
+            try:
+                sub = Submission(Path(path))
+            except Exception as e:
+                stats['errors'] += 1
+                print(f"{path}: {e}")
+                continue
+            rows.extend(extract_submission(sub, items, document_types, extensions, stats))
+        return rows, stats
+
+    return _profiled(profile, run)
+
+
+def _record(metrics, rows, stats, seconds):
+    if metrics is None:
+        return
+    metrics.observe('extract_seconds', seconds)
+    metrics.inc('submissions_parsed', stats['submissions'])
+    metrics.inc('documents_parsed', stats['documents'])
+    metrics.inc('parse_errors', stats['errors'])
+    metrics.inc('get_section_seconds', stats['get_section_seconds'])
+    for row in rows:
+        metrics.inc('sections_found', item=row['item'])
+
+
+def extract_sections(portfolio, items, workers=None, document_types=('8-K', '8-K/A'), extensions=('.htm', '.html'),
+                     metrics=None, profile=None):
+    """Extract item sections from every submission in a portfolio, sharded across worker processes.
+
+    Returns rows of {'entry_id', 'accession', 'cik', 'filing_date', 'period', 'document', 'item', 'source', 'text'}.
+    workers=1 runs in process. Workers are spawned, so they import the calling script: its run code
+    must sit under `if __name__ == '__main__':`.
+    metrics: optional Metrics, records submissions, documents, get_section time and sections per item
+    profile: directory for cProfile dumps of the parse loop, one per worker shard.
+        Defaults to $SEC_PROFILE_PARSE, unset means no profiling.
+        Read them with python -m pstats, or attach py-spy (py-spy record --subprocesses) instead.
+    """
+    workers = workers or os.cpu_count() or 1
+    profile = profile or os.environ.get('SEC_PROFILE_PARSE')
+    start = time.perf_counter()
+
+    # workers open submissions by path, so batch tars need unpacking first
+    portfolio_path = Path(portfolio.path)
+    if any(f.is_file() and 'batch' in f.name and f.suffix == '.tar' for f in portfolio_path.iterdir()):
+        portfolio.decompress()
+
+    paths = sorted(str(f) for f in portfolio_path.iterdir() if (f.is_dir() or f.suffix == '.tar') and 'batch' not in f.name)
+
+    if workers == 1 or len(paths) < 2:
+        def run():
+            rows = []
+            stats = new_stats()
+            for sub in tqdm(portfolio):
+                rows.extend(extract_submission(sub, items, document_types, extensions, stats))
+            return rows, stats
+
+        rows, stats = _profiled(profile, run)
+        _record(metrics, rows, stats, time.perf_counter() - start)
+        return rows
+
+    # several shards per worker keeps cores busy when submission sizes are uneven
+    n_shards = min(len(paths), workers * 4)
+    shards = [paths[i::n_shards] for i in range(n_shards)]
+
+    rows = []
+    stats = new_stats()
+    # fresh interpreters, forking from a pipeline thread can deadlock on locks other threads hold
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(_extract_paths, shard, items, document_types, extensions, profile): len(shard) for shard in shards}
+        with tqdm(total=len(paths), desc="Extracting sections", unit="submissions") as pbar:
+            for future in as_completed(futures):
+                shard_rows, shard_stats = future.result()
+                rows.extend(shard_rows)
+                merge_stats(stats, shard_stats)
+                pbar.update(futures[future])
+
+    # keep output order stable regardless of which worker finished first
+    rows.sort(key=lambda row: (row['filing_date'], row['entry_id']))
+    _record(metrics, rows, stats, time.perf_counter() - start)
+    return rows
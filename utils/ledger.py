@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from .locks import file_lock
+
+
+class Ledger:
+    """Durable, append-only progress log for a backfill, one json record per line.
+
+    Records which units (e.g. months) are finished and which entries were sent to the LLM
+    within a unit. Every record is flushed and fsynced, so a killed run loses nothing it logged.
+    Responses for entries that finished before a crash live in the LLMCache, so resuming a
+    half-done unit only pays for what never came back.
+
+    Worker processes can share one ledger, each record is appended under a file lock. A process
+    only sees other processes' records after reload().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self.submitted = {}
+        self.completed = {}
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._load()
+        self.file = open(path, 'a', encoding='utf-8')
+
+        # start on a fresh line after a torn write
+        with file_lock(path + '.lock'):
+            if os.path.getsize(path) > 0:
+                with open(path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        self.file.write('\n')
+                        self.file.flush()
+
+    def _load(self):
+        """Replay the log"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn last line from a crash mid-write
+                    continue
+                self._apply(record)
+
+    def _apply(self, record):
+        unit = record['unit']
+        event = record['event']
+        if event == 'submitted':
+            self.submitted.setdefault(unit, set()).update(record['entries'])
+        elif event == 'completed':
+            self.completed.setdefault(unit, set()).update(record['entries'])
+        elif event == 'done':
+            self.done[unit] = record
+        elif event == 'reset':
+            self.done.pop(unit, None)
+            self.submitted.pop(unit, None)
+            self.completed.pop(unit, None)
+
+    def _write(self, unit, event, **fields):
+        record = {'unit': unit, 'event': event, 'time': datetime.now().isoformat(timespec='seconds'), **fields}
+        with self.lock, file_lock(self.path + '.lock'):
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self._apply(record)
+
+    def reload(self):
+        with self.lock:
+            self.done, self.submitted, self.completed = {}, {}, {}
+            self._load()
+
+    def is_done(self, unit):
+        return unit in self.done
+
+    def pending(self, units, key=lambda unit: unit):
+        """Units not yet finished, in order"""
+        return [unit for unit in units if not self.is_done(key(unit))]
+
+    def missing(self, unit):
+        """Entries sent to the LLM within a unit that never completed"""
+        return self.submitted.get(unit, set()) - self.completed.get(unit, set())
+
+    def mark_submitted(self, unit, entries):
+        self._write(unit, 'submitted', entries=sorted(set(entries)))
+
+    def mark_completed(self, unit, entries):
+        self._write(unit, 'completed', entries=sorted(set(entries)))
+
+    def mark_done(self, unit, **fields):
+        self._write(unit, 'done', **fields)
+
+    def reset(self, unit):
+        """Force a unit to be processed again"""
+        self._write(unit, 'reset')
+
+    def close(self):
+        self.file.close()
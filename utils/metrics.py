@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def dir_bytes(path):
+    """Total size of the files under path, e.g. what a download put on disk"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentile(samples, q):
+    """Nearest rank percentile of sorted samples, q in [0, 100]"""
+    if not samples:
+        return None
+    rank = max(math.ceil(q / 100 * len(samples)) - 1, 0)
+    return samples[rank]
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _label_str(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """Counters, timings and latency samples for one run.
+
+    run_log: json-lines file, every event() and the final summary are appended to it
+    prom_path: optional Prometheus textfile (node_exporter textfile collector), rewritten on flush()
+    prefix: metric name prefix in the textfile
+
+    Thread safe. Names take optional labels, e.g. inc('sections_found', 12, item='item5.07').
+    """
+
+    QUANTILES = (50, 90, 99)
+
+    def __init__(self, run_log=None, prom_path=None, prefix='sec'):
+        self.run_log = run_log
+        self.prom_path = prom_path
+        self.prefix = prefix
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.counters = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+
+        self.file = None
+        if run_log is not None:
+            if os.path.dirname(run_log):
+                os.makedirs(os.path.dirname(run_log), exist_ok=True)
+            self.file = open(run_log, 'a', encoding='utf-8')
+        self.event('start')
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.samples.setdefault(_key(name, labels), []).append(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time a block into the <name>_seconds samples"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f'{name}_seconds', time.perf_counter() - start, **labels)
+
+    def event(self, event, **fields):
+        """Append one record to the run log"""
+        if self.file is None:
+            return
+        record = {'run': self.run_id, 'time': datetime.now().isoformat(timespec='seconds'), 'event': event, **fields}
+        line = json.dumps(record, default=str) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def summary(self):
+        """Counters as is, samples as count/sum/percentiles/max"""
+        with self.lock:
+            counters = dict(self.counters)
+            samples = {key: sorted(values) for key, values in self.samples.items()}
+
+        def name(key):
+            return key[0] + ''.join(f'[{k}={v}]' for k, v in key[1])
+
+        result = {'seconds': round(time.time() - self.started, 3), 'counters': {}, 'timings': {}}
+        for key, value in sorted(counters.items()):
+            result['counters'][name(key)] = round(value, 6) if isinstance(value, float) else value
+        for key, values in sorted(samples.items()):
+            stats = {'count': len(values), 'sum': round(sum(values), 6), 'max': round(values[-1], 6)}
+            for q in self.QUANTILES:
+                stats[f'p{q}'] = round(percentile(values, q), 6)
+            result['timings'][name(key)] = stats
+        return result
+
+    def write_prometheus(self, path=None):
+        """Write the textfile atomically, counters as counters and samples as summaries"""
+        path = path or self.prom_path
+        if path is None:
+            return
+        with self.lock:
+            counters = dict(self.counters)
+            samples = {key: sorted(values) for key, values in self.samples.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_label_str(labels)} {value}')
+        for (name, labels), values in sorted(samples.items()):
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} summary')
+                typed.add(metric)
+            for q in self.QUANTILES:
+                lines.append(f'{metric}{_label_str(labels, [("quantile", q / 100)])} {percentile(values, q)}')
+            lines.append(f'{metric}_sum{_label_str(labels)} {sum(values)}')
+            lines.append(f'{metric}_count{_label_str(labels)} {len(values)}')
+        lines.append(f'{self.prefix}_run_seconds {time.time() - self.started}')
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        self.write_prometheus()
+
+    def close(self):
+        """Log the summary, write the textfile, and print the headline numbers"""
+        summary = self.summary()
+        self.event('summary', **summary)
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        print(f"Run {self.run_id}: {summary['seconds']:.0f}s")
+        for name, stats in summary['timings'].items():
+            print(f"- {name}: n={stats['count']} total={stats['sum']:.1f} p50={stats['p50']:.3f} p99={stats['p99']:.3f}")
+        for name, value in summary['counters'].items():
+            print(f"- {name}: {value}")
+        return summary
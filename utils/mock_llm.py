@@ -0,0 +1,188 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMServer:
+    """Local stand-in for the Gemini generateContent endpoint, for offline throughput testing.
+
+    latency: mean seconds per response (uniform +/- jitter)
+    error_rate: fraction of requests answered with a 500
+    rpm / max_concurrent: quota, requests over it get a 429 RESOURCE_EXHAUSTED
+    response: json the model "returns", must validate against the schema being tested.
+        Batched requests ("=== ENTRY n ===" sections) get one copy per entry, keyed by entry_id,
+        unless the response carries its own 'results'
+    seed: makes latency and errors a function of the request and how often it was sent,
+        so runs are repeatable whatever order concurrent requests arrive in
+    """
+
+    def __init__(self, latency=0.5, jitter=0.25, error_rate=0.0, rpm=None, max_concurrent=None,
+                 response=None, host='127.0.0.1', port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.max_concurrent = max_concurrent
+        self.response = response if response is not None else {'info_found': False, 'data': []}
+        self.seed = seed
+        self.attempts = {}
+
+        self.lock = threading.Lock()
+        self.request_times = deque()
+        self.in_flight = 0
+        self.counts = {'ok': 0, 'throttled': 0, 'errors': 0}
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _admit(self):
+        """Quota check, returns False if the request should be throttled"""
+        now = time.time()
+        with self.lock:
+            while self.request_times and now - self.request_times[0] >= 60:
+                self.request_times.popleft()
+            if self.rpm is not None and len(self.request_times) >= self.rpm:
+                return False
+            if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+                return False
+            self.request_times.append(now)
+            self.in_flight += 1
+            return True
+
+    def _rng(self, body):
+        """Random source for one request"""
+        if self.seed is None:
+            return random
+        key = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            attempt = self.attempts.get(key, 0)
+            self.attempts[key] = attempt + 1
+        return random.Random(f'{self.seed}:{key}:{attempt}')
+
+    def _answer(self, body):
+        """Response json for a request, one result per entry for batched requests"""
+        entries = re.findall(r'=== ENTRY (\d+) ===', body.decode('utf-8', errors='replace'))
+        # a response with its own batch results is sent as is
+        if not entries or 'results' in self.response:
+            return self.response
+        return {'results': [{'entry_id': n, **self.response} for n in entries]}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                rng = mock._rng(body)
+
+                if not mock._admit():
+                    with mock.lock:
+                        mock.counts['throttled'] += 1
+                    self._send(429, {'error': {'code': 429, 'message': 'Resource has been exhausted', 'status': 'RESOURCE_EXHAUSTED'}})
+                    return
+
+                try:
+                    time.sleep(max(0.0, mock.latency + rng.uniform(-mock.jitter, mock.jitter)))
+                    if rng.random() < mock.error_rate:
+                        with mock.lock:
+                            mock.counts['errors'] += 1
+                        self._send(500, {'error': {'code': 500, 'message': 'Internal error', 'status': 'INTERNAL'}})
+                        return
+
+                    text = json.dumps(mock._answer(body))
+                    with mock.lock:
+                        mock.counts['ok'] += 1
+                    self._send(200, {
+                        'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP', 'index': 0}],
+                        'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': len(text) // 4},
+                    })
+                finally:
+                    with mock.lock:
+                        mock.in_flight -= 1
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == '__main__':
+    # offline throughput test of the adaptive controller against a quota limited mock
+    # python -m utils.mock_llm --entries 2000 --rpm 1200 --max-concurrent 30
+    import os
+    from pydantic import BaseModel
+    from typing import List, Optional
+
+    from .builder import DatasetBuilder
+    from .controller import AdaptiveController
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--rpm', type=int, default=None)
+    parser.add_argument('--max-concurrent', type=int, default=30)
+    parser.add_argument('--ceiling', type=int, default=100)
+    parser.add_argument('--fixed', action='store_true', help='no controller, fixed max_concurrent=ceiling')
+    args = parser.parse_args()
+
+    class Row(BaseModel):
+        value: Optional[str] = None
+
+    class Extraction(BaseModel):
+        info_found: bool
+        data: List[Row] = []
+
+    os.environ.setdefault('GEMINI_API_KEY', 'mock')
+    with MockLLMServer(latency=args.latency, error_rate=args.error_rate, rpm=args.rpm, max_concurrent=args.max_concurrent) as server:
+        builder = DatasetBuilder(
+            prompt='mock',
+            schema=Extraction,
+            model='mock-model',
+            entries=[(str(i), f'text {i}') for i in range(args.entries)],
+            rpm=100000,
+            max_concurrent=args.ceiling,
+            timeout=30,
+            controller=None if args.fixed else AdaptiveController(initial=5, maximum=args.ceiling, cooldown=args.latency * 2),
+            base_url=server.url,
+        )
+        start = time.time()
+        builder.build()
+        elapsed = time.time() - start
+        done = sum(1 for entry in builder.entries if builder._get_entry_state(entry) == 'success')
+        print(f"{done}/{args.entries} entries in {elapsed:.1f}s ({done / elapsed:.1f}/s), server: {server.counts}")
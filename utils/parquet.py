@@ -0,0 +1,145 @@
+import csv
+import gzip
+import typing
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# columns every dataset carries in front of the schema fields
+METADATA_FIELDS = [
+    ('accession', pa.string()),
+    ('cik', pa.string()),  # string keeps it joinable with the csv outputs
+    ('filing_date', pa.date32()),
+    ('entry_id', pa.string()),  # section the row was extracted from, see utils/entry_index.py
+]
+
+PYTHON_TO_ARROW = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp('s'),
+    date: pa.date32(),
+}
+
+
+def _arrow_type(annotation):
+    """Optional[X] -> X, Literal[...] -> its value type"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _arrow_type(args[0])
+    if origin is typing.Literal:
+        return PYTHON_TO_ARROW[type(typing.get_args(annotation)[0])]
+    return PYTHON_TO_ARROW.get(annotation, pa.string())
+
+
+def arrow_schema(model):
+    """Arrow schema for a pydantic row model (e.g. ProposalResult) plus the metadata columns"""
+    fields = [pa.field(name, type) for name, type in METADATA_FIELDS]
+    seen = {name for name, _ in METADATA_FIELDS}
+    for name, field in model.model_fields.items():
+        if name not in seen:
+            fields.append(pa.field(name, _arrow_type(field.annotation)))
+    return pa.schema(fields)
+
+
+def _parse_date(value):
+    """'2020-01-09' or datamule's '20200109' -> date, ValueError otherwise"""
+    value = value.strip()
+    if len(value) >= 8 and value[:8].isdigit():
+        return datetime.strptime(value[:8], '%Y%m%d').date()
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def _coerce(value, type):
+    """Typed value from whatever the builder or the csv gave us, None if it can't be read"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    try:
+        if pa.types.is_integer(type):
+            return int(float(str(value).replace(',', '')))
+        if pa.types.is_floating(type):
+            return float(str(value).replace(',', '').replace('$', ''))
+        if pa.types.is_boolean(type):
+            return value if isinstance(value, bool) else str(value).lower() in ('true', '1', 'yes')
+        if pa.types.is_timestamp(type):
+            return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+        if pa.types.is_date(type):
+            if isinstance(value, datetime):
+                return value.date()
+            return value if isinstance(value, date) else _parse_date(str(value))
+    except (ValueError, TypeError):
+        return None
+    return str(value)
+
+
+def to_table(rows, model):
+    schema = arrow_schema(model)
+    columns = {field.name: [_coerce(row.get(field.name), field.type) for row in rows] for field in schema}
+    table = pa.table(columns, schema=schema)
+
+    # sorted files give tight min/max statistics, so cik and date filters skip row groups
+    table = table.sort_by([('cik', 'ascending'), ('filing_date', 'ascending')])
+    years = pa.array([d.year if d is not None else None for d in table.column('filing_date').to_pylist()], pa.int32())
+    return table.append_column('filing_year', years)
+
+
+def write_parquet(rows, model, root, basename):
+    """Write rows to root/filing_year=YYYY/<basename>-0.parquet.
+
+    Re-writing the same basename (e.g. a re-run month) replaces its files.
+    """
+    if not rows:
+        return
+    table = to_table(rows, model)
+    ds.write_dataset(
+        table,
+        root,
+        format='parquet',
+        partitioning=['filing_year'],
+        partitioning_flavor='hive',
+        basename_template=f'{basename}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+
+def csv_to_parquet(path, model, root, basename=None):
+    """Convert one of the csv outputs (plain or gzipped)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as infile:
+        rows = list(csv.DictReader(infile))
+    write_parquet(rows, model, root, basename or 'part')
+
+
+def read_parquet(root, cik=None, start=None, end=None, columns=None):
+    """Load a partitioned dataset, filters are pushed down to partitions and row groups.
+
+    cik: one cik or a list
+    start, end: inclusive filing date bounds, 'YYYY-MM-DD'
+    """
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if cik is not None:
+        ciks = [cik] if isinstance(cik, (str, int)) else cik
+        add(ds.field('cik').isin([str(c) for c in ciks]))
+    if start is not None:
+        start = _parse_date(start)
+        add(ds.field('filing_year') >= start.year)
+        add(ds.field('filing_date') >= pa.scalar(start, pa.date32()))
+    if end is not None:
+        end = _parse_date(end)
+        add(ds.field('filing_year') <= end.year)
+        add(ds.field('filing_date') <= pa.scalar(end, pa.date32()))
+
+    return dataset.to_table(columns=columns, filter=expression)
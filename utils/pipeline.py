@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+import traceback
+
+_DONE = object()
+
+
+class Pipeline:
+    """Runs a chain of stages concurrently, one thread per stage, with bounded queues in between.
+
+    Each stage is a function taking the previous stage's output. Returning None drops the item.
+    With maxsize=1, stage N works on item k while stage N+1 works on item k-1, and at most one
+    finished item waits between any two stages, which caps disk and memory use.
+
+    metrics: optional Metrics, each stage call is timed, and so is the time a stage sat waiting
+    for input, which shows where the bottleneck is.
+    """
+
+    def __init__(self, stages, maxsize=1, metrics=None):
+        self.stages = stages
+        self.maxsize = maxsize
+        self.metrics = metrics
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in range(len(stages) + 1)]
+        self.errors = []
+        self.stop = threading.Event()
+
+    def _put(self, q, item):
+        """Put that gives up if the pipeline is stopping, so no thread blocks forever"""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, stage, in_q, out_q):
+        name = getattr(stage, '__name__', str(stage))
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = self._get(in_q)
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                result = stage(item)
+                if self.metrics is not None:
+                    seconds = time.perf_counter() - start
+                    self.metrics.observe('stage_wait_seconds', start - waited, stage=name)
+                    self.metrics.observe('stage_seconds', seconds, stage=name)
+                    self.metrics.event('stage', stage=name, seconds=round(seconds, 3), waited=round(start - waited, 3))
+                if result is not None:
+                    if not self._put(out_q, result):
+                        break
+        except Exception as e:
+            self.errors.append((name, e, traceback.format_exc()))
+            self.stop.set()
+        finally:
+            self._put(out_q, _DONE)
+
+    def run(self, items):
+        """Feed items through all stages, return the final stage's outputs"""
+        threads = []
+        for i, stage in enumerate(self.stages):
+            thread = threading.Thread(target=self._run_stage, args=(stage, self.queues[i], self.queues[i + 1]), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        # collect from the last queue in a separate thread so feeding never deadlocks
+        outputs = []
+
+        def collect():
+            while True:
+                item = self._get(self.queues[-1])
+                if item is _DONE:
+                    break
+                outputs.append(item)
+
+        collector = threading.Thread(target=collect, daemon=True)
+        collector.start()
+
+        for item in items:
+            if not self._put(self.queues[0], item):
+                break
+        self._put(self.queues[0], _DONE)
+
+        for thread in threads:
+            thread.join()
+        collector.join()
+
+        if self.errors:
+            name, e, tb = self.errors[0]
+            print(tb)
+            raise RuntimeError(f"Pipeline stage {name} failed: {e}")
+        return outputs
@@ -0,0 +1,169 @@
+import csv
+import hashlib
+import os
+import re
+
+
+class RelevanceFilter:
+    """Cheap local scoring of sections before they are sent to the LLM.
+
+    required: regexes, at least one must match or the section scores 0
+    patterns: {regex: weight}, each matching pattern adds its weight once
+    threshold: minimum score to keep a section
+    classifier: optional callable text -> probability (or object with predict_proba),
+        applied after the rules to sections that passed them
+    audit_rate: fraction of dropped sections sent to the LLM anyway. The sample is fixed per section
+        (accession and item), so reruns hit the response cache, and evaluate() estimates recall from it
+    """
+
+    def __init__(self, name, required, patterns=None, threshold=1.0, classifier=None, classifier_threshold=0.5,
+                 audit_rate=0.0):
+        self.name = name
+        self.required = [re.compile(p, re.IGNORECASE) for p in required]
+        self.patterns = [(re.compile(p, re.IGNORECASE), weight) for p, weight in (patterns or {}).items()]
+        self.threshold = threshold
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self.audit_rate = audit_rate
+
+    def score(self, text):
+        if not any(p.search(text) for p in self.required):
+            return 0.0
+        return 1.0 + sum(weight for p, weight in self.patterns if p.search(text))
+
+    def _classifier_probability(self, text):
+        if hasattr(self.classifier, 'predict_proba'):
+            return self.classifier.predict_proba([text])[0][1]
+        return self.classifier(text)
+
+    def keep(self, text):
+        if self.score(text) < self.threshold:
+            return False
+        if self.classifier is not None:
+            return self._classifier_probability(text) >= self.classifier_threshold
+        return True
+
+    def audited(self, row):
+        """A dropped section in the audit sample"""
+        digest = hashlib.blake2b(f"{self.name}:{row['accession']}:{row['item']}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') / 2**64 < self.audit_rate
+
+    def filter(self, rows, dropped_path=None):
+        """Rows to send to the LLM: the kept ones plus the audit sample of dropped ones.
+
+        Every dropped section is optionally logged to csv by id, with its score and whether it went
+        to the audit. Texts are left out, the log is appended to on every run.
+        """
+        kept = []
+        dropped = []
+        for row in rows:
+            if self.keep(row['text']):
+                kept.append(row)
+            else:
+                audited = self.audited(row)
+                dropped.append((row, audited))
+                if audited:
+                    kept.append(row)
+
+        if dropped_path is not None:
+            new_file = not os.path.exists(dropped_path)
+            with open(dropped_path, 'a', newline='', encoding='utf-8') as csvfile:
+                fieldnames = ['filter', 'entry_id', 'accession', 'item', 'score', 'audited']
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+                if new_file:
+                    writer.writeheader()
+                for row, audited in dropped:
+                    writer.writerow({**row, 'filter': self.name, 'score': self.score(row['text']), 'audited': int(audited)})
+
+        audits = sum(audited for _, audited in dropped)
+        print(f"Prefilter {self.name}: kept {len(kept) - audits}, dropped {len(dropped)} of {len(rows)} sections, "
+              f"{audits} dropped sent anyway to audit recall")
+        return kept
+
+    def evaluate(self, rows, cache, model, prompt, schema, field=None):
+        """Precision/recall of keep() against LLM labels already in the cache.
+
+        A section is labelled relevant if its cached response has rows (with a non empty field, if given).
+        Dropped sections only reach the LLM through the audit sample, so recall is estimated from it:
+        the audit's share of relevant sections, scaled up to every dropped section. Sections without
+        a cached response are skipped.
+        """
+        tp = fp = fn = tn = 0
+        kept_total = dropped_total = 0
+        for row in rows:
+            kept = self.keep(row['text'])
+            if kept:
+                kept_total += 1
+            else:
+                dropped_total += 1
+                # a dropped section labelled outside the audit (e.g. before the filter existed) would bias the estimate
+                if not self.audited(row):
+                    continue
+            cached = cache.get(model, prompt, schema, row['text'], count=False)
+            if cached is None:
+                continue
+            results = cached[0]
+            if field is not None:
+                results = [r for r in results if r.get(field) not in (None, '')]
+            relevant = len(results) > 0
+            if kept and relevant:
+                tp += 1
+            elif kept:
+                fp += 1
+            elif relevant:
+                fn += 1
+            else:
+                tn += 1
+
+        # labelled counts scaled up to every kept and every dropped section
+        audited = fn + tn
+        relevant_kept = tp / (tp + fp) * kept_total if tp + fp else 0.0
+        relevant_dropped = fn / audited * dropped_total if audited else None
+        recall = None
+        if relevant_dropped is not None and relevant_kept + relevant_dropped > 0:
+            recall = relevant_kept / (relevant_kept + relevant_dropped)
+
+        report = {
+            'filter': self.name,
+            'labelled': tp + fp + fn + tn,
+            'audited': audited,
+            'precision': tp / (tp + fp) if tp + fp else None,
+            'recall': recall,
+            'drop_rate': dropped_total / len(rows) if rows else None,
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        }
+        print(report)
+        return report
+
+
+# a dollar or cents amount, e.g. $0.25, 25 cents, $.125
+AMOUNT = r'(\$\s?\d*\.\d+|\$\s?\d+|\d+(\.\d+)?\s+cents)'
+
+DIVIDEND_FILTER = RelevanceFilter(
+    name='dividends',
+    required=[r'dividend', r'distribution'],
+    patterns={
+        AMOUNT + r'\s+(per|a|for each)\s+(common\s+)?share': 2.0,
+        r'(declare[sd]?|declaration)': 1.0,
+        r'(payable|payment date|paid)': 1.0,
+        r'record\s+date|(holders|shareholders|stockholders) of record': 1.0,
+    },
+    threshold=2.0,
+    audit_rate=0.02,
+)
+
+VOTES_PER_SHARE_FILTER = RelevanceFilter(
+    name='votes_per_share',
+    required=[
+        r'votes?\s+(per|for\s+each|on\s+each)\s+share',
+        r'(one|two|three|four|five|ten|twenty|\d+(\.\d+)?)\s+votes?\s+(each|per)',
+        r'(entitled|carr(y|ies|ying))\s+to\s+(one|\w+|\d+)\s+votes?',
+        r'no\s+voting\s+rights|non-?voting',
+    ],
+    patterns={
+        r'class\s+[a-z]\b': 1.0,
+        r'(common|preferred)\s+stock': 1.0,
+    },
+    threshold=1.0,
+    audit_rate=0.02,
+)
@@ -0,0 +1,250 @@
+import csv
+import gzip
+import os
+import sqlite3
+import threading
+import typing
+from datetime import date, datetime
+
+from .datasets import DATASETS
+from .dates import parse_date
+
+PYTHON_TO_SQL = {
+    int: 'INTEGER',
+    float: 'REAL',
+    bool: 'INTEGER',
+    str: 'TEXT',
+    datetime: 'TEXT',  # iso strings sort and compare like dates
+    date: 'TEXT',
+}
+
+# columns every dataset carries in front of the schema fields, plus the shard a row came from
+METADATA_COLUMNS = [('accession', 'TEXT'), ('cik', 'TEXT'), ('filing_date', 'TEXT'), ('entry_id', 'TEXT'), ('shard', 'TEXT')]
+
+# computed columns per dataset, as sql expressions over the schema fields
+COMPUTED = {
+    'proposal_results': {
+        # share of votes cast for, abstentions and broker non-votes left out
+        'support_ratio': 'CASE WHEN coalesce(votes_for, 0) + coalesce(votes_against, 0) > 0 '
+                         'THEN 1.0 * coalesce(votes_for, 0) / (coalesce(votes_for, 0) + coalesce(votes_against, 0)) END',
+        # the same with abstentions counted as votes cast, how some bylaws count it
+        'support_ratio_with_abstentions': 'CASE WHEN coalesce(votes_for, 0) + coalesce(votes_against, 0) + coalesce(abstentions, 0) > 0 '
+                                          'THEN 1.0 * coalesce(votes_for, 0) / (coalesce(votes_for, 0) + coalesce(votes_against, 0) + coalesce(abstentions, 0)) END',
+    },
+}
+
+# indexed columns per dataset, cik and filing_date are indexed for every dataset
+INDEXES = {
+    'proposal_results': ['meeting_date', 'proponent_type', 'support_ratio'],
+    'dividends_per_share': ['payment_date', 'record_date'],
+    'votes_per_share': ['share_class'],
+}
+
+
+def _sql_type(annotation):
+    """Optional[X] -> X, Literal[...] -> its value type"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _sql_type(args[0])
+    if origin is typing.Literal:
+        return PYTHON_TO_SQL[type(typing.get_args(annotation)[0])]
+    return PYTHON_TO_SQL.get(annotation, 'TEXT')
+
+
+def _iso_date(value):
+    """Dates as iso strings, unreadable dates are kept as they are"""
+    return parse_date(value) or value
+
+
+def _coerce(value, sql_type, is_date=False):
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value == '':
+        return None
+    try:
+        if sql_type == 'INTEGER':
+            if value.lower() in ('true', 'false'):
+                return int(value.lower() == 'true')
+            return int(float(value.replace(',', '')))
+        if sql_type == 'REAL':
+            return float(value.replace(',', '').replace('$', ''))
+    except ValueError:
+        return None
+    return _iso_date(value) if is_date else value
+
+
+class QueryIndex:
+    """Embedded SQLite copy of the datasets, indexed for point and range lookups.
+
+    One table per dataset, named after it, with the metadata columns, the schema fields (typed),
+    and the computed columns in COMPUTED. cik and filing_date are indexed everywhere, INDEXES adds more.
+    Dates are stored as iso strings, so ranges are plain string comparisons.
+    """
+
+    def __init__(self, path='sec_datasets.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS _shards (
+            dataset TEXT,
+            shard TEXT,
+            written TEXT,
+            rows INTEGER,
+            PRIMARY KEY (dataset, shard)
+        )""")
+        self.conn.commit()
+
+    def _columns(self, dataset):
+        """[(name, sql type, is_date)] for the stored (not computed) columns"""
+        columns = [(name, sql_type, name == 'filing_date') for name, sql_type in METADATA_COLUMNS]
+        for name, field in DATASETS[dataset].row_model.model_fields.items():
+            annotation = field.annotation
+            sql_type = _sql_type(annotation)
+            is_date = name.endswith('_date') or date in typing.get_args(annotation) or datetime in typing.get_args(annotation)
+            columns.append((name, sql_type, is_date))
+        return columns
+
+    def _create(self, dataset):
+        columns = [f'{name} {sql_type}' for name, sql_type, _ in self._columns(dataset)]
+        columns += [f'{name} REAL GENERATED ALWAYS AS ({expression}) VIRTUAL' for name, expression in COMPUTED.get(dataset, {}).items()]
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {dataset} ({", ".join(columns)})')
+        for column in ['cik', 'filing_date', 'shard'] + INDEXES.get(dataset, []):
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS {dataset}_{column} ON {dataset} ({column})')
+        # the common lookup, one company over a date range
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {dataset}_cik_filing_date ON {dataset} (cik, filing_date)')
+
+    def _insert(self, dataset, rows, shard):
+        columns = self._columns(dataset)
+        placeholders = ', '.join('?' * len(columns))
+        names = ', '.join(name for name, _, _ in columns)
+        records = (
+            tuple(shard if name == 'shard' else _coerce(row.get(name), sql_type, is_date) for name, sql_type, is_date in columns)
+            for row in rows
+        )
+        cursor = self.conn.executemany(f'INSERT INTO {dataset} ({names}) VALUES ({placeholders})', records)
+        return cursor.rowcount
+
+    def load_store(self, dataset, store):
+        """Sync a dataset from its ShardedStore, only shards written since the last load are (re)loaded"""
+        loaded = 0
+        with self.lock:
+            self._create(dataset)
+            known = {row['shard']: (row['written'], row['rows']) for row in self.conn.execute('SELECT shard, written, rows FROM _shards WHERE dataset = ?', (dataset,))}
+            for key in store.keys():
+                written = store.manifest['shards'][key]['written']
+                if known.get(key) == (written, store.manifest['shards'][key]['rows']):
+                    continue
+                self.conn.execute(f'DELETE FROM {dataset} WHERE shard = ?', (key,))
+                rows = self._insert(dataset, store.iter_rows([key]), key)
+                self.conn.execute('INSERT OR REPLACE INTO _shards VALUES (?, ?, ?, ?)', (dataset, key, written, rows))
+                loaded += 1
+            self.conn.commit()
+        print(f"Query index {self.path}: {dataset} loaded {loaded} changed shards")
+        return loaded
+
+    def load_csv(self, dataset, path):
+        """Replace a dataset with the contents of one of the csv outputs (plain or gzipped)"""
+        opener = gzip.open if path.endswith('.gz') else open
+        with self.lock:
+            self._create(dataset)
+            self.conn.execute(f'DELETE FROM {dataset}')
+            self.conn.execute('DELETE FROM _shards WHERE dataset = ?', (dataset,))
+            with opener(path, 'rt', newline='', encoding='utf-8') as infile:
+                rows = self._insert(dataset, csv.DictReader(infile), os.path.basename(path))
+            self.conn.commit()
+        print(f"Query index {self.path}: {dataset} loaded {rows} rows from {path}")
+        return rows
+
+    def sql(self, sql, params=()):
+        """Any read query, rows as dicts"""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def query(self, dataset, cik=None, start=None, end=None, where=None, params=(), columns=None, order_by='filing_date', limit=None):
+        """Rows of one dataset.
+
+        cik: one cik or a list
+        start, end: inclusive filing date bounds, 'YYYY-MM-DD'
+        where, params: extra sql condition, e.g. where='support_ratio > ?', params=(0.5,)
+        """
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown dataset {dataset}, expected one of {list(DATASETS)}")
+        conditions = []
+        values = []
+        if cik is not None:
+            ciks = [cik] if isinstance(cik, (str, int)) else cik
+            conditions.append(f'cik IN ({", ".join("?" * len(ciks))})')
+            values += [str(c) for c in ciks]
+        if start is not None:
+            conditions.append('filing_date >= ?')
+            values.append(_iso_date(start))
+        if end is not None:
+            conditions.append('filing_date <= ?')
+            values.append(_iso_date(end))
+        if where:
+            conditions.append(f'({where})')
+            values += list(params)
+
+        sql = f'SELECT {", ".join(columns) if columns else "*"} FROM {dataset}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if order_by:
+            sql += f' ORDER BY {order_by}'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return self.sql(sql, values)
+
+    def proposals(self, cik=None, start=None, end=None, proponent_type=None, min_support=None, max_support=None,
+                  meeting_start=None, meeting_end=None, limit=None):
+        """Proposal votes, e.g. proposals(proponent_type='Shareholder', min_support=0.5)"""
+        conditions = []
+        params = []
+        for condition, value in [('proponent_type = ?', proponent_type), ('support_ratio >= ?', min_support),
+                                 ('support_ratio <= ?', max_support), ('meeting_date >= ?', meeting_start),
+                                 ('meeting_date <= ?', meeting_end)]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return self.query('proposal_results', cik=cik, start=start, end=end, where=' AND '.join(conditions) or None,
+                          params=params, order_by='filing_date, presentation_order', limit=limit)
+
+    def dividends(self, cik=None, start=None, end=None, limit=None):
+        return self.query('dividends_per_share', cik=cik, start=start, end=end, limit=limit)
+
+    def votes_per_share(self, cik=None, start=None, end=None, share_class=None, limit=None):
+        return self.query('votes_per_share', cik=cik, start=start, end=end,
+                          where='share_class = ?' if share_class else None, params=(share_class,) if share_class else (), limit=limit)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.query --db sec_datasets.db --load proposal_results proposal_results.csv.gz
+    # python -m utils.query --db sec_datasets.db --sql "SELECT * FROM proposal_results WHERE cik = '320193'"
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='sec_datasets.db')
+    parser.add_argument('--load', nargs=2, action='append', default=[], metavar=('DATASET', 'CSV'))
+    parser.add_argument('--sql', default=None)
+    args = parser.parse_args()
+
+    index = QueryIndex(args.db)
+    for dataset, path in args.load:
+        index.load_csv(dataset, path)
+    if args.sql:
+        start = time.perf_counter()
+        rows = index.sql(args.sql)
+        for row in rows:
+            print(json.dumps(row, default=str))
+        print(f"{len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f}ms")
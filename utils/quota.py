@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_QUOTA_PATH = os.environ.get('SEC_QUOTA_DB') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'structured-output', 'quota.db'
+)
+
+
+def _connect(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # every process on the machine writes here, wait for the lock rather than fail
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+class SharedRateLimiter:
+    """Requests per minute shared by every process using the same bucket name, a token bucket in SQLite.
+
+    Drop-in for RateLimiter (async acquire()), so ModelPools in several worker processes draw on
+    one global quota per model. The bucket refills at rpm/60 tokens a second and holds at most
+    burst tokens (a tenth of a minute by default), so the workers together never go much over rpm.
+    """
+
+    def __init__(self, name, rpm, path=DEFAULT_QUOTA_PATH, burst=None):
+        self.name = name
+        self.rpm = rpm
+        self.path = path
+        self.burst = burst or max(1, rpm // 10)
+        self.lock = threading.Lock()
+        self.conn = _connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        self.conn.execute('INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)', (name, self.burst, time.time()))
+
+    def take(self):
+        """Take a token if there is one. Returns 0, or the seconds until the next token"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                tokens, updated = self.conn.execute('SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)).fetchone()
+                now = time.time()
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rpm / 60)
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) * 60 / self.rpm
+                self.conn.execute('UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?', (tokens, now, self.name))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return wait
+
+    async def acquire(self):
+        while True:
+            # the sqlite lock can be held by another process, keep the event loop free meanwhile
+            wait = await asyncio.to_thread(self.take)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class WorkQueue:
+    """Units of work (e.g. months) claimed one at a time by worker processes, in SQLite.
+
+    A unit is pending, claimed by a worker, or done. Claims of workers that died stay claimed
+    until the unit is add()ed again, which makes it pending.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = _connect(path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS units (
+            unit TEXT PRIMARY KEY,
+            start TEXT,
+            end TEXT,
+            status TEXT,
+            worker TEXT,
+            updated TEXT
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS units_status ON units (status, unit)')
+
+    def add(self, date_tuples, key=lambda date_tuple: date_tuple[0][:7]):
+        """Queue (start, end) tuples, a unit already queued gets its new range and is pending again"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(
+                """INSERT INTO units VALUES (?, ?, ?, 'pending', NULL, ?)
+                   ON CONFLICT (unit) DO UPDATE SET start = excluded.start, end = excluded.end,
+                   status = 'pending', worker = NULL, updated = excluded.updated""",
+                [(key(date_tuple), date_tuple[0], date_tuple[1], now) for date_tuple in date_tuples])
+            self.conn.execute('COMMIT')
+        return len(date_tuples)
+
+    def claim(self, worker):
+        """Next pending (start, end), oldest first, or None when the queue is drained"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute("SELECT unit, start, end FROM units WHERE status = 'pending' ORDER BY unit LIMIT 1").fetchone()
+            if row is not None:
+                self.conn.execute("UPDATE units SET status = 'claimed', worker = ?, updated = ? WHERE unit = ?", (str(worker), now, row[0]))
+            self.conn.execute('COMMIT')
+        return None if row is None else (row[1], row[2])
+
+    def _set(self, unit, status):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self.conn.execute('UPDATE units SET status = ?, updated = ? WHERE unit = ?', (status, now, unit))
+
+    def done(self, unit):
+        self._set(unit, 'done')
+
+    def iter_claims(self, worker):
+        """Claim units until none are left, for Pipeline.run"""
+        while True:
+            date_tuple = self.claim(worker)
+            if date_tuple is None:
+                return
+            yield date_tuple
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM units GROUP BY status').fetchall())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .stream import StreamingJoin, entry_metadata
+
+
+class _Rows:
+    """Collects rows like a csv writer would write them"""
+
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class ReextractQueue:
+    """Entries whose output failed validation, to be re-extracted one by one.
+
+    Keyed by (dataset, entry_id), with the shard (month) the entry's rows live in and what was
+    wrong. run() sends the queued sections to the LLM again and swaps their rows in the shard,
+    instead of re-running whole months.
+    """
+
+    def __init__(self, path='reextract_queue.db', max_attempts=2):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS queue (
+            dataset TEXT,
+            entry_id TEXT,
+            shard TEXT,
+            problems TEXT,
+            attempts INTEGER,
+            status TEXT,
+            updated TEXT,
+            PRIMARY KEY (dataset, entry_id)
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS queue_status ON queue (dataset, status)')
+        self.conn.commit()
+
+    def add(self, dataset, shard, issues):
+        """Queue {entry_id: [problems]} from a StreamingJoin or Validator"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            for entry_id, problems in issues.items():
+                self.conn.execute(
+                    """INSERT INTO queue VALUES (?, ?, ?, ?, 0, 'pending', ?)
+                       ON CONFLICT (dataset, entry_id) DO UPDATE SET shard = excluded.shard, problems = excluded.problems,
+                       updated = excluded.updated, status = CASE WHEN status = 'failed' THEN 'failed' ELSE 'pending' END""",
+                    (dataset, entry_id, shard, json.dumps(problems), now))
+            self.conn.commit()
+        return len(issues)
+
+    def pending(self, dataset):
+        """[(entry_id, shard, problems)] still to be re-extracted"""
+        with self.lock:
+            rows = self.conn.execute("SELECT entry_id, shard, problems FROM queue WHERE dataset = ? AND status = 'pending' ORDER BY shard",
+                                     (dataset,)).fetchall()
+        return [(entry_id, shard, json.loads(problems)) for entry_id, shard, problems in rows]
+
+    def _update(self, dataset, entry_id, status, problems=None):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self.conn.execute('UPDATE queue SET status = ?, attempts = attempts + 1, problems = COALESCE(?, problems), updated = ? '
+                              'WHERE dataset = ? AND entry_id = ?',
+                              (status, None if problems is None else json.dumps(problems), now, dataset, entry_id))
+            self.conn.commit()
+
+    def _attempts(self, dataset, entry_id):
+        with self.lock:
+            return self.conn.execute('SELECT attempts FROM queue WHERE dataset = ? AND entry_id = ?', (dataset, entry_id)).fetchone()[0]
+
+    def counts(self, dataset=None):
+        with self.lock:
+            if dataset is None:
+                rows = self.conn.execute('SELECT status, COUNT(*) FROM queue GROUP BY status').fetchall()
+            else:
+                rows = self.conn.execute('SELECT status, COUNT(*) FROM queue WHERE dataset = ? GROUP BY status', (dataset,)).fetchall()
+        return dict(rows)
+
+    def run(self, dataset, store, builder, corpus, limit=None):
+        """Re-extract queued entries of a dataset and rewrite the shards they belong to.
+
+        dataset: the Dataset, its validator checks the new rows
+        store: the dataset's ShardedStore
+        builder: a DatasetBuilder to re-extract with (entries=[], without the response cache,
+            which would hand back the same answer), ideally on the stronger model
+        corpus: SectionCorpus holding the section texts
+
+        Entries that pass now get their rows swapped in. The rest keep their old rows and are
+        retried on the next run, until max_attempts. Returns the shard keys that were rewritten.
+        """
+        queued = self.pending(dataset.name)[:limit]
+        if not queued:
+            return []
+
+        metadata_lookup = {}
+        entries = []
+        shards = {}
+        for entry_id, shard, _ in queued:
+            row = corpus.get(entry_id)
+            if row is None:
+                # the text was never kept, nothing to re-extract from
+                self._update(dataset.name, entry_id, 'missing_text')
+                continue
+            metadata_lookup[entry_id] = entry_metadata(row)
+            entries.append((entry_id, row['text']))
+            shards[entry_id] = shard
+        if not entries:
+            return []
+
+        print(f"Re-extracting {len(entries)} {dataset.name} entries that failed validation")
+        collected = _Rows()
+        join = StreamingJoin(collected, metadata_lookup, keep_field=dataset.keep_field, validator=dataset.validator())
+        builder.entries = entries
+        builder.build()
+        for entry in builder.entries:
+            if builder._get_entry_state(entry) == 'success':
+                join.on_result(entry[0], entry[2])
+
+        fixed = {}
+        for entry_id in shards:
+            if entry_id not in join.completed:
+                # the call itself failed, try again next run
+                status = 'failed' if self._attempts(dataset.name, entry_id) + 1 >= self.max_attempts else 'pending'
+                self._update(dataset.name, entry_id, status)
+            elif entry_id in join.issues:
+                status = 'failed' if self._attempts(dataset.name, entry_id) + 1 >= self.max_attempts else 'pending'
+                self._update(dataset.name, entry_id, status, join.issues[entry_id])
+            else:
+                fixed.setdefault(shards[entry_id], set()).add(entry_id)
+
+        # swap the fixed entries' rows into their shards
+        new_rows = {}
+        for row in collected.rows:
+            new_rows.setdefault(row['entry_id'], []).append(row)
+        for shard, entry_ids in fixed.items():
+            if store.has_shard(shard):
+                rows = [row for row in store.iter_rows([shard]) if row.get('entry_id') not in entry_ids]
+                for entry_id in sorted(entry_ids):
+                    rows.extend(new_rows.get(entry_id, []))
+                rows.sort(key=lambda row: (row.get('filing_date', ''), row.get('entry_id', '')))
+                store.write_shard(shard, rows, store.manifest['shards'][shard]['fieldnames'])
+            for entry_id in entry_ids:
+                self._update(dataset.name, entry_id, 'done')
+
+        print(f"- {sum(len(ids) for ids in fixed.values())} fixed across {len(fixed)} shards, queue now {self.counts(dataset.name)}")
+        return sorted(fixed)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,97 @@
+import threading
+
+from .builder import RateLimiter
+from .checks import numbers_in
+from .controller import AdaptiveController
+
+# models a router walks through, cheapest first, as (model, rpm, max_concurrent)
+ROUTER_MODELS = [
+    ("gemini-2.5-flash-lite", 4000, 40),
+    ("gemini-2.5-flash", 1000, 10),
+]
+
+
+class ModelPool:
+    """One model with its own quota (rpm) and concurrency, adapted by its own controller.
+
+    rate_limiter: optional limiter to share, e.g. one per model across the routers of several datasets
+    """
+
+    def __init__(self, model, rpm, max_concurrent, controller=None, rate_limiter=None):
+        self.model = model
+        self.rpm = rpm
+        self.max_concurrent = max_concurrent
+        self.rate_limiter = rate_limiter or RateLimiter(rpm)
+        self.controller = controller or AdaptiveController(initial=min(10, max_concurrent), maximum=max_concurrent)
+
+    def __repr__(self):
+        return f"ModelPool({self.model}, rpm={self.rpm}, max_concurrent={self.max_concurrent})"
+
+
+class ModelRouter:
+    """Sends each entry to the cheapest model first and moves it up a tier only when needed.
+
+    pools: ModelPools, cheapest first
+    long_tokens: sections over this many estimated tokens start on the last pool
+    max_numbers: sections with more distinct numbers than this (e.g. many proposals with
+        four vote counts each) start on the last pool
+
+    An entry moves up when its call fails for good or its output fails one of the builder's
+    checks. Whatever the last pool returns is accepted.
+    """
+
+    def __init__(self, pools, long_tokens=None, max_numbers=None):
+        self.pools = pools
+        self.long_tokens = long_tokens
+        self.max_numbers = max_numbers
+        self.lock = threading.Lock()
+        self.started = {pool.model: 0 for pool in pools}
+        self.accepted = {pool.model: 0 for pool in pools}
+        self.escalations = {}
+
+    @property
+    def key(self):
+        """Stands in for the model name in cache keys and metrics labels"""
+        return '>'.join(pool.model for pool in self.pools)
+
+    def start(self, text):
+        """Index of the pool an entry starts on"""
+        last = len(self.pools) - 1
+        if self.long_tokens is not None and len(text) // 4 > self.long_tokens:
+            tier = last
+        elif self.max_numbers is not None and len(numbers_in(text)) > self.max_numbers:
+            tier = last
+        else:
+            tier = 0
+        self.begin(self.pools[tier].model)
+        return tier
+
+    def begin(self, model, n=1):
+        """Count entries started on a model, batched entries included"""
+        with self.lock:
+            self.started[model] += n
+
+    def check(self, checks, parsed, text):
+        """First failing check's reason, or None"""
+        for check in checks:
+            reason = check(parsed, text)
+            if reason is not None:
+                return reason
+        return None
+
+    def escalate(self, reason):
+        with self.lock:
+            self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def accept(self, model):
+        with self.lock:
+            self.accepted[model] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'started': dict(self.started),
+                'accepted': dict(self.accepted),
+                'escalations': dict(self.escalations),
+                'pools': {pool.model: pool.controller.stats() for pool in self.pools},
+            }
@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+from typing import Optional, List, Literal
+from datetime import datetime
+
+
+class ProposalResult(BaseModel):
+    proposal_description: Optional[str] = None  # What was being voted on
+    presentation_order: Optional[int] = None  # Sequential order (1, 2, 3...)
+    assigned_number: Optional[str] = None  # Assigned numbering (1a, 1b, 1c...)
+    votes_for: Optional[int] = None  # Votes in favor
+    votes_against: Optional[int] = None  # Votes against
+    abstentions: Optional[int] = None  # Abstention votes
+    broker_non_votes: Optional[int] = None  # Broker non-votes (if present)
+    proponent_type: Optional[str] = None  # "Management" or "Shareholder"
+    meeting_date: Optional[str] = None  # Date of the meeting, should specfic to date YYYY-MM-DD
+    meeting_type: Optional[Literal["Annual", "Special"]] = None  # Only "Annual" or "Special"
+
+
+class ProposalResultsExtraction(BaseModel):
+    info_found: bool
+    data: List[ProposalResult] = []
+
+
+class SingleDividend(BaseModel):
+    dividend_per_share: Optional[float] = None
+    payment_date: Optional[datetime] = None
+    record_date: Optional[datetime] = None
+    stock_type_specified: Optional[str] = None
+
+
+class DividendExtraction(BaseModel):
+    info_found: bool
+    data: List[SingleDividend] = []
+
+
+class ShareClassVotingRights(BaseModel):
+    share_class: Optional[str] = None  # "Class A", "Class B", "Common", "Preferred", etc.
+    votes_per_share: Optional[float] = None  # e.g., 10.0, 1.0, 0.0
+    voting_rights_description: Optional[str] = None  # Any additional context
+
+
+class VotingRightsExtraction(BaseModel):
+    info_found: bool
+    data: List[ShareClassVotingRights] = []
@@ -0,0 +1,139 @@
+import csv
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from .locks import file_lock
+
+
+class _CountingWriter:
+    def __init__(self, writer):
+        self.writer = writer
+        self.rows = 0
+
+    def writeheader(self):
+        self.writer.writeheader()
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+class ShardedStore:
+    """Append-only dataset store with one gzipped csv shard per period (e.g. month) and a manifest.
+
+    Each shard is written once, so adding a month costs the same no matter how much history exists.
+    Use compact() to concatenate the shards into a single file for publishing. Several processes can
+    write shards of the same store, the manifest is merged under a file lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        self.lock_path = os.path.join(path, 'manifest.lock')
+        os.makedirs(path, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """Load manifest, or start an empty one"""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'shards': {}}
+
+    def _save_manifest(self):
+        """Write manifest atomically so a crash never leaves it half written"""
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def reload(self):
+        """Pick up shards written by other processes"""
+        self.manifest = self._load_manifest()
+
+    def shard_path(self, key):
+        return os.path.join(self.path, f'{key}.csv.gz')
+
+    def has_shard(self, key):
+        return key in self.manifest['shards'] and os.path.exists(self.shard_path(key))
+
+    def keys(self):
+        return sorted(self.manifest['shards'])
+
+    @contextmanager
+    def open_shard(self, key, fieldnames):
+        """Stream rows into a shard, yields a csv writer. The shard only appears once the block exits cleanly"""
+        path = self.shard_path(key)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', newline='', encoding='utf-8') as outfile:
+            writer = _CountingWriter(csv.DictWriter(outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL, extrasaction='ignore'))
+            writer.writeheader()
+            yield writer
+        os.replace(tmp_path, path)
+
+        # other workers may have added shards since this process last read the manifest
+        with file_lock(self.lock_path):
+            self.reload()
+            self.manifest['shards'][key] = {
+                'file': os.path.basename(path),
+                'rows': writer.rows,
+                'fieldnames': list(fieldnames),
+                'written': datetime.now().isoformat(timespec='seconds'),
+            }
+            self._save_manifest()
+
+    def write_shard(self, key, rows, fieldnames):
+        """Write a shard once. Rewriting an existing key replaces it (e.g. re-running a month)"""
+        with self.open_shard(key, fieldnames) as writer:
+            writer.writerows(rows)
+
+    def fieldnames(self):
+        """Union of fieldnames across shards, in first seen order"""
+        fieldnames = []
+        for key in self.keys():
+            for field in self.manifest['shards'][key]['fieldnames']:
+                if field not in fieldnames:
+                    fieldnames.append(field)
+        return fieldnames
+
+    def iter_rows(self, keys=None):
+        """Stream rows shard by shard without loading the dataset into memory"""
+        for key in (keys if keys is not None else self.keys()):
+            with gzip.open(self.shard_path(key), 'rt', newline='', encoding='utf-8') as infile:
+                yield from csv.DictReader(infile)
+
+    def compact(self, output_path):
+        """Concatenate all shards into a single gzipped csv"""
+        fieldnames = self.fieldnames()
+        tmp_path = output_path + '.tmp'
+        count = 0
+        with gzip.open(tmp_path, 'wt', newline='', encoding='utf-8') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL, restval='')
+            writer.writeheader()
+            for row in self.iter_rows():
+                writer.writerow(row)
+                count += 1
+        os.replace(tmp_path, output_path)
+        print(f"Compacted {len(self.keys())} shards ({count} rows) into {output_path}")
+        return count
+
+    def import_legacy(self, path, key_func):
+        """Split an existing single-file dataset into shards, keyed by key_func(row)"""
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as infile:
+            reader = csv.DictReader(infile)
+            fieldnames = reader.fieldnames
+            groups = {}
+            for row in reader:
+                groups.setdefault(key_func(row), []).append(row)
+
+        for key, rows in groups.items():
+            self.write_shard(key, rows, fieldnames)
+        print(f"Imported {path} into {len(groups)} shards")
+
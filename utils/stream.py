@@ -0,0 +1,74 @@
+import csv
+import gzip
+
+ENTRY_FIELDS = ['entry_id', 'accession', 'cik', 'filing_date', 'document', 'item', 'text']
+
+
+def spill_entries(rows, path):
+    """Write section rows to disk so their texts don't have to stay in memory"""
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=ENTRY_FIELDS, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def iter_entries(path):
+    """Stream section rows back, one at a time"""
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as csvfile:
+        yield from csv.DictReader(csvfile)
+
+
+def entry_metadata(row):
+    """What an output row needs from its section row, keyed by entry_id in metadata lookups"""
+    return {'accession': row['accession'], 'cik': row['cik'], 'filing_date': row['filing_date']}
+
+
+def join_row(entry_id, result, metadata):
+    """Builder result + section metadata -> output row"""
+    new_row = {
+        'accession': metadata.get('accession', ''),
+        'cik': metadata.get('cik', ''),
+        'filing_date': metadata.get('filing_date', ''),
+        'entry_id': entry_id,
+    }
+
+    # Add all other fields except _id
+    for field, value in result.items():
+        if field != '_id':
+            new_row[field] = value
+    return new_row
+
+
+def has_value(row, field):
+    """The post filter, a field with actual data (0 counts as data)"""
+    value = row.get(field)
+    return value is not None and str(value).strip() != ''
+
+
+class StreamingJoin:
+    """Joins builder results to metadata as they arrive and writes them straight to a csv writer.
+
+    Pass on_result as the builder's on_result callback. Only the small metadata lookup is kept.
+    validator: optional Validator, each entry's rows are normalized and checked before they are
+        written, entries with problems collect in issues for the re-extract queue
+    """
+
+    def __init__(self, writer, metadata_lookup, keep_field, validator=None):
+        self.writer = writer
+        self.metadata_lookup = metadata_lookup
+        self.keep_field = keep_field
+        self.validator = validator
+        self.rows = 0
+        self.completed = set()
+        self.issues = {}
+
+    def on_result(self, entry_id, results):
+        self.completed.add(entry_id)
+        metadata = self.metadata_lookup.get(entry_id, {})
+        new_rows = [join_row(entry_id, result, metadata) for result in results]
+        if self.validator is not None:
+            self.issues.update(self.validator.validate(new_rows))
+        for new_row in new_rows:
+            if has_value(new_row, self.keep_field):
+                self.writer.writerow(new_row)
+                self.rows += 1
@@ -0,0 +1,261 @@
+import gzip
+import io
+import os
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+from .dates import covers_month, generate_monthly_date_ranges, month_is_complete
+from .metrics import dir_bytes
+
+DEFAULT_SUBMISSION_CACHE = os.environ.get('SEC_SUBMISSION_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'structured-output', 'submissions'
+)
+
+
+def query_key(submission_type, document_type):
+    """Downloads with other filters keep other documents, so they are cached apart"""
+    return f"{','.join(sorted(submission_type))}|{','.join(sorted(document_type))}"
+
+
+def _accession(name):
+    return name.replace('-', '')
+
+
+def _portfolio_submissions(path, skip=()):
+    """(accession, [(name, bytes)]) for every submission in a portfolio directory, except those in skip.
+
+    Handles the three layouts datamule leaves behind: batch tars holding <accession>/<file>,
+    one tar per submission, and one directory per submission.
+    """
+    for f in sorted(Path(path).iterdir()):
+        if f.is_file() and 'batch' in f.name and f.suffix == '.tar':
+            # a submission's files are written together, so one submission is in memory at a time
+            current, files = None, []
+            with tarfile.open(f, 'r') as tar:
+                for member in tar:
+                    if not member.isfile() or '/' not in member.name:
+                        continue
+                    accession, name = member.name.split('/', 1)
+                    if accession != current:
+                        if files:
+                            yield current, files
+                        current, files = accession, []
+                    if _accession(accession) not in skip:
+                        files.append((name, tar.extractfile(member).read()))
+                if files:
+                    yield current, files
+        elif _accession(f.stem if f.is_file() else f.name) in skip:
+            continue
+        elif f.is_file() and f.suffix == '.tar':
+            with tarfile.open(f, 'r') as tar:
+                yield f.stem, [(m.name, tar.extractfile(m).read()) for m in tar.getmembers() if m.isfile()]
+        elif f.is_dir():
+            files = []
+            for root, _, names in os.walk(f):
+                for name in names:
+                    full = os.path.join(root, name)
+                    with open(full, 'rb') as infile:
+                        files.append((os.path.relpath(full, f).replace(os.sep, '/'), infile.read()))
+            yield f.name, files
+
+
+class SubmissionCache:
+    """Size capped local cache of downloaded submissions, shared by every script and dataset.
+
+    One gzipped tar per submission under <path>/<month>/<accession>.tar.gz, indexed in <path>/index.db
+    by (query, accession) with its filing month. Least recently used submissions are evicted
+    past max_bytes. A month is marked complete once fully downloaded after it ended, complete
+    months are served without touching the network.
+    """
+
+    def __init__(self, path=DEFAULT_SUBMISSION_CACHE, max_bytes=50 * 1024**3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(path, 'index.db'), timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS submissions (
+            query TEXT,
+            accession TEXT,
+            month TEXT,
+            size INTEGER,
+            created REAL,
+            accessed REAL,
+            PRIMARY KEY (query, accession)
+        )""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS submissions_month ON submissions (query, month)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS submissions_accessed ON submissions (accessed)')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS months (
+            query TEXT,
+            month TEXT,
+            complete INTEGER,
+            PRIMARY KEY (query, month)
+        )""")
+        self.conn.commit()
+
+    def _file(self, month, accession):
+        return os.path.join(self.path, month, f'{accession}.tar.gz')
+
+    def is_complete(self, month, query):
+        with self.lock:
+            row = self.conn.execute('SELECT complete FROM months WHERE query = ? AND month = ?', (query, month)).fetchone()
+        return bool(row and row[0])
+
+    def mark_complete(self, month, query):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO months VALUES (?, ?, 1)', (query, month))
+            self.conn.commit()
+
+    def accessions(self, month, query):
+        with self.lock:
+            return {row[0] for row in self.conn.execute('SELECT accession FROM submissions WHERE query = ? AND month = ?', (query, month))}
+
+    def restore(self, month, query, target, accessions=None):
+        """Write a month's cached submissions (or only `accessions`) into target as <accession>.tar"""
+        os.makedirs(target, exist_ok=True)
+        with self.lock:
+            rows = self.conn.execute('SELECT accession FROM submissions WHERE query = ? AND month = ?', (query, month)).fetchall()
+        wanted = None if accessions is None else {_accession(a) for a in accessions}
+
+        restored = []
+        for (accession,) in rows:
+            if wanted is not None and accession not in wanted:
+                continue
+            out_path = os.path.join(target, f'{accession}.tar')
+            try:
+                with gzip.open(self._file(month, accession), 'rb') as infile, open(out_path + '.tmp', 'wb') as outfile:
+                    shutil.copyfileobj(infile, outfile)
+            except (OSError, EOFError):
+                # lost or truncated file, forget it so it is downloaded again
+                self._forget([(query, accession, month)])
+                continue
+            os.replace(out_path + '.tmp', out_path)
+            restored.append(accession)
+
+        now = time.time()
+        with self.lock:
+            self.conn.executemany('UPDATE submissions SET accessed = ? WHERE query = ? AND accession = ?',
+                                  [(now, query, accession) for accession in restored])
+            self.conn.commit()
+        self.hits += len(restored)
+        return len(restored)
+
+    def store(self, month, query, source):
+        """Cache every submission in a portfolio directory not cached yet, returns how many were added"""
+        known = self.accessions(month, query)
+        added = []
+        for accession, files in _portfolio_submissions(source, skip=known):
+            accession = _accession(accession)
+            if accession in known:
+                continue
+            file_path = self._file(month, accession)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # metadata.json first, the layout datamule expects of a one-submission tar
+            files.sort(key=lambda f: f[0] != 'metadata.json')
+            with tarfile.open(file_path + '.tmp', 'w:gz') as tar:
+                for name, data in files:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            os.replace(file_path + '.tmp', file_path)
+            added.append((query, accession, month, os.path.getsize(file_path)))
+            known.add(accession)
+
+        now = time.time()
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?)',
+                                  [(q, a, m, size, now, now) for q, a, m, size in added])
+            self.conn.commit()
+        self.misses += len(added)
+        self.evict()
+        return len(added)
+
+    def _forget(self, keys):
+        """Drop (query, accession, month) entries, their months are no longer complete"""
+        with self.lock:
+            for query, accession, month in keys:
+                self.conn.execute('DELETE FROM submissions WHERE query = ? AND accession = ?', (query, accession))
+                self.conn.execute('UPDATE months SET complete = 0 WHERE query = ? AND month = ?', (query, month))
+            self.conn.commit()
+        for _, accession, month in keys:
+            try:
+                os.remove(self._file(month, accession))
+            except OSError:
+                pass
+
+    def evict(self):
+        """Least recently used submissions go until the cache fits in max_bytes"""
+        if self.max_bytes is None:
+            return 0
+        with self.lock:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM submissions').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            victims = []
+            for query, accession, month, size in self.conn.execute(
+                    'SELECT query, accession, month, size FROM submissions ORDER BY accessed'):
+                if total <= self.max_bytes:
+                    break
+                victims.append((query, accession, month))
+                total -= size
+        self._forget(victims)
+        return len(victims)
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM submissions').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def download_cached(path, filing_date, cache=None, submission_type=('8-K', '8-K/A'), document_type=('8-K', '8-K/A')):
+    """Portfolio.download_submissions through the cache, month by month.
+
+    path: scratch directory for the portfolio, whatever is in it is replaced
+    filing_date: (start, end) 'YYYY-MM-DD'
+
+    Cached submissions are restored first and datamule skips what is already on disk, so only
+    misses are fetched. Months already complete in the cache are not downloaded at all.
+    Returns (portfolio, stats) with restored and downloaded submission counts and downloaded bytes.
+    """
+    from datamule import Portfolio
+
+    cache = cache or SubmissionCache()
+    query = query_key(submission_type, document_type)
+    stats = {'restored': 0, 'downloaded': 0, 'bytes_downloaded': 0}
+
+    shutil.rmtree(path, ignore_errors=True)
+    for start, end in generate_monthly_date_ranges(*filing_date):
+        month = start[:7]
+        whole_month = covers_month((start, end))
+
+        # each month lands in its own directory first, so what is new is easy to tell apart
+        month_path = os.path.join(path, '.months', month)
+        stats['restored'] += cache.restore(month, query, month_path)
+        if not (whole_month and cache.is_complete(month, query)):
+            before = dir_bytes(month_path)
+            Portfolio(month_path).download_submissions(submission_type=list(submission_type), document_type=list(document_type),
+                                                       filing_date=(start, end))
+            stats['bytes_downloaded'] += dir_bytes(month_path) - before
+            stats['downloaded'] += cache.store(month, query, month_path)
+            if whole_month and month_is_complete((start, end)):
+                cache.mark_complete(month, query)
+
+        for f in Path(month_path).iterdir():
+            os.replace(f, os.path.join(path, f.name if 'batch' not in f.name else f'{month}_{f.name}'))
+    shutil.rmtree(os.path.join(path, '.months'), ignore_errors=True)
+
+    stats.update(cache.stats())
+    print(f"Submissions {filing_date[0]} to {filing_date[1]}: {stats['restored']} from cache, {stats['downloaded']} downloaded")
+    return Portfolio(path), stats
@@ -0,0 +1,256 @@
+import re
+import typing
+from datetime import date, datetime, timedelta
+
+from .dates import parse_date
+
+# Deterministic clean-up of output rows after the LLM. Each field is normalized column by column
+# from its row_model type (dates to YYYY-MM-DD, counts and amounts to numbers, Literal fields to
+# their allowed values), then rows are checked per entry, so a meeting's proposals are checked
+# against each other. Values that can't be repaired are blanked, and the entry is reported so it
+# can be re-extracted on its own (see utils/reextract.py) instead of re-running the month.
+#
+# The row checks here are the one definition of what a bad row is. utils/checks.py runs the ones
+# that fit a single response on the LLM output, so the router escalates on the same problems.
+
+MISSING = {'', '-', '—', '–', 'n/a', 'na', 'none', 'null', 'not applicable', 'not reported'}
+
+# free-text fields with a fixed set of meanings, canonical value -> words and phrases that mean it.
+# Longer phrases win, so 'stockholder proposal opposed by the board' is a shareholder proposal
+ENUMS = {
+    'proponent_type': {
+        'Shareholder': ['shareholder', 'stockholder', 'security holder', 'investor', 'shareholder proposal',
+                        'stockholder proposal'],
+        'Management': ['management', 'company', 'board', 'issuer', 'registrant', 'board of directors',
+                       'management proposal', 'company proposal'],
+    },
+}
+
+_NUMBER = re.compile(r'-?\d(?:[\d,.]*\d)?')
+
+VOTE_FIELDS = ('votes_for', 'votes_against', 'abstentions', 'broker_non_votes')
+
+
+def _base_type(annotation):
+    """Optional[X] -> X, Literal[...] stays as is"""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _base_type(args[0])
+    return annotation
+
+
+def _blank(value):
+    return value is None or str(value).strip().lower() in MISSING
+
+
+def to_number(value):
+    """'1,234,567 shares', '$0.25' -> a float, None if there is no number.
+
+    Numbers that only read one way are taken: '1.234.567' or '1.234,56' (dots as thousands
+    separators) could be a count or a decimal, so they are None too.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _NUMBER.search(str(value).replace('$', ''))
+    if match is None:
+        return None
+    number = match.group(0)
+    if number.count('.') > 1 or ('.' in number and ',' in number[number.index('.'):]):
+        return None
+    return float(number.replace(',', ''))
+
+
+def to_enum(value, allowed, synonyms=None):
+    """Case and wording variants onto the allowed values, None if nothing matches.
+
+    synonyms: allowed value -> words or phrases meaning it, the allowed values themselves by default.
+    They match as whole words (plurals too), the longest phrase wins and then the earliest in the text,
+    so 'Management (on behalf of shareholders)' is Management.
+    """
+    text = str(value).strip().lower()
+    for option in allowed:
+        if text == option.lower():
+            return option
+    best = None
+    for option, words in (synonyms or {option: [option] for option in allowed}).items():
+        for word in words:
+            match = re.search(rf'\b{re.escape(word.lower())}s?\b', text)
+            if match is not None:
+                rank = (-len(word.split()), match.start())
+                if best is None or rank < best[0]:
+                    best = (rank, option)
+    return None if best is None else best[1]
+
+
+def _normalizer(name, annotation):
+    """(function, kind) for one field, function returns the normalized value or raises ValueError"""
+    base = _base_type(annotation)
+    if typing.get_origin(base) is typing.Literal:
+        allowed = typing.get_args(base)
+        return lambda v: to_enum(v, allowed, ENUMS.get(name)), 'enum'
+    if name in ENUMS:
+        allowed = sorted(ENUMS[name])
+        return lambda v: to_enum(v, allowed, ENUMS[name]), 'enum'
+    if base in (datetime, date) or name.endswith('_date'):
+        return parse_date, 'date'
+    if base is int:
+        def to_int(v):
+            number = to_number(v)
+            return None if number is None else int(round(number))
+        return to_int, 'number'
+    if base is float:
+        return to_number, 'number'
+    return None, None
+
+
+class Validator:
+    """Normalizes and checks the output rows of one dataset.
+
+    row_model: the dataset's row model, its field types drive the normalization
+    checks: functions (rows of one entry) -> [(field, problem)], run after normalization
+    """
+
+    def __init__(self, row_model, checks=()):
+        self.row_model = row_model
+        self.checks = checks
+        self.normalizers = {}
+        for name, field in row_model.model_fields.items():
+            func, kind = _normalizer(name, field.annotation)
+            if func is not None:
+                self.normalizers[name] = (func, kind)
+        self.repaired = 0
+        self.blanked = 0
+
+    def normalize(self, rows):
+        """Normalize rows in place, field by field. Returns [(row index, field, problem, value)] for values that were blanked"""
+        problems = []
+        for name, (func, kind) in self.normalizers.items():
+            column = [row.get(name) for row in rows]
+            for i, value in enumerate(column):
+                if _blank(value):
+                    rows[i][name] = None
+                    continue
+                try:
+                    normalized = func(value)
+                except (ValueError, TypeError, OverflowError):
+                    normalized = None
+                if normalized is None:
+                    problems.append((i, name, f'bad_{kind}', value))
+                    self.blanked += 1
+                elif normalized != value:
+                    self.repaired += 1
+                rows[i][name] = normalized
+        return problems
+
+    def validate(self, rows):
+        """Normalize and check rows, returns {entry_id: [problems]} for the entries that need another look"""
+        issues = {}
+        for i, field, problem, value in self.normalize(rows):
+            issues.setdefault(rows[i].get('entry_id'), []).append({'field': field, 'problem': problem, 'value': str(value)})
+
+        by_entry = {}
+        for row in rows:
+            by_entry.setdefault(row.get('entry_id'), []).append(row)
+        for entry_id, entry_rows in by_entry.items():
+            for check in self.checks:
+                for field, problem in check(entry_rows):
+                    issues.setdefault(entry_id, []).append({'field': field, 'problem': problem, 'value': ''})
+        return issues
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def check_negative_counts(rows):
+    problems = []
+    for row in rows:
+        if any(row.get(f) is not None and row[f] < 0 for f in VOTE_FIELDS):
+            problems.append(('votes', 'negative_count'))
+    return problems
+
+
+def check_vote_counts(rows):
+    """Counts can't be negative, and every proposal of a meeting is voted by about the same shares.
+
+    A proposal's total (for + against + abstain + broker non-votes) far off the meeting's median
+    usually means a count was misread or shifted between columns.
+    """
+    problems = check_negative_counts(rows)
+    totals = []
+    for row in rows:
+        counts = [row.get(f) for f in VOTE_FIELDS]
+        total = sum(c for c in counts if c is not None and c > 0)
+        if total > 0:
+            totals.append(total)
+    if len(totals) >= 3:
+        median = _median(totals)
+        if any(total < median / 10 or total > median * 10 for total in totals):
+            problems.append(('votes', 'vote_total_outlier'))
+    return problems
+
+
+def check_meeting(rows):
+    """One section reports one meeting"""
+    dates = {row.get('meeting_date') for row in rows if row.get('meeting_date')}
+    if len(dates) > 1:
+        return [('meeting_date', 'inconsistent_meeting_date')]
+    return []
+
+
+def check_meeting_dates(rows):
+    """Dates the normalization can't read. Validator.normalize reports these itself as bad_date"""
+    problems = []
+    for row in rows:
+        if not _blank(row.get('meeting_date')) and parse_date(row['meeting_date']) is None:
+            problems.append(('meeting_date', 'bad_date'))
+    return problems
+
+
+def check_proposal_order(rows):
+    orders = [row.get('presentation_order') for row in rows if row.get('presentation_order') is not None]
+    if len(orders) != len(set(orders)):
+        return [('presentation_order', 'duplicate_order')]
+    return []
+
+
+def check_dividend_amounts(rows):
+    problems = []
+    for row in rows:
+        amount = row.get('dividend_per_share')
+        if amount is not None and not 0 < amount <= 1000:
+            problems.append(('dividend_per_share', 'implausible_amount'))
+    return problems
+
+
+def check_dividend_dates(rows):
+    """Record date comes before payment, and both are near the filing"""
+    problems = []
+    for row in rows:
+        record, payment = row.get('record_date'), row.get('payment_date')
+        if record and payment and record > payment:
+            problems.append(('record_date', 'record_after_payment'))
+        filing = parse_date(row.get('filing_date') or '')
+        if filing is None:
+            continue
+        earliest = (date.fromisoformat(filing) - timedelta(days=366)).isoformat()
+        latest = (date.fromisoformat(filing) + timedelta(days=731)).isoformat()
+        for field in ('record_date', 'payment_date'):
+            if row.get(field) and not earliest <= row[field] <= latest:
+                problems.append((field, 'implausible_date'))
+    return problems
+
+
+def check_votes_per_share(rows):
+    problems = []
+    for row in rows:
+        votes = row.get('votes_per_share')
+        if votes is not None and not 0 <= votes <= 10000:
+            problems.append(('votes_per_share', 'implausible_votes'))
+    return problems
+
+
+PROPOSAL_ROW_CHECKS = (check_vote_counts, check_meeting, check_proposal_order)
+DIVIDEND_ROW_CHECKS = (check_dividend_amounts, check_dividend_dates)
+VOTES_PER_SHARE_ROW_CHECKS = (check_votes_per_share,)